@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Measures the cold start of sacremoses, i.e. the time to import it and build
+a first object in a fresh interpreter, as a serverless function or a
+per-request subprocess would.
+
+    $ python benchmarks/import_time.py --repeat 20
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# The statements timed in each fresh interpreter.
+SCENARIOS = [('import sacremoses',
+              'import sacremoses'),
+             ('MosesPunctNormalizer()',
+              'from sacremoses import MosesPunctNormalizer; MosesPunctNormalizer()'),
+             ('MosesDetokenizer()',
+              'from sacremoses import MosesDetokenizer; MosesDetokenizer()'),
+             ('MosesTokenizer()',
+              'from sacremoses import MosesTokenizer; MosesTokenizer()'),
+             ('MosesTokenizer().tokenize()',
+              'from sacremoses import MosesTokenizer; MosesTokenizer().tokenize(u"Hello, world!")'),
+             ('MosesTruecaser()',
+              'from sacremoses import MosesTruecaser; MosesTruecaser()')]
+
+TIMER = """
+import json, sys, time
+start = time.time()
+{statement}
+elapsed = time.time() - start
+print(json.dumps([elapsed, sorted(name for name in sys.modules
+                                  if name.split('.')[0] in ('sacremoses', 'tqdm', 'multiprocessing', 'pkgutil'))]))
+"""
+
+
+def time_statement(statement):
+    """
+    Returns the seconds taken by `statement` in a fresh interpreter and the
+    (heavy) modules it imported.
+    """
+    output = subprocess.check_output([sys.executable, '-c', TIMER.format(statement=statement)])
+    return json.loads(output.decode('utf8'))
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', '-r', type=int, default=10,
+                        help='No. of fresh interpreters per scenario.')
+    parser.add_argument('--modules', '-m', action='store_true',
+                        help='Also list the modules each scenario imports.')
+    args = parser.parse_args()
+
+    # Compile the bytecode once, so the timings don't include it.
+    subprocess.check_call([sys.executable, '-c', 'import sacremoses.cli'],
+                          env=dict(os.environ, PYTHONDONTWRITEBYTECODE=''))
+
+    print('{:<30} {:>10} {:>10}'.format('scenario', 'median ms', 'min ms'))
+    for name, statement in SCENARIOS:
+        timings, modules = [], []
+        for _ in range(args.repeat):
+            elapsed, modules = time_statement(statement)
+            timings.append(elapsed * 1000)
+        print('{:<30} {:>10.1f} {:>10.1f}'.format(name, median(timings), min(timings)))
+        if args.modules:
+            print('    ' + ' '.join(modules))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Measures SubwordTokenizer.learn() on a tokenized text file, the time per
+merge should depend on the pairs a merge changes, not on the vocabulary size.
+
+    $ python benchmarks/learn_bpe.py big.txt.tok --num-symbols 32000 --jump 1 10
+"""
+
+from __future__ import print_function
+
+import argparse
+import time
+
+from sacremoses.subwords import SubwordTokenizer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('filename', help='Tokenized text file.')
+    parser.add_argument('--num-symbols', '-s', type=int, default=32000,
+                        help='No. of merges to learn.')
+    parser.add_argument('--min-freq', '-m', type=int, default=2,
+                        help='Stop when no pair is seen this many times.')
+    parser.add_argument('--jump', '-j', type=int, default=[1], nargs='+',
+                        help='No. of merges per pass, the merges of the first one are the reference.')
+    args = parser.parse_args()
+
+    start = time.time()
+    subwords = SubwordTokenizer(args.filename)
+    print('{} types, {} pairs in {:.1f}s'.format(len(subwords.vocab), len(subwords.stats),
+                                                 time.time() - start))
+    reference = None
+    for jump in args.jump:
+        subwords = SubwordTokenizer(args.filename)
+        start = time.time()
+        merges = subwords.learn(args.num_symbols, min_freq=args.min_freq, jump=jump)
+        elapsed = time.time() - start
+        print('jump {}: {} merges in {:.1f}s ({:.2f} ms per merge)'.format(
+            jump, len(merges), elapsed, elapsed * 1000 / max(len(merges), 1)))
+        if reference is None:
+            reference = merges
+            continue
+        # How far the merges diverge from the reference.
+        first_difference = next((i for i, (merge, other) in enumerate(zip(merges, reference))
+                                 if merge != other), min(len(merges), len(reference)))
+        shared = len(set(merges) & set(reference)) / float(max(len(reference), 1))
+        print('    first difference at merge {}, {:.2%} of the merges shared'.format(first_difference, shared))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Measures MosesTruecaser.split_xml() on lines of growing length, the time per
+token should stay flat as the lines get longer.
+
+    $ python benchmarks/split_xml.py --max-tokens 100000
+"""
+
+from __future__ import print_function
+
+import argparse
+import timeit
+
+from sacremoses.truecase import MosesTruecaser
+
+# The repeated piece of the lines, with XML tags, factors and cognates.
+PIECE = u'The <b>quick</b> brown|JJ fox|NN|<i>| jumps < over -> the <a href="#"> lazy dog . '
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--max-tokens', '-m', type=int, default=100000,
+                        help='No. of tokens of the longest line.')
+    parser.add_argument('--repeat', '-r', type=int, default=3,
+                        help='No. of timings per line, the best one is kept.')
+    args = parser.parse_args()
+
+    piece_tokens = len(MosesTruecaser.split_xml(PIECE))
+    print('{:>10} {:>10} {:>14}'.format('tokens', 'ms', 'us per token'))
+    num_tokens = 1000
+    while num_tokens <= args.max_tokens:
+        line = PIECE * (num_tokens // piece_tokens)
+        tokens = len(MosesTruecaser.split_xml(line))
+        elapsed = min(timeit.repeat(lambda: MosesTruecaser.split_xml(line),
+                                    number=1, repeat=args.repeat))
+        print('{:>10} {:>10.1f} {:>14.3f}'.format(tokens, elapsed * 1000, elapsed * 1e6 / tokens))
+        num_tokens *= 10
+
+
+if __name__ == '__main__':
+    main()
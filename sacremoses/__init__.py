@@ -1,8 +1,39 @@
-
-from sacremoses.corpus import *
-from sacremoses.tokenize import *
-from sacremoses.truecase import *
-from sacremoses.normalize import *
-#from sacremoses.subwords import *
+import importlib
+import sys
 
 __version__ = '0.0.19'
+
+# The public names of the package and the submodules that define them, the
+# submodules (and their dependencies) are only imported on first access.
+_LAZY_ATTRIBUTES = {'Perluniprops': 'sacremoses.corpus',
+                    'NonbreakingPrefixes': 'sacremoses.corpus',
+                    'MosesTokenizer': 'sacremoses.tokenize',
+                    'MosesDetokenizer': 'sacremoses.tokenize',
+                    'MosesTruecaser': 'sacremoses.truecase',
+                    'MosesDetruecaser': 'sacremoses.truecase',
+                    'MosesPunctuationNormalizer': 'sacremoses.normalize',
+                    'MosesPunctNormalizer': 'sacremoses.normalize'}
+_LAZY_SUBMODULES = ['corpus', 'tokenize', 'truecase', 'normalize', 'util']
+
+__all__ = sorted(_LAZY_ATTRIBUTES)
+
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        if name in _LAZY_ATTRIBUTES:
+            value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+        elif name in _LAZY_SUBMODULES:
+            value = importlib.import_module('sacremoses.' + name)
+        else:
+            raise AttributeError("module 'sacremoses' has no attribute {!r}".format(name))
+        globals()[name] = value
+        return value
+
+    def __dir__():
+        return sorted(set(globals()) | set(_LAZY_ATTRIBUTES) | set(_LAZY_SUBMODULES))
+else:
+    # Module level __getattr__ needs Python 3.7 (PEP 562).
+    from sacremoses.corpus import *
+    from sacremoses.tokenize import *
+    from sacremoses.truecase import *
+    from sacremoses.normalize import *
+    #from sacremoses.subwords import *
@@ -9,7 +9,8 @@ import click
 from sacremoses.tokenize import MosesTokenizer, MosesDetokenizer
 from sacremoses.truecase import MosesTruecaser, MosesDetruecaser
 from sacremoses.normalize import MosesPunctNormalizer
-from sacremoses.util import parallelize_preprocess
+from sacremoses.subwords import SubwordTokenizer
+from sacremoses.util import parallel_imap, parallelize_preprocess, read_blocks, threaded_reader, ThreadedWriter
 
 # Hack to enable Python2.7 to use encoding.
 import sys
@@ -25,6 +26,40 @@ if sys.version_info[0] < 3:
 CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
 
 
+def process_stream(func, fin, fout, processes, batched=False, end='\n'):
+    """
+    Streams the lines of `fin` through `func` into `fout`: a reader thread
+    reads ahead the lines into a bounded queue, the lines are processed with
+    `processes` processes, and a writer thread writes the results in order.
+    So the memory used doesn't depend on the input size and the output
+    starts as soon as the first lines are processed.
+    """
+    lines = tqdm(threaded_reader(fin))
+    with ThreadedWriter(fout, end=end) as writer:
+        writer.writelines(parallelize_preprocess(func, lines, processes, batched=batched))
+
+
+def pruning_options(command):
+    """
+    Adds the options to prune the truecaser models to a command.
+    """
+    command = click.option('--drop-lowercase', '-d', default=False, is_flag=True,
+                           help='Prune the types whose best case is lowercase (ASR models only).')(command)
+    command = click.option('--max-types', '-t', default=None, type=int,
+                           help='Keep only the most frequent types.')(command)
+    command = click.option('--min-count', '-c', default=None, type=float,
+                           help='Prune the types seen less than this many times.')(command)
+    return command
+
+
+def report_pruning(model):
+    pruning = model.get('pruning')
+    if pruning and pruning.pruned_types:
+        click.echo('Pruned {} of {} types and {} of {} cased forms.'.format(
+                   pruning.pruned_types, pruning.types + pruning.pruned_types,
+                   pruning.pruned_surfaces, pruning.surfaces + pruning.pruned_surfaces), err=True)
+
+
 @click.group(context_settings=CONTEXT_SETTINGS)
 @click.version_option()
 def cli():
@@ -38,15 +73,16 @@ def cli():
 @click.option('--xml-escape', '-x', default=True, is_flag=True,
                 help='Escape special characters for XML.')
 @click.option('--protected-patterns', '-p', help='Specify file with patters to be protected in tokenisation.')
+@click.option('--cache-size', '-c', default=0, help='No. of distinct lines to cache (per process).')
 @click.option('--encoding', '-e', default='utf8', help='Specify encoding of file.')
-def tokenize_file(language, processes, xml_escape, aggressive_dash_splits, protected_patterns, encoding):
-    moses = MosesTokenizer(lang=language)
+def tokenize_file(language, processes, xml_escape, aggressive_dash_splits, protected_patterns, cache_size, encoding):
+    moses = MosesTokenizer(lang=language, cache_size=cache_size)
 
     if protected_patterns:
         with open(protected_patterns, encoding='utf8') as fin:
             protected_patterns = [pattern.strip() for pattern in fin.readlines()]
 
-    moses_tokenize = partial(moses.tokenize,
+    moses_tokenize = partial(moses.tokenize_batch,
                         return_str=True,
                         aggressive_dash_splits=aggressive_dash_splits,
                         escape=xml_escape,
@@ -54,14 +90,7 @@ def tokenize_file(language, processes, xml_escape, aggressive_dash_splits, prote
 
     with click.get_text_stream('stdin', encoding=encoding) as fin:
         with click.get_text_stream('stdout', encoding=encoding) as fout:
-            # If it's single process, joblib parallization is slower,
-            # so just process line by line normally.
-            if processes == 1:
-                for line in tqdm(fin.readlines()):
-                    print(moses_tokenize(line), end='\n', file=fout)
-            else:
-                for outline in parallelize_preprocess(moses_tokenize, fin.readlines(), processes, progress_bar=True):
-                    print(outline, end='\n', file=fout)
+            process_stream(moses_tokenize, fin, fout, processes, batched=True)
 
 
 @cli.command('detokenize')
@@ -69,23 +98,16 @@ def tokenize_file(language, processes, xml_escape, aggressive_dash_splits, prote
 @click.option('--processes', '-j', default=1, help='No. of processes.')
 @click.option('--xml-unescape', '-x', default=True, is_flag=True,
                 help='Unescape special characters for XML.')
+@click.option('--cache-size', '-c', default=0, help='No. of distinct lines to cache (per process).')
 @click.option('--encoding', '-e', default='utf8', help='Specify encoding of file.')
-def detokenize_file(language, processes, xml_unescape, encoding):
-    moses = MosesDetokenizer(lang=language)
+def detokenize_file(language, processes, xml_unescape, cache_size, encoding):
+    moses = MosesDetokenizer(lang=language, cache_size=cache_size)
     moses_detokenize = partial(moses.detokenize,
                         return_str=True,
                         unescape=xml_unescape)
     with click.get_text_stream('stdin', encoding=encoding) as fin:
         with click.get_text_stream('stdout', encoding=encoding) as fout:
-            # If it's single process, joblib parallization is slower,
-            # so just process line by line normally.
-            if processes == 1:
-                for line in tqdm(fin.readlines()):
-                    print(moses_detokenize(str.split(line)), end='\n', file=fout)
-            else:
-                document_iterator = map(str.split, fin.readlines())
-                for outline in parallelize_preprocess(moses_detokenize, document_iterator, processes, progress_bar=True):
-                    print(outline, end='\n', file=fout)
+            process_stream(moses_detokenize, map(str.split, fin), fout, processes)
 
 
 @cli.command('train-truecase')
@@ -95,14 +117,58 @@ def detokenize_file(language, processes, xml_unescape, encoding):
                 help='A flag to indicate that model is for ASR.')
 @click.option('--possibly-use-first-token', '-p', default=False, is_flag=True,
                 help='Use the first token as part of truecasing.')
+@click.option('--format', '-f', 'model_format', default='text', type=click.Choice(MosesTruecaser.MODEL_FORMATS),
+                help='Save the model in the Moses text format or in the (memory mapped) binary format.')
+@click.option('--update', '-u', default=False, is_flag=True,
+                help='Add the counts to the existing modelfile instead of training a new one.')
+@pruning_options
 @click.option('--encoding', '-e', default='utf8', help='Specify encoding of file.')
-def train_truecaser(modelfile, processes, is_asr, possibly_use_first_token, encoding):
-    moses = MosesTruecaser(is_asr=is_asr, encoding=encoding)
+def train_truecaser(modelfile, processes, is_asr, possibly_use_first_token, model_format, update,
+                    min_count, max_types, drop_lowercase, encoding):
+    moses = MosesTruecaser(is_asr=is_asr, encoding=encoding,
+                           min_count=min_count, max_types=max_types, drop_lowercase=drop_lowercase)
+    if update:
+        # The model to update is loaded unpruned, the updated counts are pruned once.
+        moses.model = MosesTruecaser(load_from=modelfile, is_asr=is_asr, encoding=encoding).model
     with click.get_text_stream('stdin', encoding=encoding) as fin:
-        model = moses.train_from_file_object(fin,
+        model = moses.train_from_file_object(threaded_reader(fin),
                     possibly_use_first_token=possibly_use_first_token,
-                    processes=processes, progress_bar=True)
-        moses.save_model(modelfile)
+                    processes=processes, progress_bar=True, update=update)
+        moses.save_model(modelfile, format=model_format)
+    report_pruning(model)
+
+
+@cli.command('merge-truecase')
+@click.option('--modelfile', '-m', required=True, help='Filename to save the merged modelfile.')
+@click.option('--is-asr', '-a',  default=False, is_flag=True,
+                help='A flag to indicate that model is for ASR.')
+@click.option('--format', '-f', 'model_format', default='text', type=click.Choice(MosesTruecaser.MODEL_FORMATS),
+                help='Save the model in the Moses text format or in the (memory mapped) binary format.')
+@pruning_options
+@click.option('--encoding', '-e', default='utf8', help='Specify encoding of the text modelfiles.')
+@click.argument('modelfiles', nargs=-1, required=True)
+def merge_truecaser(modelfile, is_asr, model_format, min_count, max_types, drop_lowercase, encoding, modelfiles):
+    moses = MosesTruecaser(is_asr=is_asr, encoding=encoding,
+                           min_count=min_count, max_types=max_types, drop_lowercase=drop_lowercase)
+    model = moses.merge_models(modelfiles)
+    moses.save_model(modelfile, format=model_format)
+    report_pruning(model)
+
+
+@cli.command('convert-truecase')
+@click.option('--modelfile', '-m', required=True, help='The truecaser modelfile to convert, in either format.')
+@click.option('--output', '-o', required=True, help='Filename to save the converted modelfile.')
+@click.option('--is-asr', '-a',  default=False, is_flag=True,
+                help='A flag to indicate that model is for ASR.')
+@click.option('--format', '-f', 'model_format', default='binary', type=click.Choice(MosesTruecaser.MODEL_FORMATS),
+                help='The format of the converted modelfile.')
+@pruning_options
+@click.option('--encoding', '-e', default='utf8', help='Specify encoding of the text modelfiles.')
+def convert_truecaser(modelfile, output, is_asr, model_format, min_count, max_types, drop_lowercase, encoding):
+    moses = MosesTruecaser(load_from=modelfile, is_asr=is_asr, encoding=encoding,
+                           min_count=min_count, max_types=max_types, drop_lowercase=drop_lowercase)
+    moses.save_model(output, format=model_format)
+    report_pruning(moses.model)
 
 
 @cli.command('truecase')
@@ -116,12 +182,7 @@ def truecase_file(modelfile, processes, is_asr, encoding):
     moses_truecase = partial(moses.truecase, return_str=True)
     with click.get_text_stream('stdin', encoding=encoding) as fin:
         with click.get_text_stream('stdout', encoding=encoding) as fout:
-            for line in tqdm(fin):
-                print(moses.truecase(line, return_str=True), end='\n', file=fout)
-            #FIXME: parallelize job don't work properly for MosesTruecaser.truecase
-            ##else:
-            ##    for outline in parallelize_preprocess(moses_truecase, fin.readlines(), processes, progress_bar=True):
-            ##        print(outline, end='\n', file=fout)
+            process_stream(moses_truecase, fin, fout, processes)
 
 
 @cli.command('detruecase')
@@ -136,14 +197,7 @@ def detruecase_file(processes, is_headline, encoding):
                         is_headline=is_headline)
     with click.get_text_stream('stdin',  encoding=encoding) as fin:
         with click.get_text_stream('stdout',  encoding=encoding) as fout:
-            # If it's single process, joblib parallization is slower,
-            # so just process line by line normally.
-            if processes == 1:
-                for line in tqdm(fin.readlines()):
-                    print(moses_detruecase(line), end='\n', file=fout)
-            else:
-                for outline in parallelize_preprocess(moses_detruecase, fin.readlines(), processes, progress_bar=True):
-                    print(outline, end='\n', file=fout)
+            process_stream(moses_detruecase, fin, fout, processes)
 
 
 @cli.command('normalize')
@@ -153,25 +207,43 @@ def detruecase_file(processes, is_headline, encoding):
                 help='Normalize quotations and commas.')
 @click.option('--normalize-numbers', '-d',  default=True, is_flag=True,
                 help='Normalize number.')
+@click.option('--cache-size', '-c', default=0, help='No. of distinct lines to cache (per process).')
 @click.option('--encoding', '-e', default='utf8', help='Specify encoding of file.')
-def normalize_file(language, processes, normalize_quote_commas, normalize_numbers, encoding):
+def normalize_file(language, processes, normalize_quote_commas, normalize_numbers, cache_size, encoding):
     moses = MosesPunctNormalizer(language,
                                  norm_quote_commas=normalize_quote_commas,
-                                 norm_numbers=normalize_numbers)
+                                 norm_numbers=normalize_numbers,
+                                 cache_size=cache_size)
     moses_normalize = partial(moses.normalize)
 
     with click.get_text_stream('stdin', encoding=encoding) as fin:
         with click.get_text_stream('stdout', encoding=encoding) as fout:
-            # If it's single process, joblib parallization is slower,
-            # so just process line by line normally.
+            # Note: not stripping newlines, so don't need end='\n' when printing to stdout.
+            if cache_size:
+                # The cache only pays off line by line.
+                process_stream(moses_normalize, fin, fout, processes, end='')
+                return
+            # Normalizing blocks of lines gives the same output as normalizing
+            # the lines one by one, see `MosesPunctNormalizer.normalize_block()`.
             if processes == 1:
-                # TODO: Actually moses_normalize(fin.read()) gives the same output
-                #       and it's a lot better but it's inconsistent with the other
-                #       preprocessing interfaces, so we're doing it line by line here.
-                for line in tqdm(fin.readlines()):
-                    # Note: not stripping newlines, so don't need end='\n' when printing to stdout.
-                    print(moses_normalize(fin.read()), end='', file=fout)
+                blocks = moses.normalize_stream(fin)
             else:
-                for outline in parallelize_preprocess(moses_normalize, fin.readlines(), processes, progress_bar=True):
-                    # Note: not stripping newlines, so don't need end='\n' when printing to stdout.
-                    print(outline, end='', file=fout)
+                blocks = parallel_imap(moses.normalize_block, read_blocks(fin, 2 ** 20),
+                                       processes, chunk_size=1)
+            with ThreadedWriter(fout, end='') as writer:
+                writer.writelines(blocks)
+
+
+@cli.command('apply-bpe')
+@click.option('--codes', '-c', required=True, help='The file of the BPE merges to apply, e.g. of subword-nmt.')
+@click.option('--processes', '-j', default=1, help='No. of processes.')
+@click.option('--separator', '-s', default='@@', help='Suffix of the subword units that don\'t end a word.')
+@click.option('--cache-size', default=2 ** 20, help='No. of distinct words to cache (per process).')
+@click.option('--encoding', '-e', default='utf8', help='Specify encoding of file.')
+def apply_bpe(codes, processes, separator, cache_size, encoding):
+    subwords = SubwordTokenizer(load_from=codes, separator=separator,
+                                cache_size=cache_size, encoding=encoding)
+    encode_batch = partial(subwords.encode_batch, return_str=True)
+    with click.get_text_stream('stdin', encoding=encoding) as fin:
+        with click.get_text_stream('stdout', encoding=encoding) as fout:
+            process_stream(encode_batch, fin, fout, processes, batched=True)
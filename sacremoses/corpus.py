@@ -1,8 +1,32 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import marshal
 import os
-import pkgutil
+
+from six import unichr
+
+# The precomputed codepoint ranges of the Perl Unicode Properties, see
+# `Perluniprops.dump_ranges()`.
+PERLUNIPROPS_RANGES = os.path.join("share", "perluniprops", "ranges.marshal")
+
+# The registry of the Perl Unicode Properties shared by all `Perluniprops`,
+# so each category is loaded at most once per process.
+_perluniprops_ranges = {}
+_perluniprops_strings = {}
+_perluniprops_charsets = {}
+_perluniprops_regex_ranges = {}
+
+
+def _get_data(relative_path):
+    """
+    Reads a data file of the sacremoses package.
+    """
+    # Imported here, pkgutil (and typing with it) is slow to import and only
+    # needed the first time a category or a language is read.
+    import pkgutil
+    return pkgutil.get_data("sacremoses", relative_path)
+
 
 class Perluniprops:
     """
@@ -40,10 +64,128 @@ class Perluniprops:
 
         :return: a generator of characters given the specific unicode character category
         """
+        for ch in self.string(category):
+            yield ch
+
+    def string(self, category):
+        """
+        Returns the characters of the category joined in a string, the string
+        is built once per process and shared.
+
+            >>> Perluniprops().string('IsPi') == u''.join(Perluniprops().chars('IsPi'))
+            True
+        """
+        string = _perluniprops_strings.get(category)
+        if string is None:
+            string = _perluniprops_strings[category] = u''.join(
+                [u''.join(map(unichr, range(first, last + 1)))
+                 for first, last in self.ranges(category)])
+        return string
+
+    def charset(self, category):
+        """
+        Returns the characters of the category as a (shared) frozenset.
+        """
+        charset = _perluniprops_charsets.get(category)
+        if charset is None:
+            charset = _perluniprops_charsets[category] = frozenset(self.string(category))
+        return charset
+
+    def ranges(self, category):
+        """
+        Returns the characters of the category as a list of (first, last)
+        codepoint ranges, in the order of the characters in the category file.
+
+            >>> Perluniprops().ranges('IsPi')[:2]
+            [(171, 171), (8216, 8216)]
+        """
+        if not _perluniprops_ranges:
+            try:
+                ranges = marshal.loads(_get_data(PERLUNIPROPS_RANGES))
+            except (IOError, OSError):
+                # Without the precomputed ranges, read the category files.
+                ranges = {}
+            _perluniprops_ranges.update(ranges)
+        flat_ranges = _perluniprops_ranges.get(category)
+        if flat_ranges is None:
+            flat_ranges = _perluniprops_ranges[category] = self._read_ranges(category)
+        return list(zip(flat_ranges[::2], flat_ranges[1::2]))
+
+    def regex_ranges(self, category):
+        """
+        Returns the characters of the category as the inside of a regex
+        character set, e.g. u'a-z', listed as codepoint ranges which compile
+        a lot faster than the characters themselves.
+
+            >>> import re
+            >>> bool(re.match(u'[{}]+$'.format(Perluniprops().regex_ranges('IsN')), u'0123'))
+            True
+        """
+        regex_ranges = _perluniprops_regex_ranges.get(category)
+        if regex_ranges is None:
+            def escape(codepoint):
+                char = unichr(codepoint)
+                return u'\\' + char if char in u'\\]^-[' else char
+            regex_ranges = _perluniprops_regex_ranges[category] = u''.join(
+                escape(first) if first == last else
+                escape(first) + (u'-' if last > first + 1 else u'') + escape(last)
+                for first, last in self.ranges(category))
+        return regex_ranges
+
+    def _read_ranges(self, category):
+        """
+        Reads the category file into a flat tuple of (first, last) codepoints.
+        """
         relative_path = os.path.join("share", "perluniprops", category + ".txt")
-        binary_data = pkgutil.get_data("sacremoses", relative_path)
+        binary_data = _get_data(relative_path)
+        flat_ranges = []
         for ch in binary_data.decode("utf-8"):
-            yield ch
+            codepoint = ord(ch)
+            if flat_ranges and flat_ranges[-1] == codepoint - 1:
+                flat_ranges[-1] = codepoint
+            else:
+                flat_ranges.extend([codepoint, codepoint])
+        return tuple(flat_ranges)
+
+    def dump_ranges(self, filename):
+        """
+        Precomputes the codepoint ranges of all the categories from the
+        category files and marshals them to *filename*, this is how the
+        share/perluniprops/ranges.marshal file is built.
+        """
+        ranges = {category: self._read_ranges(category)
+                  for category in self.available_categories}
+        with open(filename, 'wb') as fout:
+            marshal.dump(ranges, fout, 2)
+
+
+class LazyCategory(object):
+    """
+    A class attribute holding the characters of a Perl Unicode Properties
+    category, built on first access (from the class or an instance) instead of
+    when the class is defined, so importing a module stays cheap.
+
+        >>> class Quotes(object):
+        ...     IsPi = LazyCategory('IsPi')
+        ...     IsPiSet = LazyCategory('IsPi', form='charset')
+        >>> Quotes.IsPi == Perluniprops().string('IsPi')
+        True
+        >>> Quotes().IsPiSet is Perluniprops().charset('IsPi')
+        True
+
+    :param form: The `Perluniprops` method building the value, 'string' or
+        'charset'.
+    :type form: str
+    """
+    def __init__(self, category, form='string'):
+        self.category = category
+        self.form = form
+        self.value = None
+
+    def __get__(self, instance, owner=None):
+        if self.value is None:
+            self.value = getattr(Perluniprops(), self.form)(self.category)
+        return self.value
 
 
 class NonbreakingPrefixes:
@@ -104,10 +246,10 @@ class NonbreakingPrefixes:
 
         for filename in filenames:
             relative_path = os.path.join("share", "nonbreaking_prefixes", filename)
-            binary_data = pkgutil.get_data("sacremoses", relative_path)
+            binary_data = _get_data(relative_path)
             for line in binary_data.decode("utf-8").splitlines():
                 line = line.strip()
                 if line and not line.startswith(ignore_lines_startswith):
                     yield line
 
-__all__ = ['Perluniprops', 'NonbreakingPrefixes']
+__all__ = ['Perluniprops', 'NonbreakingPrefixes', 'LazyCategory']
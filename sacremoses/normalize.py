@@ -6,24 +6,189 @@ https://github.com/moses-smt/mosesdecoder/blob/master/scripts/tokenizer/normaliz
 """
 from __future__ import unicode_literals
 import re
+from collections import namedtuple
+from functools import partial
+
+from sacremoses.util import LRUCache, read_blocks
 
 
 def _substitute(string, pattern, substitution):
     return string.replace(pattern, substitution)
 
 
+class Substitution(namedtuple('Substitution', ['pattern', 'substitution'])):
+    """
+    A rule replacing the literal `pattern`, see `substitute()`.
+    """
+    __slots__ = ()
+
+    @property
+    def trigger(self):
+        return self.pattern
+
+    def __call__(self, string):
+        return _substitute(string, self.pattern, self.substitution)
+
+
 def substitute(pattern, substitution):
-    return lambda x: _substitute(x, pattern, substitution)
+    return Substitution(pattern, substitution)
 
 
 def _substitute_regex(string, compiled_regex, substitution):
     return compiled_regex.sub(substitution, string)
 
 
-def substitute_regex(regex, substitution, ignore_case=False):
+class RegexSubstitution(namedtuple('RegexSubstitution', ['regex', 'substitution', 'trigger', 'multiline'])):
+    """
+    A rule replacing the matches of the compiled `regex`, see
+    `substitute_regex()`. The `trigger` is a substring of the string needed
+    for the rule to change it (or None if it isn't known). The rule is
+    `multiline` if a match can contain (or depend on) a newline, e.g. with
+    `\\s`, `[^...]`, `$` or `(?s).`, then the lines of a block are matched one
+    by one, see `compile_rules()`.
+    """
+    __slots__ = ()
+
+    def __call__(self, string):
+        return _substitute_regex(string, self.regex, self.substitution)
+
+
+def substitute_regex(regex, substitution, ignore_case=False, trigger=None, multiline=True):
     flags = re.IGNORECASE if ignore_case else 0
     compiled_regex = re.compile(regex, flags=flags)
-    return lambda x: _substitute_regex(x, compiled_regex, substitution)
+    return RegexSubstitution(compiled_regex, substitution, trigger, multiline)
+
+
+# A compiled and immutable normalization plan, see
+# `MosesPunctuationNormalizer.normalization_plan()`. Every group is a tuple of
+# (prefilter, steps), where *prefilter* is a compiled character class which
+# needs to match the string for any step of the group to change it (or None),
+# and *steps* are (trigger, rewrite) tuples as in `RulePlan` of tokenize.py.
+# The *block_groups* apply the same steps to many lines at once, the steps
+# of the rules that can match across lines are applied line by line (they are
+# None if a rule can insert newlines, then the lines are normalized one by one).
+NormalizationPlan = namedtuple('NormalizationPlan', ['groups', 'block_groups'])
+
+
+# The lines of a text with their newlines, only '\n' ends the lines.
+_LINES = re.compile(r'[^\n]+\n?|\n')
+
+
+def _rewrite_lines(lines, rewrite, string):
+    return lines.sub(lambda line: rewrite(line.group()), string)
+
+
+def _line_by_line(trigger, rewrite):
+    """
+    Returns the (trigger, rewrite) step applying the rewrite to the lines
+    with the trigger one by one.
+    """
+    # Anchored at the start of the lines, so a line is only scanned once.
+    lines = re.compile(r'^[^\n]*{}[^\n]*\n?'.format(re.escape(trigger or '')), re.MULTILINE)
+    return trigger, partial(_rewrite_lines, lines, rewrite)
+
+
+def _literals_commute(earlier, later):
+    """
+    Whether replacing the literal `earlier.pattern` and then the literal
+    `later.pattern` gives the same string as replacing both in a single
+    left-to-right pass which prefers `earlier.pattern`, for any string.
+    """
+    pattern, later_pattern = earlier.pattern, later.pattern
+    # A match of the later pattern can't overlap a match of the earlier
+    # pattern that starts after it, otherwise the single pass prefers it.
+    for start in range(1, len(later_pattern)):
+        suffix = later_pattern[start:]
+        if pattern.startswith(suffix) or suffix.startswith(pattern):
+            return False
+    # The replacements of the earlier pattern can't make new matches of the
+    # later pattern, by containing its characters or by joining the text
+    # around a deleted match.
+    if set(later_pattern) & set(earlier.substitution):
+        return False
+    return bool(earlier.substitution) or len(later_pattern) == 1
+
+
+def _compile_literals(rules, block=False):
+    """
+    Returns the (trigger, rewrite) step replacing the literal rules in a
+    single pass: a `str.translate()` if all patterns are single characters,
+    or else an alternation of the patterns. The translation looks up every
+    character, so a `block` of many lines is rather searched for the patterns.
+    """
+    if len(rules) == 1:
+        return rules[0].trigger, rules[0]
+    if not block and all(len(rule.pattern) == 1 for rule in rules):
+        table = {}
+        for rule in rules:
+            table.setdefault(ord(rule.pattern), rule.substitution)
+        return None, lambda string: string.translate(table)
+    substitutions = {}
+    for rule in rules:
+        substitutions.setdefault(rule.pattern, rule.substitution)
+    regex = re.compile('|'.join(re.escape(rule.pattern) for rule in rules))
+    replace = lambda match: substitutions[match.group()]
+    return None, lambda string: regex.sub(replace, string)
+
+
+def _inserts_newline(rule):
+    if isinstance(rule, Substitution):
+        return '\n' in rule.substitution
+    # The escapes of the regex templates are expanded.
+    return callable(rule.substitution) or '\n' in rule.substitution or \
+            '\\n' in rule.substitution
+
+
+def _matches_lines(rule):
+    """
+    Whether the rule can match across lines, see `RegexSubstitution`.
+    """
+    if isinstance(rule, Substitution):
+        return '\n' in rule.pattern
+    return rule.multiline
+
+
+def compile_rules(rules, block=False):
+    """
+    Compiles a group of rules into its (prefilter, steps), the runs of literal
+    rules that can be applied together are replaced by a single step. The
+    steps of a `block` are applied to many lines at once, so the rules that
+    can match across lines are applied to the lines one by one.
+    """
+    steps, literals = [], []
+    for rule in rules:
+        if (literals and isinstance(rule, Substitution) and not (block and _matches_lines(rule)) and
+                all(_literals_commute(earlier, rule) for earlier in literals)):
+            literals.append(rule)
+            continue
+        if literals:
+            steps.append(_compile_literals(literals, block))
+            literals = []
+        if block and _matches_lines(rule):
+            steps.append(_line_by_line(rule.trigger, rule))
+        elif isinstance(rule, Substitution):
+            literals.append(rule)
+        else:
+            steps.append((rule.trigger, rule))
+    if literals:
+        steps.append(_compile_literals(literals, block))
+    # Every rule needs the first character of its trigger, so the group can't
+    # change the strings without any of them.
+    if not rules or any(rule.trigger is None for rule in rules):
+        return None, tuple(steps)
+    chars = sorted(set(rule.trigger[0] for rule in rules))
+    prefilter = re.compile('[{}]'.format(''.join(re.escape(char) for char in chars)))
+    return prefilter, tuple(steps)
+
+
+def _apply_groups(groups, string):
+    for prefilter, steps in groups:
+        if prefilter is not None and not prefilter.search(string):
+            continue
+        for trigger, rewrite in steps:
+            if trigger is None or trigger in string:
+                string = rewrite(string)
+    return string
 
 
 class MosesPunctuationNormalizer:
@@ -36,11 +201,11 @@ class MosesPunctuationNormalizer:
         substitute('\r', ''),
         substitute('(', ' ('),
         substitute(')', ') '),
-        substitute_regex(r' +', r' '),  # TODO why twice? see line 90
-        substitute_regex(r'\) ([.!:?;,])', r')\g<1>'),
+        substitute_regex(r' +', r' ', trigger='  ', multiline=False),  # TODO why twice? see line 90
+        substitute_regex(r'\) ([.!:?;,])', r')\g<1>', trigger=') ', multiline=False),
         substitute('( ', '('),
         substitute(' )', ')'),
-        substitute_regex(r'(\d) %', r'\g<1>%'),
+        substitute_regex(r'(\d) %', r'\g<1>%', trigger=' %', multiline=False),
         substitute(' :', ':'),
         substitute(' ;', ';'),
     ]
@@ -56,11 +221,11 @@ class MosesPunctuationNormalizer:
         substitute('”', '"'),
         substitute('–', '-'),
         substitute('—', ' - '),
-        substitute_regex(r' +', r' '),
+        substitute_regex(r' +', r' ', trigger='  ', multiline=False),
         substitute('´', "'"),
-        substitute_regex(r'(\w)‘([\w"«»])', r"\g<1>'\g<2>", ignore_case=True),
-        substitute_regex(r'(\w)’([\w"«»])', r"\g<1>'\g<2>", ignore_case=True),
-        substitute_regex(r'(\w)‚([\w"«»])', r"\g<1>'\g<2>", ignore_case=True),
+        substitute_regex(r'(\w)‘([\w"«»])', r"\g<1>'\g<2>", ignore_case=True, trigger='‘', multiline=False),
+        substitute_regex(r'(\w)’([\w"«»])', r"\g<1>'\g<2>", ignore_case=True, trigger='’', multiline=False),
+        substitute_regex(r'(\w)‚([\w"«»])', r"\g<1>'\g<2>", ignore_case=True, trigger='‚', multiline=False),
         substitute('‘', '"'),
         substitute('‚', '"'),
         # TODO this can cause problems. (In some texts right single quotation marks are used as apostrophes)
@@ -90,68 +255,134 @@ class MosesPunctuationNormalizer:
         substitute('\N{NO-BREAK SPACE}!', '!'),
         substitute('\N{NO-BREAK SPACE};', ';'),
         substitute(',\N{NO-BREAK SPACE}', ', '),
-        substitute_regex(r' +', r' '),
+        substitute_regex(r' +', r' ', trigger='  ', multiline=False),
     ]
 
     SUBSTITUTIONS_EN_QUOTATION_FOLLOWED_BY_COMMA = [
-        substitute_regex(r'"([,.]+)', r'\g<1>"'),
+        substitute_regex(r'"([,.]+)', r'\g<1>"', trigger='"', multiline=False),
     ]
 
     SUBSTITUTIONS_DE_ES_FR_QUOTATION_FOLLOWED_BY_COMMA = [
         substitute(',"', '",'),
-        substitute_regex(r'(\.+)"(\s*[^<])', r'"\g<1>\g<2>'),  # don't fix period at end of sentence
+        substitute_regex(r'(\.+)"(\s*[^<])', r'"\g<1>\g<2>', trigger='."'),  # don't fix period at end of sentence
     ]
 
     SUBSTITUTIONS_DE_ES_CZ_CS_FR = [
-        substitute_regex(r'(\d) (\d)', r'\g<1>,\g<2>'),
+        substitute_regex(r'(\d) (\d)', r'\g<1>,\g<2>', trigger='\N{NO-BREAK SPACE}', multiline=False),
     ]
 
     SUBSTITUTIONS_OTHER = [
-        substitute_regex(r'(\d) (\d)', r'\g<1>.\g<2>'),
+        substitute_regex(r'(\d) (\d)', r'\g<1>.\g<2>', trigger='\N{NO-BREAK SPACE}', multiline=False),
     ]
 
-    def __init__(self, language='en', penn= False):
+    # The compiled `NormalizationPlan` of every (language, penn,
+    # norm_quote_commas, norm_numbers), see `normalization_plan()`.
+    _NORMALIZATION_PLANS = {}
+
+    def __init__(self, language='en', penn= False,
+                 norm_quote_commas=True, norm_numbers=True, cache_size=0):
         """
         Python port of the Moses Perl script for normalization of punctuation.
 
         :param language: The two-letter language code.
         :param penn: Use Penn Treebank style normalization.
+        :param norm_quote_commas: Normalize the quotations and commas.
+        :param norm_numbers: Normalize the separators of numbers.
+        :param cache_size: The no. of normalized lines kept in a `LRUCache`
+            (`self.cache`) to skip the substitutions on repeated lines, or 0
+            to disable the cache.
         """
         self.language = language
         self.penn = penn
-        # assemble sequence of substitutions
-        self.substitutions = self.SUBSTITUTIONS_EXTRA_WHITESPACE
+        self.norm_quote_commas = norm_quote_commas
+        self.norm_numbers = norm_numbers
+        # The options are fixed per normalizer, so the lines are the keys.
+        self.cache = LRUCache(cache_size) if cache_size else None
+        # The sequence of substitutions, applied by the compiled plan.
+        self.substitutions = [rule for rules in self.substitution_groups() for rule in rules]
+        self.plan = self.normalization_plan()
+
+    def substitution_groups(self):
+        """
+        Returns the groups of substitutions applied in sequence, for the
+        options of the normalizer.
+        """
+        groups = [self.SUBSTITUTIONS_EXTRA_WHITESPACE]
         if not self.penn:
-            self.substitutions += self.SUBSTITUTIONS_NORMALIZE_UNICODE_IF_NOT_PENN
-        self.substitutions += self.SUBSTITUTIONS_NORMALIZE_UNICODE
-        self.substitutions += self.SUBSTITUTIONS_FRENCH_QUOTES
-        self.substitutions += self.SUBSTITUTIONS_HANDLE_PSEUDO_SPACES
-        if self.language == 'en':
-            self.substitutions += self.SUBSTITUTIONS_EN_QUOTATION_FOLLOWED_BY_COMMA
-        else:
-            self.substitutions += self.SUBSTITUTIONS_DE_ES_FR_QUOTATION_FOLLOWED_BY_COMMA
-        if self.language in ['de', 'es', 'cz', 'cs', 'fr']:
-            self.substitutions += self.SUBSTITUTIONS_DE_ES_CZ_CS_FR
-        else:
-            self.substitutions += self.SUBSTITUTIONS_OTHER
+            groups.append(self.SUBSTITUTIONS_NORMALIZE_UNICODE_IF_NOT_PENN)
+        groups.append(self.SUBSTITUTIONS_NORMALIZE_UNICODE)
+        groups.append(self.SUBSTITUTIONS_FRENCH_QUOTES)
+        groups.append(self.SUBSTITUTIONS_HANDLE_PSEUDO_SPACES)
+        if self.norm_quote_commas:
+            if self.language == 'en':
+                groups.append(self.SUBSTITUTIONS_EN_QUOTATION_FOLLOWED_BY_COMMA)
+            else:
+                groups.append(self.SUBSTITUTIONS_DE_ES_FR_QUOTATION_FOLLOWED_BY_COMMA)
+        if self.norm_numbers:
+            if self.language in ['de', 'es', 'cz', 'cs', 'fr']:
+                groups.append(self.SUBSTITUTIONS_DE_ES_CZ_CS_FR)
+            else:
+                groups.append(self.SUBSTITUTIONS_OTHER)
+        return groups
+
+    def normalization_plan(self):
+        """
+        Returns the compiled `NormalizationPlan` of the substitutions. Plans
+        are built once per (language, penn, norm_quote_commas, norm_numbers)
+        combination and cached at class level.
+        """
+        key = (type(self), self.language, self.penn, self.norm_quote_commas, self.norm_numbers)
+        plan = self._NORMALIZATION_PLANS.get(key)
+        if plan is None:
+            rule_groups = self.substitution_groups()
+            groups = tuple(compile_rules(rules) for rules in rule_groups)
+            if any(_inserts_newline(rule) for rules in rule_groups for rule in rules):
+                block_groups = None
+            else:
+                block_groups = tuple(compile_rules(rules, block=True) for rules in rule_groups)
+            plan = self._NORMALIZATION_PLANS[key] = NormalizationPlan(groups, block_groups)
+        return plan
 
     def normalize(self, string):
         """
         Returns a string with normalized punctuation.
         """
-        for sub in self.substitutions:
-            string = sub(string)
-        return string
+        if self.cache is None:
+            return self._normalize(string)
+        normalized = self.cache.get(string)
+        if normalized is None:
+            normalized = self._normalize(string)
+            self.cache.put(string, normalized)
+        return normalized
+
+    def _normalize(self, string):
+        return _apply_groups(self.plan.groups, string)
+
+    def normalize_block(self, text):
+        """
+        Returns the text with normalized punctuation, the same as normalizing
+        its lines (with their newlines) one by one, but every rule is applied
+        to all the lines at once.
+        """
+        if self.plan.block_groups is None:
+            return ''.join(self._normalize(line) for line in _LINES.findall(text))
+        return _apply_groups(self.plan.block_groups, text)
+
+    def normalize_stream(self, stream, block_size=2 ** 22):
+        """
+        Lazily normalizes a text file object, in blocks of complete lines of
+        about `block_size` characters, see `normalize_block()`, and yields
+        the normalized blocks.
+        """
+        for block in read_blocks(stream, block_size):
+            yield self.normalize_block(block)
 
 
 # Alias for forward compatibility with upstream
 class MosesPunctNormalizer(MosesPunctuationNormalizer):
-    def __init__(self, lang='en', penn=False, norm_quote_commas=True, norm_numbers=True):
-        super().__init__(language=lang, penn=penn)
-        if not norm_quote_commas:
-            norm_quote_comma_rules = self.SUBSTITUTIONS_EN_QUOTATION_FOLLOWED_BY_COMMA + self.SUBSTITUTIONS_DE_ES_FR_QUOTATION_FOLLOWED_BY_COMMA
-            self.substitutions = [s for s in self.substitutions if s not in norm_quote_comma_rules]
-
-        if not norm_numbers:
-            norm_number_rules = self.SUBSTITUTIONS_DE_ES_CZ_CS_FR + self.SUBSTITUTIONS_OTHER
-            self.substitutions = [s for s in self.substitutions if s not in norm_number_rules]
+    def __init__(self, lang='en', penn=False, norm_quote_commas=True, norm_numbers=True, cache_size=0):
+        super().__init__(language=lang, penn=penn, norm_quote_commas=norm_quote_commas,
+                         norm_numbers=norm_numbers, cache_size=cache_size)
+
+
+__all__ = ['MosesPunctuationNormalizer', 'MosesPunctNormalizer', 'NormalizationPlan']
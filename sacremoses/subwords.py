@@ -2,75 +2,259 @@
 
 from __future__ import print_function
 
-import copy
+import heapq
+import os
+import pickle
+from array import array
 from collections import Counter, defaultdict
-from functools import reduce
-from itertools import tee
+from functools import partial
+from itertools import chain
 
-from sacremoses.util import pairwise
+from six import string_types
+
+from sacremoses.util import chunks, pairwise, parallelize_preprocess, parallel_reduce, read_blocks, LRUCache
+
+# Hack to enable Python2.7 to use encoding.
+import sys
+if sys.version_info[0] < 3:
+    import io
+    open = io.open
+
+
+# The pairs of symbol IDs are keyed by single ints, the ID of the first symbol
+# is shifted left by `_PAIR_SHIFT` bits, see `SubwordTokenizer.pair_key()`.
+_PAIR_SHIFT = 32
+_SYMBOL_MASK = (1 << _PAIR_SHIFT) - 1
+
+
+def _word_indices():
+    """
+    The indices of the words with a pair, with repeats, see `get_pair_statistics()`.
+    """
+    return array('I')
+
+
+class _MergeCandidate(object):
+    """
+    A (count, pair) entry of the heap of pairs to merge. `heapq` is a min-heap,
+    so the most frequent pair (and then the greatest pair, as in subword-nmt)
+    is the smallest entry. The pairs are compared with the end of word marker
+    of subword-nmt, so both learn the same merges.
+    """
+    __slots__ = ('count', 'pair', 'key')
+
+    def __init__(self, count, pair, symbols):
+        self.count = count
+        self.pair = pair
+        # Only the second symbol can end a word.
+        first, second = symbols
+        if second.endswith(u"\uE000"):
+            second = second[:-1] + u"</w>"
+        self.key = (count, first, second)
+
+    def __lt__(self, other):
+        return self.key > other.key
 
 
 class SubwordTokenizer(object):
     """
     This is a Python port of the Subword NMT from
     https://github.com/rsennrich/subword-nmt
+
+    The merges are learned from the words of the `filename`, or loaded from
+    the codes file `load_from` (as saved by `save_merges()` or subword-nmt),
+    to encode words into subword units.
     """
-    def __init__(self, filename):
-        #
-        self.vocab = self.get_vocabulary(filename)
-        self.stats, self.indices = self.get_pair_statistics()
-        self.big_stats = copy.deepcopy(self.stats)
+    # The end of word marker of the symbols, it is "</w>" in the codes files.
+    END_OF_WORD = u"\uE000"
+    CODES_END_OF_WORD = u"</w>"
+    CODES_VERSION = u"#version: 0.2"
+    # The version of the learner state of the checkpoints, see `save_checkpoint()`.
+    CHECKPOINT_VERSION = 2
+
+    def __init__(self, filename=None, load_from=None, separator=u"@@",
+                 cache_size=2 ** 20, encoding='utf8', processes=1):
+        """
+        :param processes: No. of processes counting the words of the `filename`.
+        :type processes: int
+        :param separator: The suffix of the subword units that don't end a word.
+        :type separator: str
+        :param cache_size: No. of distinct words whose subword units are
+            cached, 0 disables the cache.
+        :type cache_size: int
+        """
+        self.separator = separator
+        self.encoding = encoding
+        self.cache = LRUCache(cache_size) if cache_size else None
+        self.merges = self.load_merges(load_from) if load_from else []
+        # The ranks of the merges, see `merge_ranks()`.
+        self._ranks, self._num_ranked = {}, 0
+        self.merge_ranks()
+        # The learner interns the symbols as IDs, see `symbol_id()`, the words
+        # are arrays of symbol IDs, and the pairs are ints, see `pair_key()`.
+        self.symbols, self.symbol_ids = [], {}
+        self.words, self.freqs = [], []
+        self.stats, self.indices = Counter(), defaultdict(_word_indices)
+        if filename:
+            self.set_vocabulary(self.get_vocabulary(filename, processes=processes))
+
+    def get_vocabulary(self, filename, is_dict=False, processes=1, progress_bar=False):
+        """
+        Reads the vocabulary of a file of space separated tokens, or of a
+        dictionary of "word count" lines, see `count_vocabulary()`. The file is
+        streamed, so it isn't loaded into memory.
+        """
+        with open(filename, encoding=self.encoding) as fin:
+            if not is_dict:
+                # The blocks of lines are counted (and sent to the workers)
+                # faster than the lines one by one.
+                return self.count_vocabulary(read_blocks(fin, 2 ** 12), processes,
+                                             progress_bar=progress_bar)
+            vocab = Counter()
+            for line in fin:
+                word, count = line.strip().split(' ')
+                vocab[word] += int(count)
+        return self.symbolize_vocabulary(vocab)
 
-    def get_vocabulary(self, filename, is_dict=False):
+    def count_vocabulary(self, documents, processes=1, progress_bar=False):
+        """
+        Counts the words of the documents, e.g. from `MosesTokenizer.tokenize_iter()`,
+        and returns the vocabulary, see `symbolize_vocabulary()`.
+
+        :param documents: The lists of tokens, or the lines of space separated tokens.
+        :type documents: iter(list(str)) or iter(str)
+        :param processes: No. of processes, every worker counts its share of
+            the documents and the counts of the workers are merged, see
+            `parallel_reduce()`. (The words of the same frequency may then be
+            listed in another order, which doesn't change the learned merges.)
+        :type processes: int
+        """
+        vocab = parallel_reduce(self.count_words, self.merge_counts, documents,
+                                processes, progress_bar=progress_bar)
+        return self.symbolize_vocabulary(vocab or Counter())
+
+    @staticmethod
+    def count_words(documents):
+        """
+        Returns the Counter of the tokens of the documents.
+        """
         vocab = Counter()
-        with open(filename) as fin:
-            if is_dict:
-                for line in fin:
-                    word, count = line.strip().split(' ')
-                    vocab[word] += int(count)
+        # Counting many documents at once is faster than one by one.
+        for chunk in chunks(documents, 10000):
+            if isinstance(chunk[0], string_types):
+                vocab.update(u" ".join(chunk).split())
             else:
-                vocab.update(fin.read().split())
+                vocab.update(chain.from_iterable(chunk))
+        return vocab
+
+    @staticmethod
+    def merge_counts(vocab, other_vocab):
+        """
+        Adds the counts of `other_vocab` to `vocab`.
+        """
+        vocab.update(other_vocab)
+        return vocab
+
+    @staticmethod
+    def symbolize_vocabulary(vocab):
+        """
+        Returns the list of (symbols, frequency) of the words of the Counter,
+        most frequent first.
+        """
         # Converts the string keys to tuples of characters,
         # adds u"\uE000" to the last character.
-        vocab = Counter({tuple(k[:-1])+(k[-1]+u"\uE000",):v
-                         for (k,v) in vocab.items()})
-        return vocab.most_common()
+        return [(tuple(k[:-1])+(k[-1]+u"\uE000",), v) for (k, v) in vocab.most_common()]
+
+    def set_vocabulary(self, vocab):
+        """
+        Sets the words to learn the merges from, a list of (symbols, frequency),
+        and counts their pairs of symbols.
+        """
+        symbol_id = self.symbol_id
+        self.words = [array('I', [symbol_id(symbol) for symbol in word]) for word, _ in vocab]
+        self.freqs = [freq for _, freq in vocab]
+        self.stats, self.indices = self.get_pair_statistics()
+
+    @property
+    def vocab(self):
+        """
+        The list of (symbols, frequency) of the words.
+        """
+        symbols = self.symbols
+        return [(tuple(symbols[symbol] for symbol in word), freq)
+                for word, freq in zip(self.words, self.freqs)]
+
+    def symbol_id(self, symbol):
+        """
+        Returns the ID of the symbol, interning it if it is new.
+        """
+        symbol_id = self.symbol_ids.get(symbol)
+        if symbol_id is None:
+            symbol_id = self.symbol_ids[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        return symbol_id
+
+    @staticmethod
+    def pair_key(first, second):
+        """
+        Returns the int key of the pair of symbol IDs.
+        """
+        return first << _PAIR_SHIFT | second
+
+    def pair_symbols(self, pair):
+        """
+        Returns the (first, second) symbols of the pair key.
+        """
+        return self.symbols[pair >> _PAIR_SHIFT], self.symbols[pair & _SYMBOL_MASK]
 
     def get_pair_statistics(self):
         """Count frequency of all symbol pairs, and create index"""
         # Data structure of pair frequencies
         stats = Counter()
-        # Index from pairs to words
-        indices = defaultdict(lambda: Counter())
+        # Index from pairs to the words which have (or had) them, an array of
+        # word indices per pair is much smaller than a set or a Counter. The
+        # words are added once per occurrence and never removed, the repeats
+        # and the words which lost the pair are skipped in `replace_pair()`.
+        indices = defaultdict(_word_indices)
 
-        for i, (word, freq) in enumerate(self.vocab):
+        for i, (word, freq) in enumerate(zip(self.words, self.freqs)):
             for prev, curr in pairwise(word):
-                stats[prev, curr] += freq
-                indices[prev, curr][i] += 1
+                pair = prev << _PAIR_SHIFT | curr
+                stats[pair] += freq
+                indices[pair].append(i)
 
         return stats, indices
 
-    def modify_token(self, token, pair):
+    @staticmethod
+    def modify_token(token, first, second, merged):
         """
-        From https://stackoverflow.com/a/40367074/610569
-            >>> modify_token(('s', 'h', 'e', 'r', 'l', 'o', 'c', 'k'), ('h', 'e'))
-            ('S', 'he', 'r', 'l', 'o', 'c', 'k')
+        Returns the array of symbol IDs of the token, with the occurrences of
+        the (first, second) pair replaced by the merged symbol, left to right.
         """
-        first, second = pair
-        pair_str = ''.join(pair).replace('\\','\\\\')
-        f = lambda acc, e: acc[:-1] + (pair_str,) if acc[-1] == first and e == second else acc + (e,)
-        return reduce(f, token[1:], (token[0],))
+        new_token = array('I')
+        i, last = 0, len(token) - 1
+        while i <= last:
+            if i < last and token[i] == first and token[i + 1] == second:
+                new_token.append(merged)
+                i += 2
+            else:
+                new_token.append(token[i])
+                i += 1
+        return new_token
 
     def replace_pair(self, pair):
         """Replace all occurrences of a symbol pair ('A', 'B') with a new symbol 'AB'"""
+        first, second = pair >> _PAIR_SHIFT, pair & _SYMBOL_MASK
+        merged = self.symbol_id(self.symbols[first] + self.symbols[second])
         changes = []
-        for j, freq in self.indices[pair].items():
-            if freq < 1:
+        for j in set(self.indices[pair]):
+            word = self.words[j]
+            new_word = self.modify_token(word, first, second, merged)
+            # The word may not have the pair anymore.
+            if len(new_word) == len(word):
                 continue
-            word, freq = self.vocab[j]
-            new_word = self.modify_token(word, pair)
-            self.vocab[j] = (new_word, freq)
-            changes.append((j, new_word, word, freq))
+            self.words[j] = new_word
+            changes.append((j, new_word, word, self.freqs[j]))
         return changes
 
     def update_pair_statistics(self, pair, changed):
@@ -78,95 +262,464 @@ class SubwordTokenizer(object):
         Minimally update the indices and frequency of symbol pairs
         if we merge a pair of symbols, only pairs that overlap with occurrences
         of this pair are affected, and need to be updated.
+
+        Returns the set of pairs whose frequency went up, i.e. the pairs with
+        the new symbol.
         """
-        self.stats[pair] = 0
-        self.indices[pair] = Counter()
-        first, second = pair
-        new_pair = first+second
+        increased = set()
+        stats, indices = self.stats, self.indices
+        stats[pair] = 0
+        indices[pair] = _word_indices()
+        first, second = pair >> _PAIR_SHIFT, pair & _SYMBOL_MASK
+        new_pair = self.symbol_ids[self.symbols[first] + self.symbols[second]]
         for j, word, old_word, freq in changed:
+            # `list.index()` takes a start (`array.index()` only in Python >= 3.10).
+            word, old_word = word.tolist(), old_word.tolist()
 
-            # Find all instances of pair in the old_word, and update frequency/indices around it
+            # Find all instances of pair in the old_word, and update frequency around it,
+            # the indices of the pairs that are gone are updated lazily, see `replace_pair()`.
             i = 0
-            # Keep moving down the old_word string until we cannot find
-            # the first char in the new_pair.
+            # Keep moving down the old_word until we cannot find the first symbol of the pair.
             while True:
                 try:
-                    # Find the next occurence of the first character in the new_pair.
+                    # Find the next occurence of the first symbol of the pair.
                     i = old_word.index(first, i)
                 except ValueError:
                     break
-                # Checks that old_word[i:i+1] is the same as new_pair.
-                # (i) `i < len(old_word)-1` checks that the index i is not the last character.
-                # (ii) `old_word[i+1]` checks that the char after the index is the second char in the new_pair.
+                # Checks that old_word[i:i+2] is the pair.
+                # (i) `i < len(old_word)-1` checks that the index i is not the last symbol.
+                # (ii) `old_word[i+1]` checks that the symbol after the index is the second symbol of the pair.
                 if i < len(old_word)-1 and old_word[i+1] == second:
                     # `if i` checks that i is non-zero.
-                    # We can skip the first char since there's no previous bigram.
+                    # We can skip the first symbol since there's no previous bigram.
                     if i:
                         # Find the previous bigram and reduce its count.
-                        prev = old_word[i-1:i+1]
-                        self.stats[prev] -= freq
-                        self.indices[prev][j] -= 1
-                    # `if < len(old_word)-2` checks that the new_pair is not at the end of the old_word.
+                        prev = old_word[i-1] << _PAIR_SHIFT | first
+                        stats[prev] -= freq
+                    # `if < len(old_word)-2` checks that the pair is not at the end of the old_word.
                     if i < len(old_word)-2:
                         # The multiple if conditions that follows checks that the bigram after i and i+1
-                        # is not the same as new_pair to avoid double-counting consecutive pairs.
-                        # (i)   `old_word[i+2] != first` checks that two chars after i, it isn't the same as
-                        #                          the first char in the new_pair.
-                        # (ii)  `old_word[i+3] != second` checks that three chars after i, it isn't the same
-                        #                         as the second char in the new_pair.
-                        # (iii) `i >= len(old_word)-3` checks that the i index is one of the last 4 chars in old_word.
+                        # is not the same as the pair to avoid double-counting consecutive pairs.
+                        # (i)   `old_word[i+2] != first` checks that two symbols after i, it isn't the same as
+                        #                          the first symbol of the pair.
+                        # (ii)  `old_word[i+3] != second` checks that three symbols after i, it isn't the same
+                        #                         as the second symbol of the pair.
+                        # (iii) `i >= len(old_word)-3` checks that the i index is one of the last 4 symbols in old_word.
                         # @rico: Is the `i >= len(old_word)-3` check to avoid IndexError?
                         if old_word[i+2] != first or i >= len(old_word)-3 or old_word[i+3] != second:
                             # Find the next bigram and reduce its count.
-                            # `nex` is the next bigram after new_pair.
-                            nex = old_word[i+1:i+3]
-                            self.stats[nex] -= freq
-                            self.indices[nex][j] -= 1
-                    # Now we move the ith index to two chars to the right when
-                    # old_word[i:i+1] is the same as new_pair.
+                            # `nex` is the next bigram after the pair.
+                            nex = second << _PAIR_SHIFT | old_word[i+2]
+                            stats[nex] -= freq
+                    # Now we move the ith index to two symbols to the right when
+                    # old_word[i:i+2] is the pair.
                     i += 2
-                else: # Otherwise, we move one char to the right.
+                else: # Otherwise, we move one symbol to the right.
                     i += 1
 
-            # Find all instances of pair in the new *word*, and update frequency/indices around it
-            # Reset the index to the start of the string.
+            # Find all instances of the new symbol in the new *word*, and update frequency/indices around it
+            # Reset the index to the start of the word.
             i = 0
-            # Similarly, we keep moving down the new *word* string until we cannot find
-            # the first char in the new_pair.
+            # Similarly, we keep moving down the new *word* until we cannot find the new symbol.
             while True:
                 try:
                     i = word.index(new_pair, i)
                 except ValueError:
                     break
-                # We are sure that the new_pair is in the new *word* so there's no need to
+                # We are sure that the new symbol is in the new *word* so there's no need to
                 # do an outer check as what was done in the old_word.
-                if i: # `if i` checks that i is non-zero, skip the first char since there's no previous bigram.
-                    prev = word[i-1:i+1]
+                if i: # `if i` checks that i is non-zero, skip the first symbol since there's no previous bigram.
+                    prev = word[i-1] << _PAIR_SHIFT | new_pair
                     # This time, we add the frequency back to the statistics and indices.
-                    self.stats[prev] += freq
-                    self.indices[prev][j] += 1
+                    stats[prev] += freq
+                    indices[prev].append(j)
+                    increased.add(prev)
                 # The multiple if conditions that follows checks that the bigram after i and i+1
-                # is not the same as new_pair to avoid double-counting consecutive pairs.
-                # `i < len(word)-1` checks if i is not the last character.
-                # `word[i+1]` checks that the next char is not the new_pair.
+                # is not the same as new symbol to avoid double-counting consecutive pairs.
+                # `i < len(word)-1` checks if i is not the last symbol.
+                # `word[i+1]` checks that the next symbol is not the new symbol.
                 if i < len(word)-1 and word[i+1] != new_pair:
-                    # `nex` is the next bigram after new_pair.
-                    nex = word[i:i+2]
+                    # `nex` is the next bigram after the new symbol.
+                    nex = new_pair << _PAIR_SHIFT | word[i+1]
                     # We add the frequency back to the statistics and indices.
-                    self.stats[nex] += freq
-                    self.indices[nex][j] += 1
-                # We move one char down the new *word*
+                    stats[nex] += freq
+                    indices[nex].append(j)
+                    increased.add(nex)
+                # We move one symbol down the new *word*
                 i += 1
+        return increased
+
+    def candidates(self, threshold):
+        """
+        Returns the heap of the pairs at least `threshold` times frequent.
+        """
+        heap = [_MergeCandidate(count, pair, self.pair_symbols(pair))
+                for pair, count in self.stats.items() if count >= threshold and count > 0]
+        heapq.heapify(heap)
+        return heap
+
+    def pop_most_frequent(self, heap, threshold):
+        """
+        Pops the most frequent pair off the heap of candidates, or returns None
+        if no candidate is at least `threshold` times frequent anymore.
+
+        The counts of the pairs only go up when the pairs are pushed again (see
+        `update_pair_statistics()`), so the stale entries are lazily dropped,
+        or pushed again with their lower count, when they are popped.
+        """
+        while heap:
+            candidate = heapq.heappop(heap)
+            count = self.stats[candidate.pair]
+            if count == candidate.count:
+                return candidate.pair
+            if threshold <= count < candidate.count:
+                heapq.heappush(heap, _MergeCandidate(count, candidate.pair, self.pair_symbols(candidate.pair)))
+        return None
+
+    def merged_symbols(self, pair):
+        """
+        Returns the IDs of the symbols of the pair and of the merged symbol (if
+        it was seen before), a merge only changes the counts of the pairs
+        with any of these symbols.
+        """
+        first, second = pair >> _PAIR_SHIFT, pair & _SYMBOL_MASK
+        merged = self.symbol_ids.get(self.symbols[first] + self.symbols[second])
+        return {first, second} if merged is None else {first, second, merged}
 
+    def pop_merges(self, heap, threshold, jump, min_freq):
+        """
+        Pops the next pairs to merge off the heap, at most `jump` of the most
+        frequent pairs which don't share any symbols, see `merged_symbols()`.
+        The first pair which shares symbols with the pairs before is pushed
+        back, so the pairs are merged in the same order as one at a time.
+        """
+        pairs, used = [], set()
+        while len(pairs) < jump:
+            pair = self.pop_most_frequent(heap, threshold)
+            if pair is None:
+                break
+            symbols = self.merged_symbols(pair)
+            if pairs and (symbols & used or self.stats[pair] < min_freq):
+                heapq.heappush(heap, _MergeCandidate(self.stats[pair], pair, self.pair_symbols(pair)))
+                break
+            pairs.append(pair)
+            used |= symbols
+        return pairs
 
-    def learn(self, num_symbols, min_freq=2, jump=1, is_dict=None):
+    def replace_pairs(self, pairs):
+        """
+        Merges the pairs, which don't share any symbols, in a single pass over
+        the words which have any of them, updates the statistics and indices
+        of the pairs of the changed words, and returns the set of pairs whose
+        frequency went up, i.e. the pairs with a new symbol.
+        """
+        stats, indices = self.stats, self.indices
+        # No symbol is in two of the pairs, so the pairs can be found by their first symbol.
+        merges, merged_symbols, changed = {}, set(), set()
+        for pair in pairs:
+            first, second = pair >> _PAIR_SHIFT, pair & _SYMBOL_MASK
+            merged = self.symbol_id(self.symbols[first] + self.symbols[second])
+            merges[first] = (second, merged)
+            merged_symbols.add(merged)
+            changed.update(indices[pair])
+            stats[pair] = 0
+            indices[pair] = _word_indices()
+        increased = set()
+        for j in changed:
+            old_word = self.words[j]
+            word = array('I')
+            # The positions of the merges in the old and the new word.
+            starts, positions = [], []
+            i, last = 0, len(old_word) - 1
+            while i <= last:
+                symbol = old_word[i]
+                merge = merges.get(symbol)
+                if merge is not None and i < last and old_word[i + 1] == merge[0]:
+                    starts.append(i)
+                    positions.append(len(word))
+                    word.append(merge[1])
+                    i += 2
+                else:
+                    word.append(symbol)
+                    i += 1
+            if not starts:
+                continue
+            self.words[j] = word
+            freq = self.freqs[j]
+            # The pairs around the merges are gone, a pair between two merges
+            # is only counted for the later merge.
+            for n, i in enumerate(starts):
+                if i:
+                    stats[old_word[i - 1] << _PAIR_SHIFT | old_word[i]] -= freq
+                if i + 2 <= last and (n + 1 == len(starts) or starts[n + 1] != i + 2):
+                    stats[old_word[i + 1] << _PAIR_SHIFT | old_word[i + 2]] -= freq
+            # And the pairs around the new symbols are new, likewise.
+            last = len(word) - 1
+            for n, k in enumerate(positions):
+                if k:
+                    pair = word[k - 1] << _PAIR_SHIFT | word[k]
+                    stats[pair] += freq
+                    indices[pair].append(j)
+                    increased.add(pair)
+                if k < last and (n + 1 == len(positions) or positions[n + 1] != k + 1):
+                    pair = word[k] << _PAIR_SHIFT | word[k + 1]
+                    stats[pair] += freq
+                    indices[pair].append(j)
+                    increased.add(pair)
+        return increased
+
+    def learn(self, num_symbols, min_freq=2, jump=1, is_dict=None,
+              checkpoint=None, checkpoint_every=1000, resume_from=None):
+        """
+        Learns (at most) `num_symbols` merges of the most frequent pair of
+        symbols, until no pair is seen at least `min_freq` times, and returns
+        the list of merged pairs (also kept in `self.merges`).
+
+        Only the pairs which are at least a threshold frequent are kept in a
+        heap, so a merge only costs the updates of the pairs it changes. The
+        threshold is lowered when the heap runs out of pairs, as in
+        subword-nmt.
+
+        :param jump: No. of merges per pass over the words. The most frequent
+            pairs are merged together if they don't share symbols, so they
+            don't change each others' counts, see `pop_merges()`. But a
+            pair made by a merge can be more frequent than the pairs merged
+            with it, then it would have been merged before them one at a time.
+        :type jump: int
+        :param checkpoint: The file to save the state of the learner to, every
+            `checkpoint_every` merges and at the end, see `save_checkpoint()`.
+        :type checkpoint: str
+        :param resume_from: A checkpoint to continue learning from, the merges
+            of the checkpoint count towards the `num_symbols`. The merges are
+            the same as if the learning was never stopped.
+        :type resume_from: str
+        """
+        if resume_from:
+            self.load_checkpoint(resume_from)
+            num_symbols -= len(self.merges)
         # threshold is inspired by Zipfian assumption, but should only affect speed
-        threshold = max(self.stats.values()) / 10
-        for i in range(num_symbols):
-            most_freq_tokens = self.stats.most_common(jump)
-            for token, count in most_freq_tokens:
-                changes = self.replace_pair(token)
-                self.update_pair_statistics(token, changes)
-                self.stats[token] = 0
-                if self.stats[token] < min_freq:
-                    return
+        threshold = max(self.stats.values() or [0]) / 10
+        heap = self.candidates(threshold)
+        learned, next_checkpoint = 0, checkpoint_every
+        while learned < num_symbols:
+            pairs = self.pop_merges(heap, threshold, min(jump, num_symbols - learned), min_freq)
+            if not pairs:
+                # Lower the threshold and fill the heap with the pairs left out.
+                most_frequent = max(self.stats.values() or [0])
+                threshold = most_frequent * learned / (learned + 10000.0)
+                heap = self.candidates(threshold)
+                pairs = self.pop_merges(heap, threshold, min(jump, num_symbols - learned), min_freq)
+            if not pairs or self.stats[pairs[0]] < min_freq:
+                break
+            self.merges.extend(self.pair_symbols(pair) for pair in pairs)
+            learned += len(pairs)
+            if len(pairs) == 1:
+                increased = self.update_pair_statistics(pairs[0], self.replace_pair(pairs[0]))
+            else:
+                increased = self.replace_pairs(pairs)
+            for changed in increased:
+                count = self.stats[changed]
+                if count >= threshold:
+                    heapq.heappush(heap, _MergeCandidate(count, changed, self.pair_symbols(changed)))
+            if checkpoint and learned >= next_checkpoint:
+                self.save_checkpoint(checkpoint)
+                next_checkpoint = learned + checkpoint_every
+        if checkpoint:
+            self.save_checkpoint(checkpoint)
+        return self.merges
+
+    def save_checkpoint(self, filename):
+        """
+        Saves the state of the learner, to continue learning from it with
+        `learn(resume_from=filename)`: the merges, the symbols, the words and
+        the statistics and indices of the pairs. The words and the pairs are
+        flattened into arrays (of the types of Python 2 as well), which are
+        pickled as bytes.
+
+        The checkpoint is written next to the file and then renamed, so that
+        a learner stopped while saving leaves the previous checkpoint intact.
+        """
+        words, word_lengths = array('I'), array('I')
+        for word in self.words:
+            words.extend(word)
+            word_lengths.append(len(word))
+        # The pairs which were merged can have negative counts, see
+        # `update_pair_statistics()`, so only the zero counts are dropped.
+        stats = [(pair, count) for pair, count in self.stats.items() if count]
+        # The repeats of the word indices are dropped.
+        indices, index_pairs, index_lengths = array('I'), [], array('I')
+        for pair, word_indices in self.indices.items():
+            if word_indices:
+                word_indices = sorted(set(word_indices))
+                indices.extend(word_indices)
+                index_pairs.append(pair)
+                index_lengths.append(len(word_indices))
+        # The pair keys are split into the IDs of their symbols, and the counts
+        # are doubles, which are exact up to 2 ** 53.
+        state = {'version': self.CHECKPOINT_VERSION,
+                 'merges': self.merges, 'symbols': self.symbols, 'freqs': self.freqs,
+                 'words': words, 'word_lengths': word_lengths,
+                 'pair_firsts': array('I', [pair >> _PAIR_SHIFT for pair, _ in stats]),
+                 'pair_seconds': array('I', [pair & _SYMBOL_MASK for pair, _ in stats]),
+                 'counts': array('d', [count for _, count in stats]),
+                 'indices': indices, 'index_lengths': index_lengths,
+                 'index_firsts': array('I', [pair >> _PAIR_SHIFT for pair in index_pairs]),
+                 'index_seconds': array('I', [pair & _SYMBOL_MASK for pair in index_pairs])}
+        temporary = filename + '.tmp'
+        with open(temporary, 'wb') as fout:
+            pickle.dump(state, fout, pickle.HIGHEST_PROTOCOL)
+        getattr(os, 'replace', os.rename)(temporary, filename)
+
+    def load_checkpoint(self, filename):
+        """
+        Restores the state of the learner saved by `save_checkpoint()`.
+        """
+        with open(filename, 'rb') as fin:
+            state = pickle.load(fin)
+        if state.get('version') != self.CHECKPOINT_VERSION:
+            raise ValueError('{} is not a checkpoint of version {}'.format(
+                filename, self.CHECKPOINT_VERSION))
+        self.merges = state['merges']
+        self.symbols = state['symbols']
+        self.symbol_ids = {symbol: symbol_id for symbol_id, symbol in enumerate(self.symbols)}
+        self.freqs = state['freqs']
+        self.words, start = [], 0
+        for length in state['word_lengths']:
+            self.words.append(state['words'][start:start + length])
+            start += length
+        pair_key = self.pair_key
+        self.stats = Counter({pair_key(first, second): int(count) for first, second, count
+                              in zip(state['pair_firsts'], state['pair_seconds'], state['counts'])})
+        self.indices, start = defaultdict(_word_indices), 0
+        for first, second, length in zip(state['index_firsts'], state['index_seconds'],
+                                         state['index_lengths']):
+            self.indices[pair_key(first, second)] = state['indices'][start:start + length]
+            start += length
+        # The ranks are rebuilt for the merges of the checkpoint.
+        self._num_ranked = -1
+        self.merge_ranks()
+
+
+    def load_merges(self, filename):
+        """
+        Reads the merges from a codes file, one pair of symbols per line.
+        """
+        merges = []
+        with open(filename, encoding=self.encoding) as fin:
+            for i, line in enumerate(fin):
+                if i == 0 and line.startswith(u"#version:"):
+                    continue
+                first, second = line.rstrip(u"\n").split(u" ")
+                if second.endswith(self.CODES_END_OF_WORD):
+                    second = second[:-len(self.CODES_END_OF_WORD)] + self.END_OF_WORD
+                merges.append((first, second))
+        return merges
+
+    def save_merges(self, filename):
+        """
+        Writes the merges to a codes file, in the format of subword-nmt.
+        """
+        with open(filename, 'w', encoding=self.encoding) as fout:
+            fout.write(self.CODES_VERSION + u"\n")
+            for first, second in self.merges:
+                if second.endswith(self.END_OF_WORD):
+                    second = second[:-len(self.END_OF_WORD)] + self.CODES_END_OF_WORD
+                fout.write(u"{} {}\n".format(first, second))
+
+    def merge_ranks(self):
+        """
+        Returns the dict of the merged pairs to their rank, i.e. the index of
+        their (first) merge. It is rebuilt when merges were learned since.
+        """
+        if self._num_ranked != len(self.merges):
+            self._ranks = {}
+            for rank, pair in enumerate(self.merges):
+                self._ranks.setdefault(pair, rank)
+            self._num_ranked = len(self.merges)
+            # The cached words were encoded with the old merges.
+            if self.cache is not None:
+                self.cache.clear()
+        return self._ranks
+
+    def _encode_word(self, word, ranks):
+        symbols = list(word[:-1])
+        symbols.append(word[-1] + self.END_OF_WORD)
+        while len(symbols) > 1:
+            # Merge the pair with the lowest rank, at all its positions.
+            pairs = [pair for pair in zip(symbols, symbols[1:]) if pair in ranks]
+            if not pairs:
+                break
+            first, second = min(pairs, key=ranks.__getitem__)
+            merged, i = [], 0
+            while True:
+                # Jump to the next occurrence of the first symbol.
+                try:
+                    j = symbols.index(first, i)
+                except ValueError:
+                    merged.extend(symbols[i:])
+                    break
+                merged.extend(symbols[i:j])
+                if j < len(symbols) - 1 and symbols[j + 1] == second:
+                    merged.append(first + second)
+                    i = j + 2
+                else:
+                    merged.append(first)
+                    i = j + 1
+            symbols = merged
+        units = [symbol + self.separator for symbol in symbols[:-1]]
+        units.append(symbols[-1][:-len(self.END_OF_WORD)])
+        return tuple(units)
+
+    def encode_word(self, word):
+        """
+        Returns the subword units of a word, the pair of adjacent symbols
+        whose merge was learned first is merged until no pair was learned,
+        as in subword-nmt.
+
+            :return: tuple(str)
+        """
+        ranks = self.merge_ranks()
+        if self.cache is None:
+            return self._encode_word(word, ranks)
+        units = self.cache.get(word)
+        if units is None:
+            units = self._encode_word(word, ranks)
+            self.cache.put(word, units)
+        return units
+
+    def encode(self, tokens, return_str=False):
+        """
+        Splits the tokens into subword units.
+
+            :param tokens: A list of tokens, or a string of space separated tokens.
+            :type tokens: list(str) or str
+            :return: str if return_str else list(str)
+        """
+        if isinstance(tokens, string_types):
+            tokens = tokens.split()
+        units = []
+        for token in tokens:
+            units.extend(self.encode_word(token))
+        return u" ".join(units) if return_str else units
+
+    def encode_batch(self, lines, return_str=False):
+        """
+        Splits the tokens of many lines into subword units, see `encode()`.
+
+            :return: list(str) if return_str else list(list(str))
+        """
+        return [self.encode(line, return_str=return_str) for line in lines]
+
+    def encode_file(self, filename, return_str=True, processes=1):
+        """
+        Lazily splits the tokens of the lines of a file into subword units,
+        in order.
+
+        :param processes: No. of processes, the lines are encoded in batches
+            by worker processes which are sent the merges once.
+        :type processes: int
+        """
+        encode_batch = partial(self.encode_batch, return_str=return_str)
+        with open(filename, encoding=self.encoding) as fin:
+            for encoded in parallelize_preprocess(encode_batch, fin, processes, batched=True):
+                yield encoded
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for cli.py
+"""
+
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from sacremoses.normalize import MosesPunctNormalizer
+from sacremoses.subwords import SubwordTokenizer
+from sacremoses.tokenize import MosesTokenizer, MosesDetokenizer
+from sacremoses.truecase import MosesTruecaser
+
+
+class TestCLI(unittest.TestCase):
+    def setUp(self):
+        self.lines = [u"This ain't funny. It's actually hillarious, yet double Ls.",
+                      u'By the mid 1990s a version of the game (with a parliamentary setting).',
+                      u'',
+                      u'Die Landwirtschaft stellt nur 5,5 % der Arbeitsplätze der Union…'] * 50
+
+    def invoke(self, args, lines):
+        # The commands close stdout, so they are run in a subprocess.
+        command = [sys.executable, '-c', 'from sacremoses.cli import cli; cli()'] + args
+        process = subprocess.Popen(command, stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        output, _ = process.communicate((u'\n'.join(lines) + u'\n').encode('utf8'))
+        assert process.returncode == 0
+        return output.decode('utf8').split(u'\n')[:-1]
+
+    def test_tokenize(self):
+        moses = MosesTokenizer()
+        expected = [moses.tokenize(line, return_str=True) for line in self.lines]
+        for processes in ['1', '2']:
+            assert self.invoke(['tokenize', '-j', processes], self.lines) == expected
+            assert self.invoke(['tokenize', '-j', processes, '--cache-size', '2'], self.lines) == expected
+
+    def test_detokenize(self):
+        tokenized = [MosesTokenizer().tokenize(line, return_str=True) for line in self.lines]
+        moses = MosesDetokenizer()
+        expected = [moses.detokenize(line.split()) for line in tokenized]
+        for processes in ['1', '2']:
+            assert self.invoke(['detokenize', '-j', processes], tokenized) == expected
+            assert self.invoke(['detokenize', '-j', processes, '-c', '2'], tokenized) == expected
+
+    def test_normalize(self):
+        moses = MosesPunctNormalizer()
+        expected = [moses.normalize(line + u'\n').rstrip(u'\n') for line in self.lines]
+        for processes in ['1', '2']:
+            assert self.invoke(['normalize', '-j', processes], self.lines) == expected
+            assert self.invoke(['normalize', '-j', processes, '-c', '2'], self.lines) == expected
+
+    def test_apply_bpe(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            tokenized = [MosesTokenizer().tokenize(line, return_str=True) for line in self.lines]
+            corpus, codes = os.path.join(tmpdir, 'corpus.txt'), os.path.join(tmpdir, 'codes.txt')
+            with io.open(corpus, 'w', encoding='utf8') as fout:
+                fout.write(u'\n'.join(tokenized))
+            subwords = SubwordTokenizer(corpus)
+            subwords.learn(50)
+            subwords.save_merges(codes)
+            expected = [subwords.encode(line, return_str=True) for line in tokenized]
+            for processes in ['1', '2']:
+                assert self.invoke(['apply-bpe', '-c', codes, '-j', processes], tokenized) == expected
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_truecase_model_formats(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            tokenized = [MosesTokenizer().tokenize(line, return_str=True) for line in self.lines]
+            text_model = os.path.join(tmpdir, 'model.txt')
+            binary_model = os.path.join(tmpdir, 'model.bin')
+            self.invoke(['train-truecase', '-m', text_model], tokenized)
+            self.invoke(['convert-truecase', '-m', text_model, '-o', binary_model], [])
+            moses = MosesTruecaser(text_model)
+            expected = [moses.truecase(line, return_str=True) for line in tokenized]
+            for processes in ['1', '2']:
+                assert self.invoke(['truecase', '-m', text_model, '-j', processes], tokenized) == expected
+                assert self.invoke(['truecase', '-m', binary_model, '-j', processes], tokenized) == expected
+            self.invoke(['train-truecase', '-m', binary_model, '-f', 'binary'], tokenized)
+            assert self.invoke(['truecase', '-m', binary_model], tokenized) == expected
+
+            # Merging or updating the models of the halves gives the same model.
+            half = len(tokenized) // 2
+            shards = [os.path.join(tmpdir, 'shard1.txt'), os.path.join(tmpdir, 'shard2.bin')]
+            self.invoke(['train-truecase', '-m', shards[0]], tokenized[:half])
+            self.invoke(['train-truecase', '-m', shards[1], '-f', 'binary'], tokenized[half:])
+            merged_model = os.path.join(tmpdir, 'merged.txt')
+            self.invoke(['merge-truecase', '-m', merged_model] + shards, [])
+            self.invoke(['train-truecase', '-m', shards[0], '-u'], tokenized[half:])
+            for model in [merged_model, shards[0]]:
+                assert MosesTruecaser(model).model['casing'] == moses.model['casing']
+
+            # The pruned models keep the frequent types.
+            pruned_model = os.path.join(tmpdir, 'pruned.bin')
+            self.invoke(['convert-truecase', '-m', text_model, '-o', pruned_model, '-t', '5'], [])
+            pruned_casing = MosesTruecaser().load_casing(pruned_model)
+            assert pruned_casing == MosesTruecaser(text_model, max_types=5).model['casing']
+            assert len(pruned_casing) == 5
+            # The counts of the model to update are pruned with the new counts.
+            updated_model = os.path.join(tmpdir, 'updated.bin')
+            self.invoke(['train-truecase', '-m', updated_model, '-f', 'binary'], tokenized[:half])
+            self.invoke(['train-truecase', '-m', updated_model, '-f', 'binary', '-u', '-c', '30'],
+                        tokenized[half:])
+            pruned_casing = MosesTruecaser(text_model, min_count=30).model['casing']
+            assert len(pruned_casing) > 0
+            assert MosesTruecaser().load_casing(updated_model) == pruned_casing
+        finally:
+            shutil.rmtree(tmpdir)
@@ -4,11 +4,12 @@
 Tests for corpus.py
 """
 
+import re
 import sys
 import doctest
 import unittest
 
-from six import text_type
+from six import text_type, unichr
 
 from sacremoses import corpus
 
@@ -36,6 +37,23 @@ class CorpusTest(unittest.TestCase):
         self.assertListEqual(list(perluniprops.chars('Currency_Symbol'))[:5],
                              [u'$', u'\xa2', u'\xa3', u'\xa4', u'\xa5'])
 
+    def test_perluniprops_ranges(self):
+        perluniprops = corpus.Perluniprops()
+        for category in perluniprops.available_categories:
+            # The precomputed ranges are up to date with the category files.
+            ranges = perluniprops._read_ranges(category)
+            self.assertListEqual(perluniprops.ranges(category),
+                                 list(zip(ranges[::2], ranges[1::2])))
+        # The strings and sets are shared across instances.
+        self.assertIs(perluniprops.string('IsAlpha'), corpus.Perluniprops().string('IsAlpha'))
+        self.assertIs(perluniprops.charset('IsAlpha'), corpus.Perluniprops().charset('IsAlpha'))
+        # The regex ranges match the same characters.
+        for category in ['IsAlnum', 'Number', 'Symbol']:
+            chars = perluniprops.charset(category)
+            regex = re.compile(u'[{}]'.format(perluniprops.regex_ranges(category)))
+            self.assertListEqual([char for char in map(unichr, range(0x10000)) if regex.match(char)],
+                                 [char for char in map(unichr, range(0x10000)) if char in chars])
+
     def test_nonbreaking_prefixes_sanity_check(self):
         nonbreaking_prefixes = corpus.NonbreakingPrefixes()
         for language in nonbreaking_prefixes.available_langs.values():
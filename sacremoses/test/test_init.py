@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for __init__.py
+"""
+
+import json
+import subprocess
+import sys
+import unittest
+
+
+def imported_modules(statement):
+    """
+    Runs `statement` in a fresh interpreter and returns the modules imported.
+    """
+    script = '{}\nimport json, sys\nprint(json.dumps(sorted(sys.modules)))'.format(statement)
+    return json.loads(subprocess.check_output([sys.executable, '-c', script]).decode('utf8'))
+
+
+@unittest.skipIf(sys.version_info < (3, 7), 'Lazy imports need module level __getattr__.')
+class TestLazyImport(unittest.TestCase):
+    def test_import_is_lazy(self):
+        modules = imported_modules('import sacremoses')
+        for module in ['sacremoses.tokenize', 'sacremoses.truecase', 'sacremoses.normalize',
+                       'sacremoses.corpus', 'tqdm', 'multiprocessing']:
+            self.assertNotIn(module, modules)
+
+    def test_import_only_what_is_used(self):
+        modules = imported_modules('from sacremoses import MosesPunctNormalizer')
+        self.assertIn('sacremoses.normalize', modules)
+        self.assertNotIn('sacremoses.tokenize', modules)
+        modules = imported_modules('from sacremoses import MosesTokenizer\n'
+                                   'MosesTokenizer().tokenize(u"Hello, world!")')
+        self.assertNotIn('sacremoses.truecase', modules)
+        self.assertNotIn('tqdm', modules)
+        self.assertNotIn('multiprocessing', modules)
+
+    def test_lazy_attributes(self):
+        import sacremoses
+        from sacremoses.tokenize import MosesTokenizer
+        from sacremoses.normalize import MosesPunctNormalizer
+        self.assertIs(sacremoses.MosesTokenizer, MosesTokenizer)
+        self.assertIs(sacremoses.MosesPunctNormalizer, MosesPunctNormalizer)
+        self.assertIs(sacremoses.truecase, sys.modules['sacremoses.truecase'])
+        self.assertIn('MosesDetruecaser', dir(sacremoses))
+        with self.assertRaises(AttributeError):
+            sacremoses.MosesNothing
@@ -10,7 +10,8 @@ import unittest
 
 from six import text_type
 
-from sacremoses.normalize import MosesPunctNormalizer
+from sacremoses.normalize import MosesPunctNormalizer, MosesPunctuationNormalizer
+from sacremoses.normalize import compile_rules, substitute_regex, _apply_groups
 
 
 class TestNormalizer(unittest.TestCase):
@@ -50,3 +51,73 @@ class TestNormalizer(unittest.TestCase):
 
         text = expected = u'12\u00A0123'
         assert moses_no_norm_num.normalize(text) == expected
+
+    def test_moses_normalize_cache(self):
+        moses = MosesPunctNormalizer(cache_size=10)
+        text = u'Die Landwirtschaft stellt nur 5,5 % der Arbeitsplätze der Union…'
+        expected = MosesPunctNormalizer().normalize(text)
+        assert [moses.normalize(text) for _ in range(3)] == [expected] * 3
+        assert moses.cache.cache_info() == (2, 1, 0, 10, 1)
+
+    def test_positional_arguments(self):
+        # Both classes take the options in the same order, the cache last.
+        for moses in [MosesPunctNormalizer('en', False, False, False, 10),
+                      MosesPunctuationNormalizer('en', False, False, False, 10)]:
+            assert not moses.norm_quote_commas and not moses.norm_numbers
+            assert moses.cache.maxsize == 10
+
+    def test_instances_are_independent(self):
+        num_rules = len(MosesPunctNormalizer.SUBSTITUTIONS_EXTRA_WHITESPACE)
+        english = MosesPunctNormalizer('en')
+        text = u'Die Zahl 12\u00A0123 "ist".'
+        expected = english.normalize(text)
+        german = MosesPunctNormalizer('de')
+        # The class level rules are left untouched, and the plans are shared.
+        assert len(MosesPunctNormalizer.SUBSTITUTIONS_EXTRA_WHITESPACE) == num_rules
+        assert english.plan is MosesPunctNormalizer('en').plan
+        assert english.normalize(text) == expected == u'Die Zahl 12.123 "ist."'
+        assert german.normalize(text) == u'Die Zahl 12,123 "ist".'
+
+    def test_normalization_plan(self):
+        # The compiled plan applies the same substitutions as the rules in sequence.
+        inputs = [u'„Quote“ – and — («nbsp\u00A0») isn’t ‘single’…',
+                  u"``Penn'' style `quote' , with  spaces :\r\n",
+                  u'Le prix\u00A0: 5\u00A0% ,\u00A0nº\u00A012\u00A0cm, \u00A0»\u00A0fin\u00A0«\u00A0.',
+                  u'He said "yes", "no"... ) , 10 % of 1\u00A0000',
+                  u'´´acute´´ and \'\' quotes']
+        for lang in ['en', 'de', 'fr']:
+            for penn in [False, True]:
+                moses = MosesPunctNormalizer(lang, penn=penn)
+                for text in inputs:
+                    expected = text
+                    for substitution in moses.substitutions:
+                        expected = substitution(expected)
+                    assert moses.normalize(text) == expected
+
+    def test_normalize_block(self):
+        # A block gives the same output as its lines, also where a rule could
+        # match across the lines (here the quotes after the periods in French).
+        text = (u'x."\n."y\n«Hello»  world !\n\n1 000 ..."\n<b> ) .\n'
+                u'„Quote“ – isn’t ‘single’…\n."  \n."')
+        lines = text.split(u'\n')
+        for lang in ['en', 'de', 'fr']:
+            moses = MosesPunctNormalizer(lang)
+            expected = u'\n'.join(moses.normalize(line + u'\n')[:-1] for line in lines[:-1])
+            expected += u'\n' + moses.normalize(lines[-1])
+            assert moses.normalize_block(text) == expected
+            for block_size in [1, 5, 1000]:
+                blocks = list(moses.normalize_stream(io.StringIO(text), block_size))
+                assert all(block.endswith(u'\n') for block in blocks[:-1])
+                assert u''.join(blocks) == expected
+
+    def test_rules_matching_across_lines(self):
+        moses = MosesPunctNormalizer('fr')
+        regexes = [rule.regex.pattern for rules in moses.substitution_groups()
+                   for rule in rules if hasattr(rule, 'regex') and rule.multiline]
+        assert regexes == [r'(\.+)"(\s*[^<])']
+        # The regex rules are matched line by line in a block, unless they are
+        # marked as not matching newlines.
+        text = u'a \nb a b\n'
+        for multiline, expected in [(True, u'a \nb ab\n'), (False, u'ab ab\n')]:
+            rules = [substitute_regex(r'a\s+b', u'ab', multiline=multiline)]
+            assert _apply_groups([compile_rules(rules, block=True)], text) == expected
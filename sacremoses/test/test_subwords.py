@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for subwords.py
+"""
+
+import io
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from array import array
+
+from sacremoses.subwords import SubwordTokenizer
+from sacremoses.tokenize import MosesTokenizer
+
+
+class TestSubwordTokenizer(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'corpus.txt')
+        words = ['low'] * 5 + ['lower'] * 2 + ['newest'] * 6 + ['widest'] * 3
+        with io.open(self.filename, 'w', encoding='utf8') as fout:
+            fout.write(u' '.join(words) + u'\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_learn(self):
+        subwords = SubwordTokenizer(self.filename)
+        merges = subwords.learn(4)
+        assert merges == [('s', u't\uE000'), ('e', u'st\uE000'), ('l', 'o'), ('w', u'est\uE000')]
+        assert subwords.merges == merges
+        assert dict(subwords.vocab)[('n', 'e', u'west\uE000')] == 6
+
+    def test_count_vocabulary(self):
+        lines = [u"This ain't funny.", u'It is, isn\'t it?', u''] * 20
+        tokenized = os.path.join(self.tmpdir, 'tokenized.txt')
+        with io.open(tokenized, 'w', encoding='utf8') as fout:
+            for tokens in MosesTokenizer().tokenize_iter(lines, return_str=True):
+                fout.write(tokens + u'\n')
+        subwords = SubwordTokenizer()
+        expected = dict(subwords.get_vocabulary(tokenized))
+        assert expected[(u'i', u's\uE000')] == 20
+        for processes in [1, 2]:
+            assert dict(subwords.get_vocabulary(tokenized, processes=processes)) == expected
+            documents = MosesTokenizer().tokenize_iter(lines)
+            assert dict(subwords.count_vocabulary(documents, processes=processes)) == expected
+        # The vocabulary can be learned from straight away.
+        subwords.set_vocabulary(subwords.count_vocabulary(MosesTokenizer().tokenize_iter(lines)))
+        assert subwords.learn(5) == SubwordTokenizer(tokenized).learn(5)
+        assert SubwordTokenizer(tokenized, processes=3).learn(5) == subwords.merges
+        assert subwords.count_vocabulary([]) == []
+        assert subwords.count_vocabulary([], processes=2) == []
+
+    def test_learn_jump(self):
+        # The pairs merged together don't share symbols, so the merges are
+        # the same here, and the words are encoded as by the merges.
+        subwords = SubwordTokenizer(self.filename)
+        merges = subwords.learn(8, jump=3)
+        assert merges == SubwordTokenizer(self.filename).learn(8)
+        assert subwords.merges[:2] == [('s', u't\uE000'), ('e', u'st\uE000')]
+        encoder = SubwordTokenizer(load_from=None, separator=u'')
+        encoder.merges = merges
+        for word, freq in subwords.vocab:
+            assert encoder.encode_word(u''.join(word)[:-1]) == word[:-1] + (word[-1][:-1],)
+        # The statistics are the counts of the pairs of the words.
+        assert len(subwords.vocab[2][0]) == 3
+        pairs = {}
+        for word, freq in subwords.vocab:
+            for pair in zip(word, word[1:]):
+                pairs[pair] = pairs.get(pair, 0) + freq
+        assert {subwords.pair_symbols(pair): count for pair, count in subwords.stats.items()
+                if count and subwords.pair_symbols(pair) not in merges} == pairs
+
+    def test_learner_state(self):
+        # The symbols are interned, and the learner can be pickled half way.
+        subwords = SubwordTokenizer(self.filename)
+        subwords.learn(3)
+        assert subwords.symbols[subwords.words[0][0]] == u'n'
+        assert subwords.stats[subwords.pair_key(subwords.symbol_ids[u'lo'], subwords.symbol_ids[u'w\uE000'])] == 5
+        restored = pickle.loads(pickle.dumps(subwords))
+        assert restored.vocab == subwords.vocab
+        assert restored.learn(100) == subwords.learn(100)
+
+    def test_resume_from_checkpoint(self):
+        checkpoint = os.path.join(self.tmpdir, 'checkpoint.bin')
+        for jump in [1, 3]:
+            learner = SubwordTokenizer(self.filename)
+            expected = learner.learn(10, jump=jump)
+            # The learning is stopped after a checkpoint.
+            SubwordTokenizer(self.filename).learn(4, jump=jump, checkpoint=checkpoint, checkpoint_every=2)
+            resumed = SubwordTokenizer()
+            assert resumed.learn(10, jump=jump, resume_from=checkpoint) == expected
+            assert resumed.vocab == learner.vocab
+            assert resumed.encode(u'lowest', return_str=True) == learner.encode(u'lowest', return_str=True)
+        # The arrays have the types of Python 2 as well.
+        with open(checkpoint, 'rb') as fin:
+            state = pickle.load(fin)
+        assert all(value.typecode in 'Id' for value in state.values() if isinstance(value, array))
+        with open(checkpoint, 'wb') as fout:
+            pickle.dump({'version': 0}, fout)
+        with self.assertRaises(ValueError):
+            SubwordTokenizer().learn(10, resume_from=checkpoint)
+
+    def test_learn_min_freq(self):
+        # Learning stops when the most frequent pair isn't frequent enough.
+        subwords = SubwordTokenizer(self.filename)
+        merges = subwords.learn(100, min_freq=3)
+        assert len(merges) == 10
+        assert merges[-1] == ('wid', u'est\uE000')
+        assert subwords.learn(100, min_freq=1)[10:] == [('w', 'e'), ('we', u'r\uE000'), ('lo', u'wer\uE000')]
+
+    def test_encode(self):
+        subwords = SubwordTokenizer(self.filename)
+        subwords.learn(100)
+        assert subwords.encode(u'lowest newer low', return_str=True) == u'lo@@ west ne@@ wer low'
+        assert subwords.encode([u'xyz', u'a']) == [u'x@@', u'y@@', u'z', u'a']
+        assert subwords.encode_batch([u'lowest\n', u'']) == [[u'lo@@', u'west'], []]
+
+    def test_encode_with_more_merges(self):
+        # The cached words are encoded again after more merges are learned.
+        subwords = SubwordTokenizer(self.filename, separator=u'|')
+        subwords.learn(2)
+        assert subwords.encode(u'newest', return_str=True) == u'n| e| w| est'
+        subwords.learn(2)
+        assert subwords.encode(u'newest', return_str=True) == u'n| e| west'
+
+    def test_save_and_load_merges(self):
+        subwords = SubwordTokenizer(self.filename)
+        subwords.learn(100)
+        codes = os.path.join(self.tmpdir, 'codes.txt')
+        subwords.save_merges(codes)
+        with io.open(codes, encoding='utf8') as fin:
+            assert fin.readline() == u'#version: 0.2\n'
+            assert fin.readline() == u's t</w>\n'
+        loaded = SubwordTokenizer(load_from=codes, cache_size=0)
+        assert loaded.merges == subwords.merges
+        lines = [u'lowest newer low\n', u'wider widest\n']
+        with io.open(self.filename, 'w', encoding='utf8') as fout:
+            fout.writelines(lines)
+        expected = [subwords.encode(line, return_str=True) for line in lines]
+        for processes in [1, 2]:
+            assert list(loaded.encode_file(self.filename, processes=processes)) == expected
@@ -6,6 +6,8 @@ Tests for MosesTokenizer
 
 import unittest
 
+from six import text_type
+
 from sacremoses.tokenize import MosesTokenizer, MosesDetokenizer
 
 
@@ -46,6 +48,15 @@ class TestTokenzier(unittest.TestCase):
         assert moses.tokenize('foo-bar') == expected_tokens_wo_aggressive_dash_split
         assert moses.tokenize('foo-bar', aggressive_dash_splits=True) == expected_tokens_with_aggressive_dash_split
 
+    def test_escape_xml_characters(self):
+        moses = MosesTokenizer()
+        text = u'The world\'s & <b> "q" [x] | y'
+        expected = [u'The', u'world', u'&apos;s', u'&amp;', u'&lt;', u'b', u'&gt;', u'&quot;',
+                    u'q', u'&quot;', u'&#91;', u'x', u'&#93;', u'&#124;', u'y']
+        tokens = moses.tokenize(text)
+        assert tokens == expected
+        assert all(isinstance(token, text_type) for token in tokens)
+
     def test_opening_brackets(self):
         moses = MosesTokenizer()
 
@@ -123,6 +134,113 @@ class TestTokenzier(unittest.TestCase):
                            ')', '.']
         self.assertEqual(moses.tokenize(text), expected_tokens)
 
+    def test_rule_plan_is_shared(self):
+        moses, other_moses = MosesTokenizer(), MosesTokenizer()
+        assert moses.rule_plan() is other_moses.rule_plan()
+        assert moses.rule_plan(aggressive_dash_splits=True) is other_moses.rule_plan(aggressive_dash_splits=True)
+        assert moses.rule_plan() is not moses.rule_plan(escape=False)
+        assert moses.rule_plan() is not MosesTokenizer(lang='fr').rule_plan()
+
+    def test_fused_rules(self):
+        moses = MosesTokenizer()
+        # The comma rules.
+        assert moses.tokenize('A,B,C 5,300 and 2016,') == ['A', ',', 'B', ',', 'C', '5,300', 'and', '2016', ',']
+        assert moses.tokenize(',,a,,') == [',', ',', 'a', ',', ',']
+        # The apostrophe rule for languages without specific apostrophe rules.
+        moses = MosesTokenizer(lang='de')
+        assert moses.tokenize("Ich hab's..", escape=False) == ['Ich', 'hab', "'", 's', '..']
+        # Literal placeholders in the input are restored like before.
+        assert moses.tokenize('DOTMULTI.!') == ['..', '!']
+
+    def test_tokenize_batch(self):
+        # Line starts and ends shouldn't be seen as context by the other lines.
+        lines = ["This ain't funny.", "'s 5,", ",Dr. Who?", "-a- b..", "",
+                 "  abc def.  ", "foo-bar\n", "2016, pp.", "'5 a'", "x"]
+        for lang in ['en', 'fr', 'de']:
+            moses = MosesTokenizer(lang=lang)
+            for aggressive_dash_splits in [False, True]:
+                expected = [moses.tokenize(line, aggressive_dash_splits=aggressive_dash_splits)
+                            for line in lines]
+                assert moses.tokenize_batch(lines, aggressive_dash_splits=aggressive_dash_splits) == expected
+                assert list(moses.tokenize_iter(iter(lines), batch_size=3,
+                                                aggressive_dash_splits=aggressive_dash_splits)) == expected
+
+        moses = MosesTokenizer()
+        text = "this is a webpage https://stackoverflow.com/questions/6181381/how-to-print-variables-in-perl that kicks ass"
+        assert moses.tokenize_batch([text, 'a b'], return_str=True, protected_patterns=moses.BASIC_PROTECTED_PATTERNS) == \
+            [moses.tokenize(text, return_str=True, protected_patterns=moses.BASIC_PROTECTED_PATTERNS), 'a b']
+        assert moses.tokenize_batch([]) == []
+
+    def test_nonbreaking_prefixes(self):
+        moses = MosesTokenizer()
+        assert moses.nonbreaking_prefix_index() is MosesTokenizer().nonbreaking_prefix_index()
+        assert moses.prefix_kinds['Mr'] == moses.NONBREAKING_PREFIX
+        assert moses.prefix_kinds['No'] == moses.NUMERIC_ONLY_PREFIX
+        assert 'No' in moses.NUMERIC_ONLY_PREFIXES
+        # Nonbreaking, numeric only, abbreviations, lowercase next word and others.
+        text = u'Mr. Smith lives at No. 5, not at No. Five. U.S.A. is big. Smith. also. Smith. Also.'
+        expected = u'Mr. Smith lives at No. 5 , not at No . Five . U.S.A. is big . Smith. also . Smith . Also .'
+        assert moses.tokenize(text, return_str=True) == expected
+
+        # The lowercase check can be overridden.
+        class NoLowercaseTokenizer(MosesTokenizer):
+            def is_first_lower(self, text):
+                return False
+        assert NoLowercaseTokenizer().tokenize(u'Smith. also.', return_str=True) == u'Smith . also .'
+
+    def test_scanner_engine(self):
+        lines = ["This ain't funny. It's actually hillarious, yet double Ls. | [] < > [ ] & You're gonna shake it off? Don't?",
+                 "1' '1 x' 'y ''a'' 5's l'amitié d'esprit", ",,a,, 5,300 2016, ,5 a,b,",
+                 "...Hello.. a..b... foo-bar-baz -a- 'Hello.'", "DOTMULTI.!", "", "  abc def.  "]
+        for lang in ['en', 'fr', 'de']:
+            regex, scanner = MosesTokenizer(lang=lang), MosesTokenizer(lang=lang, engine='scanner')
+            for aggressive_dash_splits in [False, True]:
+                expected = [regex.tokenize(line, aggressive_dash_splits=aggressive_dash_splits)
+                            for line in lines]
+                assert [scanner.tokenize(line, aggressive_dash_splits=aggressive_dash_splits)
+                        for line in lines] == expected
+                assert scanner.tokenize_batch(lines, aggressive_dash_splits=aggressive_dash_splits) == expected
+
+        with self.assertRaises(ValueError):
+            MosesTokenizer(engine='perl')
+
+    def test_cache(self):
+        moses = MosesTokenizer(cache_size=2)
+        text = u"This ain't funny. It's actually hillarious."
+        expected = MosesTokenizer().tokenize(text)
+        assert moses.tokenize(text) == expected
+        assert moses.tokenize(text) == expected
+        assert moses.tokenize(text, escape=False) == MosesTokenizer().tokenize(text, escape=False)
+        assert moses.cache.cache_info() == (1, 2, 0, 2, 2)
+        # The tokens of a cached line are a new list every time.
+        moses.tokenize(text).append(u'!')
+        assert moses.tokenize(text) == expected
+        # The batches only tokenize the lines that aren't cached.
+        lines = [text, u'Another line.', text, u'(A third line)']
+        assert moses.tokenize_batch(lines) == MosesTokenizer().tokenize_batch(lines)
+        assert moses.cache.evictions == 2
+        patterns = [u'Another line']
+        assert (moses.tokenize(u'Another line.', protected_patterns=patterns, return_str=True)
+                == u'Another line .')
+
+
+    def test_chunk_cache(self):
+        lines = [u"This ain't funny. It's actually hillarious, yet double Ls.",
+                 u"'Hello', said the man's dog... And 'she' said, 1,000,000 x-rays ''",
+                 u"L'amitié nous a fait forts d'esprit, n'est-ce pas?"]
+        lines = [line for line in lines for _ in range(3)]
+        for lang in ['en', 'fr', 'de']:
+            moses = MosesTokenizer(lang=lang, engine='scanner', chunk_cache_size=8)
+            for aggressive_dash_splits in (False, True):
+                expected = [MosesTokenizer(lang=lang).tokenize(line, aggressive_dash_splits)
+                            for line in lines]
+                assert [moses.tokenize(line, aggressive_dash_splits) for line in lines] == expected
+            info = moses.chunk_cache.cache_info()
+            assert info.hits > 0 and info.evictions > 0 and info.currsize == 8
+        with self.assertRaises(ValueError):
+            MosesTokenizer(chunk_cache_size=8)
+
+
 class TestDetokenizer(unittest.TestCase):
     def test_moses_detokenize(self):
         mt = MosesTokenizer()
@@ -160,3 +278,30 @@ class TestDetokenizer(unittest.TestCase):
 
         text = u"L'amitié nous a fait forts d'esprit"
         assert detokenizer.detokenize(tokenizer.tokenize(text)) == text
+
+    def test_token_types(self):
+        detokenizer = MosesDetokenizer()
+        assert detokenizer.token_type(u'$').kind == 'currency'
+        assert detokenizer.token_type(u'.)').kind == 'punctuation'
+        assert detokenizer.token_type(u'中文').kind == 'cjk'
+        assert detokenizer.token_type(u'word').kind is None
+        assert detokenizer.token_type(u'„').quote == u'"'
+        assert detokenizer.token_type(u"''").quote == u"''"
+        # The token types are memoized and shared by all detokenizers.
+        assert detokenizer.token_type(u'$') is MosesDetokenizer(lang='fr').token_type(u'$')
+
+        tokens = [u'Jones', u"'", u'house', u'costs', u'$', u'5', u'.'] * 1000
+        assert detokenizer.detokenize(tokens) == u" ".join([u"Jones' house costs $5."] * 1000)
+
+    def test_czech_dashed_words(self):
+        detokenizer = MosesDetokenizer(lang='cs')
+        assert detokenizer.detokenize([u"a'", u'-', u'li', u'b']) == u"a'-li b"
+
+    def test_cache(self):
+        detokenizer = MosesDetokenizer(cache_size=10)
+        tokens = [u'Jones', u"'", u'house', u'&amp;', u'garden', u'.']
+        assert detokenizer.detokenize(tokens) == u"Jones' house & garden."
+        assert detokenizer.detokenize(tokens) == u"Jones' house & garden."
+        assert detokenizer.detokenize(tokens, unescape=False) == u"Jones' house &amp; garden."
+        assert detokenizer.detokenize(tokens, return_str=False) == [u"Jones'", u'house', u'&', u'garden.']
+        assert detokenizer.cache.cache_info() == (2, 2, 0, 10, 2)
@@ -6,11 +6,16 @@ Tests for MosesTokenizer
 
 import io
 import os
+import pickle
+import shutil
+import struct
+import tempfile
 import unittest
 
 from six import text_type
 
-from sacremoses.truecase import MosesTruecaser, MosesDetruecaser
+from sacremoses import truecase
+from sacremoses.truecase import MosesTruecaser, MosesDetruecaser, MappedTruecaseModel
 
 
 # Crazy hack to support Python2 and 3 and requests to download files.
@@ -73,6 +78,233 @@ class TestTruecaser(unittest.TestCase):
                              normal_input: expecte_normal_output}
 
 
+class TestTruecaserModelFormats(unittest.TestCase):
+    def setUp(self):
+        self.docs = [u'The adventures of Sherlock Holmes .'.split(),
+                     u'Sherlock Holmes and Dr. Watson met in London .'.split(),
+                     u'the London fog was thick ; the fog of London .'.split(),
+                     u'The Fog , said Holmes , is thick in London .'.split(),
+                     u'Un caf\xe9 \xe0 Paris , CAF\xc9 et Caf\xe9 .'.split()]
+        self.inputs = [u'THE ADVENTURES OF SHERLOCK HOLMES',
+                       u'the fog in london and the caf\xe9 in paris',
+                       u'Holmes met Watson . the FOG unknown-word']
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_binary_model(self):
+        for is_asr in (False, True):
+            moses = MosesTruecaser(is_asr=is_asr)
+            moses.train(self.docs, possibly_use_first_token=True)
+            text_model = os.path.join(self.tmpdir, 'model.txt')
+            binary_model = os.path.join(self.tmpdir, 'model.bin')
+            moses.save_model(text_model)
+            moses.save_model(binary_model, format='binary')
+            assert MappedTruecaseModel.is_binary_model(binary_model)
+            assert not MappedTruecaseModel.is_binary_model(text_model)
+
+            from_text = MosesTruecaser(text_model, is_asr=is_asr)
+            from_binary = MosesTruecaser(binary_model, is_asr=is_asr)
+            assert 'mapped' in from_binary.model
+            for text in self.inputs:
+                assert from_binary.truecase(text) == from_text.truecase(text)
+            for token in [u'london', u'fog', u'caf\xe9', u'holmes', u'unknown']:
+                assert from_binary.model['best'].get(token) == from_text.model['best'].get(token)
+            for token in [u'London', u'The', u'Fog', u'Caf\xe9', u'CAF\xc9', u'the', u'Unknown']:
+                assert from_binary.model['known'].get(token) == from_text.model['known'].get(token)
+
+            # The mapped model is reopened by the other processes.
+            unpickled = pickle.loads(pickle.dumps(from_binary))
+            assert unpickled.truecase(self.inputs[1]) == from_text.truecase(self.inputs[1])
+            inputs = os.path.join(self.tmpdir, 'inputs.txt')
+            with io.open(inputs, 'w', encoding='utf8') as fout:
+                fout.write(u'\n'.join(self.inputs * 20) + u'\n')
+            expected = list(from_text.truecase_file(inputs))
+            assert len(expected) == 60
+            for truecaser in (from_text, from_binary):
+                assert list(truecaser.truecase_file(inputs, processes=2)) == expected
+
+            # Converting the binary model back to text keeps the model.
+            converted = os.path.join(self.tmpdir, 'converted.txt')
+            from_binary.save_model(converted)
+            assert MosesTruecaser(converted, is_asr=is_asr).model['best'] == from_text.model['best']
+            with self.assertRaises(ValueError):
+                moses.save_model(converted, format='json')
+
+    def assert_closed(self, mapped):
+        # A closed mmap can't be read (and has no `closed` on Python 2).
+        with self.assertRaises(ValueError):
+            mapped._mmap[:1]
+
+    def test_close_binary_model(self):
+        moses = MosesTruecaser()
+        moses.train(self.docs)
+        binary_model = os.path.join(self.tmpdir, 'model.bin')
+        moses.save_model(binary_model, format='binary')
+        with MappedTruecaseModel(binary_model) as mapped:
+            casing = mapped.casing()
+            num_types = len(mapped)
+        self.assert_closed(mapped)
+        # The header is read the same way on every machine.
+        with open(binary_model, 'rb') as fin:
+            header = struct.unpack('<8s8sQQQ', fin.read(40))
+        assert header[0] == MappedTruecaseModel.MAGIC and header[2] == num_types
+        # Without typed views (Python 2), the arrays are copied.
+        truecase.memoryview = bytes
+        try:
+            with MappedTruecaseModel(binary_model) as mapped:
+                assert mapped._view is None and mapped.casing() == casing
+        finally:
+            del truecase.memoryview
+
+        # Training a new model unmaps the loaded one, so it can be replaced.
+        truecaser = MosesTruecaser(binary_model)
+        mapped = truecaser.model['mapped']
+        truecaser.train(self.docs, update=True, save_to=binary_model)
+        self.assert_closed(mapped)
+        assert truecaser.truecase(self.inputs[1]) == moses.truecase(self.inputs[1])
+
+
+class TestTruecaserTraining(unittest.TestCase):
+    def test_parallel_training(self):
+        docs = [u'The adventures of Sherlock Holmes .'.split(),
+                u'Sherlock Holmes and Dr. Watson met in London .'.split(),
+                u'the London fog was thick ; the FOG of london .'.split(),
+                u'The Fog , said Holmes , is thick in London .'.split()] * 50
+        expected = MosesTruecaser().train(docs)
+        for processes in [2, 3]:
+            model = MosesTruecaser().train(iter(docs), processes=processes)
+            assert model['best'] == expected['best']
+            assert model['known'] == expected['known']
+            # The counts and the order of the cases are the same.
+            assert ({token: counts.most_common() for token, counts in model['casing'].items()} ==
+                    {token: counts.most_common() for token, counts in expected['casing'].items()})
+        assert MosesTruecaser().train([])['best'] == {}
+
+    def test_merge_casing(self):
+        moses = MosesTruecaser()
+        casing = moses.count_casing([u'Hello world , hello World .'.split()])
+        other_casing = moses.count_casing([u'Yes WORLD , World'.split()])
+        merged = moses.merge_casing(casing, other_casing)
+        assert merged[u'world'].most_common() == [(u'World', 2), (u'world', 1), (u'WORLD', 1)]
+        assert merged[u'hello'] == {u'hello': 1}
+
+    def test_merge_and_update_models(self):
+        docs = [u'The adventures of Sherlock Holmes .'.split(),
+                u'Sherlock Holmes and Dr. Watson met in London .'.split(),
+                u'the London fog was thick ; the FOG of london .'.split(),
+                u'The Fog , said Holmes , is thick in London .'.split(),
+                u'Un caf\xe9 \xe0 Paris , CAF\xc9 et Caf\xe9 .'.split()] * 3
+        tmpdir = tempfile.mkdtemp()
+        try:
+            expected = os.path.join(tmpdir, 'expected.txt')
+            MosesTruecaser().train(docs, save_to=expected)
+            # Train the shards, in either format, and merge them.
+            shards = []
+            for i, (start, end, model_format) in enumerate([(0, 5, 'text'), (5, 11, 'binary'),
+                                                            (11, None, 'text')]):
+                shards.append(os.path.join(tmpdir, 'shard{}'.format(i)))
+                shard = MosesTruecaser()
+                shard.train(docs[start:end])
+                shard.save_model(shards[-1], format=model_format)
+            merged = os.path.join(tmpdir, 'merged.txt')
+            MosesTruecaser().merge_models(shards, save_to=merged)
+            with io.open(expected, encoding='utf8') as fin:
+                expected_lines = sorted(fin)
+            with io.open(merged, encoding='utf8') as fin:
+                assert sorted(fin) == expected_lines
+
+            # Update a loaded model with the documents of the other shards.
+            updated = os.path.join(tmpdir, 'updated.txt')
+            moses = MosesTruecaser(shards[0])
+            moses.train(docs[5:11], update=True)
+            moses.train_from_file_object([u' '.join(doc) for doc in docs[11:]], update=True,
+                                         save_to=updated)
+            with io.open(updated, encoding='utf8') as fin:
+                assert sorted(fin) == expected_lines
+            # The model isn't updated by default.
+            assert moses.train(docs[:1])['casing'] == MosesTruecaser().train(docs[:1])['casing']
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+class TestTruecaserPruning(unittest.TestCase):
+    def setUp(self):
+        self.docs = [u'The adventures of Sherlock Holmes in London .'.split(),
+                     u'Sherlock Holmes and Dr. Watson met in London .'.split(),
+                     u'the London fog was thick ; the FOG of london .'.split(),
+                     u'The Fog , said Holmes , is thick in London .'.split()]
+        self.text = u'the adventures of holmes in the london fog , said Watson'
+
+    def test_pruning(self):
+        full = MosesTruecaser()
+        full.train(self.docs)
+        assert full.model['pruning'] == (16, 19, 0, 0)
+        for options in [dict(min_count=2), dict(max_types=3), dict(min_count=2, max_types=3)]:
+            pruned = MosesTruecaser(**options)
+            pruned.train(self.docs)
+            kept = set(pruned.model['best'])
+            assert len(kept) == pruned.model['pruning'].types < len(full.model['best'])
+            assert pruned.model['pruning'].pruned_types == len(full.model['best']) - len(kept)
+            # The decisions for the kept types don't change.
+            for token, full_case, pruned_case in zip(self.text.split(), full.truecase(self.text),
+                                                     pruned.truecase(self.text)):
+                assert token.lower() not in kept or full_case == pruned_case
+        assert set(pruned.model['best']) == {u'london', u'holmes', u'in'}
+        # The most frequent types are kept.
+        assert set(MosesTruecaser(max_types=1).train(self.docs)['best']) == {u'london'}
+
+    def test_prune_asr_lowercase(self):
+        full = MosesTruecaser(is_asr=True)
+        full.train(self.docs)
+        pruned = MosesTruecaser(is_asr=True, drop_lowercase=True)
+        pruned.train(self.docs)
+        assert set(pruned.model['best']) == {u'sherlock', u'holmes', u'london', u'dr.', u'watson'}
+        assert pruned.truecase(self.text) == full.truecase(self.text)
+        # Unknown words keep their case without ASR, so lowercase types are kept.
+        pruned = MosesTruecaser(drop_lowercase=True)
+        assert pruned.train(self.docs)['pruning'].pruned_types == 0
+
+    def test_prune_loaded_models(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            moses = MosesTruecaser()
+            moses.train(self.docs)
+            for model_format in MosesTruecaser.MODEL_FORMATS:
+                filename = os.path.join(tmpdir, 'model.' + model_format)
+                moses.save_model(filename, format=model_format)
+                pruned = MosesTruecaser(filename, min_count=2)
+                assert set(pruned.model['best']) == {u'london', u'holmes', u'in', u'fog', u'of', u'thick'}
+                # The pruned model is saved.
+                pruned.save_model(filename)
+                assert MosesTruecaser(filename).model['best'] == pruned.model['best']
+            # Without the casing counts, the model can't be saved.
+            pruned = MosesTruecaser(filename, min_count=2, keep_casing=False)
+            assert pruned.model['casing'] is None
+            assert pruned.truecase(self.text) == MosesTruecaser(filename).truecase(self.text)
+            with self.assertRaises(ValueError):
+                pruned.save_model(filename)
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+class TestSplitXML(unittest.TestCase):
+    def test_split_xml(self):
+        split_xml = MosesTruecaser.split_xml
+        assert split_xml(u'  a <b>x</b> y  ') == [u'a', u'<b>', u'x', u'</b>', u'y']
+        assert split_xml(u'<hl> 1 < 2 -> <a href="#"> c') == [u'<hl>', u'1', u'<', u'2', u'-',
+                                                              u'>', u'<a href="#">', u'c']
+        assert split_xml(u'') == []
+        # The XML factors are joined with the token and the pipes after them.
+        assert split_xml(u'<i>the|A word|<b>|| <i> x|') == [u'<i>', u'the|A', u'word|<b>||',
+                                                              u'<i>', u'x|']
+        # The truecaser keeps the factors.
+        truecaser = MosesTruecaser()
+        truecaser.train([u'here is the word'.split()] * 2)
+        assert truecaser.truecase(u'The word|<b> here') == [u'the', u'word|<b>', u'here']
+
+
 class TestDetruecaser(unittest.TestCase):
     def test_moses_detruecase_str(self):
         moses = MosesDetruecaser()
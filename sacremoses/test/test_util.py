@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for util.py
+"""
+
+import unittest
+from collections import Counter
+from functools import partial
+
+from sacremoses.tokenize import MosesTokenizer
+from sacremoses.util import chunks, parallel_imap, parallel_reduce, parallelize_preprocess, LRUCache
+
+
+def _double_all(numbers):
+    return [2 * number for number in numbers]
+
+
+def _fail_on_three(number):
+    if number == 3:
+        raise ValueError(number)
+    return number
+
+
+def _count_all(numbers):
+    return Counter(_fail_on_three(number % 10) for number in numbers)
+
+
+def _merge_counts(counts, other_counts):
+    counts.update(other_counts)
+    return counts
+
+
+class TestParallelize(unittest.TestCase):
+    def test_chunks(self):
+        assert list(chunks(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+        assert list(chunks([], 3)) == []
+
+    def test_parallelize_preprocess_is_ordered(self):
+        lines = ['This is line {}.'.format(i) for i in range(2000)]
+        moses = MosesTokenizer()
+        tokenize = partial(moses.tokenize, return_str=True)
+        expected = [tokenize(line) for line in lines]
+        for processes in [1, 3]:
+            assert list(parallelize_preprocess(tokenize, iter(lines), processes)) == expected
+            tokenize_batch = partial(moses.tokenize_batch, return_str=True)
+            assert list(parallelize_preprocess(tokenize_batch, iter(lines), processes, batched=True)) == expected
+
+    def test_parallel_imap_chunking(self):
+        numbers = range(1000)
+        expected = [2 * number for number in numbers]
+        # Fixed and adaptive chunk sizes, with a single chunk in flight.
+        for chunk_size in [None, 1, 7]:
+            assert list(parallel_imap(_double_all, numbers, 2, batched=True,
+                                      chunk_size=chunk_size, max_in_flight=1)) == expected
+        assert list(parallel_imap(_double_all, [], 2, batched=True)) == []
+
+    def test_parallel_imap_errors(self):
+        with self.assertRaises(ValueError):
+            list(parallel_imap(_fail_on_three, range(10), 2, chunk_size=2))
+
+    def test_parallel_reduce(self):
+        numbers = [number for number in range(5000) if number % 10 != 3]
+        expected = _count_all(numbers)
+        for processes in [1, 2, 5]:
+            for chunk_size in [1, 100, 10000]:
+                # Every worker sends back a single result.
+                assert parallel_reduce(_count_all, _merge_counts, iter(numbers), processes,
+                                       chunk_size=chunk_size) == expected
+        assert parallel_reduce(_count_all, _merge_counts, [], 3) == Counter()
+        with self.assertRaises(ValueError):
+            parallel_reduce(_count_all, _merge_counts, numbers + [3] + numbers, 2, chunk_size=10)
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        assert cache.get('a') == 1
+        cache.put('c', 3)
+        # 'b' is the least recently used.
+        assert cache.get('b') is None
+        assert cache.get('a') == 1 and cache.get('c') == 3
+        assert cache.cache_info() == (3, 1, 1, 2, 2)
+        cache.clear()
+        assert cache.cache_info() == (0, 0, 0, 2, 0)
+        with self.assertRaises(ValueError):
+            LRUCache(0)
+
+    def test_cache_per_worker(self):
+        lines = ['A repeated line.', 'Another line.'] * 500
+        moses = MosesTokenizer(cache_size=10)
+        expected = MosesTokenizer().tokenize_batch(lines, return_str=True)
+        tokenize_batch = partial(moses.tokenize_batch, return_str=True)
+        assert list(parallelize_preprocess(tokenize_batch, iter(lines), 2, batched=True)) == expected
+        # The workers have their own copies of the cache.
+        assert moses.cache.cache_info().currsize == 0
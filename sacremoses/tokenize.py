@@ -2,29 +2,323 @@
 # -*- coding: utf-8 -*-
 
 import re
+from collections import namedtuple
+from functools import partial
+from operator import methodcaller
 
 from six import text_type
 
-from sacremoses.corpus import Perluniprops
+from sacremoses.corpus import Perluniprops, LazyCategory
 from sacremoses.corpus import NonbreakingPrefixes
-from sacremoses.util import is_cjk
+from sacremoses.util import is_cjk, chunks, LRUCache
 
 perluniprops = Perluniprops()
 nonbreaking_prefixes = NonbreakingPrefixes()
 
 
+# A compiled and immutable tokenization plan, see `MosesTokenizer.rule_plan()`.
+# Every stage is a tuple of (trigger, rewrite) steps, where *rewrite* is a
+# str -> str callable and *trigger* is a substring that needs to be in the text
+# for the step to change anything (or None if the step always applies).
+RulePlan = namedtuple('RulePlan', ['normalize', 'pad', 'clean', 'escape'])
+
+# The properties of a token checked by the rules of the detokenizer, see
+# `MosesDetokenizer.token_type()`. The *kind* is 'cjk', 'currency',
+# 'punctuation' or None, and *quote* is the quotation mark key of the token
+# (or None if it isn't made of quotation marks).
+TokenType = namedtuple('TokenType', ['kind', 'cjk_last', 'french_space', 'digits',
+                                     'apostrophe_alpha', 'alpha_apostrophe',
+                                     'alpha_first', 'quote', 'finnish'])
+
+
+def apply_rule_steps(steps, text):
+    """
+    Applies the (trigger, rewrite) steps of a `RulePlan` stage to the text.
+    """
+    for trigger, rewrite in steps:
+        if trigger is None or trigger in text:
+            text = rewrite(text)
+    return text
+
+
+_COMPILED_REGEXES = {}
+
+
+def _compile_regex(regexp, flags=0):
+    """
+    Compiles the regex once per process, unlike the `re` module cache, this
+    never evicts the patterns with the huge Perl Unicode Properties classes.
+    """
+    key = (regexp, flags)
+    compiled = _COMPILED_REGEXES.get(key)
+    if compiled is None:
+        compiled = _COMPILED_REGEXES[key] = re.compile(regexp, flags)
+    return compiled
+
+
+def _replace_multidots(text):
+    text = _compile_regex(r'\.([\.]+)').sub(r' DOTMULTI\1', text)
+    dotmulti = _compile_regex(r'DOTMULTI\.')
+    dotmulti_space = _compile_regex(r'DOTMULTI\.([^\.\n])')
+    while dotmulti.search(text):
+        text = dotmulti_space.sub(r'DOTDOTMULTI \1', text)
+        text = dotmulti.sub('DOTDOTMULTI', text)
+    return text
+
+
+def _restore_multidots(text):
+    if 'DOTMULTI' not in text:
+        return text
+    while 'DOTDOTMULTI' in text:
+        text = text.replace('DOTDOTMULTI', 'DOTMULTI.')
+    return text.replace('DOTMULTI', '.')
+
+
+class PadScanner(object):
+    """
+    The pad stage of the `RulePlan` as a single left-to-right scan over the
+    line, used by `MosesTokenizer(engine='scanner')`.
+
+    The line is scanned one space separated chunk at a time and the chunks
+    made of IsAlnum characters only are kept as they are. In the other chunks,
+    the special characters are padded and the remaining words are split at the
+    aggressive dashes, multidots, commas and apostrophes by looking up the
+    characters around them, the same (left, right) context characters that the
+    regexes of the pad stage would see. So the output has the same tokens as
+    the pad stage, only the number of spaces between them may differ.
+    """
+    def __init__(self, alnum, alpha, numbers, lang='en', aggressive_dash_splits=False):
+        # The Perl Unicode Properties character sets end with a newline.
+        self.alnum = frozenset(alnum) - {u'\n'}
+        self.numbers = frozenset(numbers) - {u'\n'}
+        self.aggressive_dash_splits = aggressive_dash_splits
+        alpha = frozenset(alpha) - {u'\n'}
+        alpha_or_numbers = alpha | self.numbers
+
+        # The (left, right, padded apostrophe) of the apostrophe rules, see
+        # ENGLISH_SPECIFIC_APOSTROPHE and FR_IT_SPECIFIC_APOSTROPHE.
+        is_alpha = alpha.__contains__
+        not_alpha = lambda char: char not in alpha
+        if lang == 'en':
+            self.apostrophe_rules = [(not_alpha, not_alpha, u" ' "),
+                                     (lambda char: char not in alpha_or_numbers, is_alpha, u" ' "),
+                                     (is_alpha, not_alpha, u" ' "),
+                                     (is_alpha, is_alpha, u" '"),
+                                     (self.numbers.__contains__, u's'.__eq__, u" '")]
+        elif lang in ['fr', 'it']:
+            self.apostrophe_rules = [(not_alpha, not_alpha, u" ' "),
+                                     (not_alpha, is_alpha, u" ' "),
+                                     (is_alpha, not_alpha, u" ' "),
+                                     (is_alpha, is_alpha, u"' ")]
+        else:
+            self.apostrophe_rules = []
+        # The characters that are not padded by PAD_NOT_ISALNUM, apostrophes
+        # are padded unconditionally without language specific rules.
+        self.word_chars = self.alnum | frozenset(u".`,-" if not self.apostrophe_rules else u".'`,-")
+
+    def __call__(self, text, cache=None):
+        """
+        Pads the stripped text, the text must not contain the "DOTMULTI"
+        placeholder since the multidots loop of the pad stage rewrites it.
+
+        :param cache: A `LRUCache` of the padded chunks. The tokens of a chunk
+            only depend on the chunk, its position in the line and whether
+            its left context was consumed, so the chunks that repeat across
+            lines are scanned once.
+        :type cache: LRUCache
+        """
+        tokens = []
+        # Whether the first apostrophe rule consumed the space after the
+        # previous chunk as its right context.
+        consumed = False
+        chunks = text.split(u' ')
+        last = len(chunks) - 1
+        for i, chunk in enumerate(chunks):
+            if self.alnum.issuperset(chunk):
+                if chunk:
+                    tokens.append(chunk)
+                consumed = False
+            elif cache is None:
+                consumed = self._scan_chunk(chunk, i == 0, i == last, consumed, tokens)
+            else:
+                key = (chunk, i == 0, i == last, consumed, self.aggressive_dash_splits)
+                scanned = cache.get(key)
+                if scanned is None:
+                    start = len(tokens)
+                    consumed = self._scan_chunk(chunk, i == 0, i == last, consumed, tokens)
+                    cache.put(key, (tokens[start:], consumed))
+                else:
+                    chunk_tokens, consumed = scanned
+                    tokens.extend(chunk_tokens)
+        return u' '.join(tokens)
+
+    def _scan_chunk(self, chunk, bol, eol, consumed, tokens):
+        word_chars = self.word_chars
+        if word_chars.issuperset(chunk):
+            return self._scan_word(chunk, bol, eol, consumed, tokens)
+        # Pads the characters outside of the word characters.
+        start = 0
+        for i, char in enumerate(chunk):
+            if char not in word_chars:
+                if start < i:
+                    self._scan_word(chunk[start:i], bol and not start, False,
+                                    consumed and not start, tokens)
+                tokens.append(char)
+                start = i + 1
+        if start < len(chunk):
+            return self._scan_word(chunk[start:], bol and not start, eol,
+                                   consumed and not start, tokens)
+        return False
+
+    def _scan_word(self, word, bol, eol, consumed, tokens):
+        """
+        Splits the aggressive dashes and the multidots of the word. The *bol*
+        and *eol* flags tell if the word is at the start and end of the line,
+        *consumed* if its left context was consumed by an apostrophe rule.
+        """
+        if self.alnum.issuperset(word):
+            tokens.append(word)
+            return False
+        aggressive = self.aggressive_dash_splits and u'-' in word
+        if not aggressive and u'..' not in word:
+            return self._scan_part(word, bol, eol, consumed, tokens)
+
+        alnum = self.alnum
+        length = len(word)
+        start = i = 0
+        while i < length:
+            char = word[i]
+            if char == u'.' and word[i + 1:i + 2] == u'.':
+                # Multidots become "DOTDOTMULTI" tokens.
+                end = i + 2
+                while word[end:end + 1] == u'.':
+                    end += 1
+                separator = u'DOT' * (end - i) + u'MULTI'
+            elif (aggressive and char == u'-' and 0 < i < length - 1 and
+                    word[i - 1] in alnum and word[i + 1] in alnum):
+                end = i + 1
+                separator = u'@-@'
+            else:
+                i += 1
+                continue
+            if start < i:
+                self._scan_part(word[start:i], bol and not start, False,
+                                consumed and not start, tokens)
+            tokens.append(separator)
+            start = i = end
+        if start < length:
+            return self._scan_part(word[start:], bol and not start, eol,
+                                   consumed and not start, tokens)
+        return False
+
+    def _scan_part(self, part, bol, eol, consumed, tokens):
+        """
+        Splits the commas of the part, COMMA_SEPARATE_1_3 pads the commas
+        after a non-number (or the final comma of the line) and then
+        COMMA_SEPARATE_2 pads the commas before a non-number. Each of them
+        consumes the characters around the comma.
+        """
+        if u',' not in part:
+            return self._scan_apostrophes(part, bol, eol, consumed, tokens)
+
+        numbers = self.numbers
+        length = len(part)
+        commas = [i for i, char in enumerate(part) if char == u',']
+        first_pass = set()
+        for i in commas:
+            left = part[i - 1] if i else (None if bol else u' ')
+            if left is None or i - 1 in first_pass:
+                continue
+            if left not in numbers or (eol and i == length - 1):
+                first_pass.add(i)
+        second_pass = set()
+        for i in commas:
+            if i in first_pass or i + 1 in first_pass:
+                right = u' '
+            elif i + 1 < length:
+                right = part[i + 1]
+            else:
+                right = None if eol else u' '
+            if right is None or right in numbers:
+                continue
+            # The comma was consumed as the right context of the previous one.
+            if i - 1 in second_pass and i - 1 not in first_pass and i not in first_pass:
+                continue
+            second_pass.add(i)
+
+        padded = first_pass | second_pass
+        start = 0
+        for i in commas:
+            if i in padded:
+                if start < i:
+                    self._scan_apostrophes(part[start:i], bol and not start, False,
+                                           consumed and not start, tokens)
+                tokens.append(u',')
+                start = i + 1
+        if start < length:
+            return self._scan_apostrophes(part[start:], bol and not start, eol,
+                                          consumed and not start, tokens)
+        return False
+
+    def _scan_apostrophes(self, part, bol, eol, consumed, tokens):
+        """
+        Applies the apostrophe rules one after the other, just like their
+        regexes, each rule consumes the characters around the apostrophe.
+        Returns whether the first rule consumed the space after the part.
+        """
+        if not self.apostrophe_rules or u"'" not in part:
+            tokens.append(part)
+            return False
+        left = u'' if bol else u' '
+        right = u'' if eol else u' '
+        text = left + part + right
+        consumed_right = False
+        for rule, (is_left, is_right, apostrophe) in enumerate(self.apostrophe_rules):
+            start = 1 if consumed and left and not rule else 0
+            pieces, last = [], 0
+            i = text.find(u"'", start + 1)
+            while i != -1 and i + 1 < len(text):
+                if is_left(text[i - 1]) and is_right(text[i + 1]):
+                    pieces.append(text[last:i])
+                    pieces.append(apostrophe)
+                    last = i + 1
+                    if not rule and right and i + 2 == len(text):
+                        consumed_right = True
+                    i = text.find(u"'", i + 3)
+                else:
+                    i = text.find(u"'", i + 1)
+            if pieces:
+                pieces.append(text[last:])
+                text = u''.join(pieces)
+        tokens.append(text[len(left):len(text) - len(right)])
+        return consumed_right
+
+
 class MosesTokenizer(object):
     """
     This is a Python port of the Moses Tokenizer from
     https://github.com/moses-smt/mosesdecoder/blob/master/scripts/tokenizer/tokenizer.perl
     """
     # Perl Unicode Properties character sets.
-    IsN = text_type(''.join(perluniprops.chars('IsN')))
-    IsAlnum = text_type(''.join(perluniprops.chars('IsAlnum'))) #+ u'्'
-    IsSc = text_type(''.join(perluniprops.chars('IsSc')))
-    IsSo = text_type(''.join(perluniprops.chars('IsSo')))
-    IsAlpha = text_type(''.join(perluniprops.chars('IsAlpha')))
-    IsLower = text_type(''.join(perluniprops.chars('IsLower')))
+    IsN = LazyCategory('IsN')
+    IsAlnum = LazyCategory('IsAlnum') #+ u'्'
+    IsSc = LazyCategory('IsSc')
+    IsSo = LazyCategory('IsSo')
+    IsAlpha = LazyCategory('IsAlpha')
+    IsLower = LazyCategory('IsLower')
+    # Hashed IsAlpha and IsLower for the nonbreaking prefix checks.
+    _ALPHA_SET = LazyCategory('IsAlpha', form='charset')
+    _LOWER_SET = LazyCategory('IsLower', form='charset')
+    # The same character sets as codepoint ranges for the regexes below,
+    # they compile a lot faster than the characters themselves.
+    _IsN = perluniprops.regex_ranges('IsN')
+    _IsAlnum = perluniprops.regex_ranges('IsAlnum')
+    _IsSc = perluniprops.regex_ranges('IsSc')
+    _IsSo = perluniprops.regex_ranges('IsSo')
+    _IsAlpha = perluniprops.regex_ranges('IsAlpha')
+
+    # The kinds of prefixes in the nonbreaking prefix index.
+    NONBREAKING_PREFIX, NUMERIC_ONLY_PREFIX = 'nonbreaking', 'numeric_only'
 
     # Remove ASCII junk.
     DEDUPLICATE_SPACE = r'\s+', r' '
@@ -37,11 +331,11 @@ class MosesTokenizer(object):
     RIGHT_STRIP = r" $", r""  # Uses text.rstrip() instead.
 
     # Pad all "other" special characters not in IsAlnum.
-    PAD_NOT_ISALNUM = u'([^{}\s\.\'\`\,\-])'.format(IsAlnum), r' \1 '
+    PAD_NOT_ISALNUM = u'([^{}\s\.\'\`\,\-])'.format(_IsAlnum), r' \1 '
 
     # Splits all hyphens (regardless of circumstances), e.g.
     # 'foo-bar' -> 'foo @-@ bar'
-    AGGRESSIVE_HYPHEN_SPLIT = u'([{alphanum}])\-(?=[{alphanum}])'.format(alphanum=IsAlnum), r'\1 @-@ '
+    AGGRESSIVE_HYPHEN_SPLIT = u'([{alphanum}])\-(?=[{alphanum}])'.format(alphanum=_IsAlnum), r'\1 @-@ '
 
     # Make multi-dots stay together.
     REPLACE_DOT_WITH_LITERALSTRING_1 = r'\.([\.]+)', ' DOTMULTI\1'
@@ -53,12 +347,17 @@ class MosesTokenizer(object):
     # First application uses up B so rule can't see B,C
     # two-step version here may create extra spaces but these are removed later
     # will also space digit,letter or letter,digit forms (redundant with next section)
-    COMMA_SEPARATE_1 = u'([^{}])[,]'.format(IsN), r'\1 , '
-    COMMA_SEPARATE_2 = u'[,]([^{}])'.format(IsN), r' , \1'
-    COMMA_SEPARATE_3 = u'([{}])[,]$'.format(IsN), r'\1 , '
+    COMMA_SEPARATE_1 = u'([^{}])[,]'.format(_IsN), r'\1 , '
+    COMMA_SEPARATE_2 = u'[,]([^{}])'.format(_IsN), r' , \1'
+    COMMA_SEPARATE_3 = u'([{}])[,]$'.format(_IsN), r'\1 , '
 
     # separate "," after a number if it's the end of a sentence
-    COMMA_SEPARATE_3 = u'([{}])[,]$'.format(IsN), r'\1 , '
+    COMMA_SEPARATE_3 = u'([{}])[,]$'.format(_IsN), r'\1 , '
+
+    # COMMA_SEPARATE_1 and COMMA_SEPARATE_3 fused into a single pass, used
+    # before COMMA_SEPARATE_2 in the rule plan. This only changes the number
+    # of spaces around the final comma, which are deduplicated later.
+    COMMA_SEPARATE_1_3 = u'([^{isn}]|[{isn}](?=[,]$))[,]'.format(isn=_IsN), r'\1 , '
 
     # Attempt to get correct directional quotes.
     DIRECTIONAL_QUOTE_1 = r'^``', r'`` '
@@ -76,17 +375,17 @@ class MosesTokenizer(object):
     RESTORE_ELLIPSIS = r'_ELLIPSIS_', r'\.\.\.'
 
     # Pad , with tailing space except if within numbers, e.g. 5,300
-    COMMA_1 = u'([^{numbers}])[,]([^{numbers}])'.format(numbers=IsN), r'\1 , \2'
-    COMMA_2 = u'([{numbers}])[,]([^{numbers}])'.format(numbers=IsN), r'\1 , \2'
-    COMMA_3 = u'([^{numbers}])[,]([{numbers}])'.format(numbers=IsN), r'\1 , \2'
+    COMMA_1 = u'([^{numbers}])[,]([^{numbers}])'.format(numbers=_IsN), r'\1 , \2'
+    COMMA_2 = u'([{numbers}])[,]([^{numbers}])'.format(numbers=_IsN), r'\1 , \2'
+    COMMA_3 = u'([^{numbers}])[,]([{numbers}])'.format(numbers=_IsN), r'\1 , \2'
 
     # Pad unicode symbols with spaces.
-    SYMBOLS = u'([;:@#\$%&{}{}])'.format(IsSc, IsSo), r' \1 '
+    SYMBOLS = u'([;:@#\$%&{}{}])'.format(_IsSc, _IsSo), r' \1 '
 
     # Separate out intra-token slashes.  PTB tokenization doesn't do this, so
     # the tokens should be merged prior to parsing with a PTB-trained parser.
     # e.g. "and/or" -> "and @/@ or"
-    INTRATOKEN_SLASHES = u'([{alphanum}])\/([{alphanum}])'.format(alphanum=IsAlnum), r'$1 \@\/\@ $2'
+    INTRATOKEN_SLASHES = u'([{alphanum}])\/([{alphanum}])'.format(alphanum=_IsAlnum), r'$1 \@\/\@ $2'
 
     # Splits final period at end of string.
     FINAL_PERIOD = r"""([^.])([.])([\]\)}>"']*) ?$""", r'\1 \2\3'
@@ -155,25 +454,29 @@ class MosesTokenizer(object):
     ESCAPE_LEFT_SQUARE_BRACKET = r"\[", r"&#91;"
     ESCAPE_RIGHT_SQUARE_BRACKET = r"]", r"&#93;"
 
-    EN_SPECIFIC_1 = u"([^{alpha}])[']([^{alpha}])".format(alpha=IsAlpha), r"\1 ' \2"
-    EN_SPECIFIC_2 = u"([^{alpha}{isn}])[']([{alpha}])".format(alpha=IsAlpha, isn=IsN), r"\1 ' \2"
-    EN_SPECIFIC_3 = u"([{alpha}])[']([^{alpha}])".format(alpha=IsAlpha), r"\1 ' \2"
-    EN_SPECIFIC_4 = u"([{alpha}])[']([{alpha}])".format(alpha=IsAlpha), r"\1 '\2"
-    EN_SPECIFIC_5 = u"([{isn}])[']([s])".format(isn=IsN), r"\1 '\2"
+    EN_SPECIFIC_1 = u"([^{alpha}])[']([^{alpha}])".format(alpha=_IsAlpha), r"\1 ' \2"
+    EN_SPECIFIC_2 = u"([^{alpha}{isn}])[']([{alpha}])".format(alpha=_IsAlpha, isn=_IsN), r"\1 ' \2"
+    EN_SPECIFIC_3 = u"([{alpha}])[']([^{alpha}])".format(alpha=_IsAlpha), r"\1 ' \2"
+    EN_SPECIFIC_4 = u"([{alpha}])[']([{alpha}])".format(alpha=_IsAlpha), r"\1 '\2"
+    EN_SPECIFIC_5 = u"([{isn}])[']([s])".format(isn=_IsN), r"\1 '\2"
 
     ENGLISH_SPECIFIC_APOSTROPHE = [EN_SPECIFIC_1, EN_SPECIFIC_2, EN_SPECIFIC_3,
                                    EN_SPECIFIC_4, EN_SPECIFIC_5]
 
-    FR_IT_SPECIFIC_1 = u"([^{alpha}])[']([^{alpha}])".format(alpha=IsAlpha), r"\1 ' \2"
-    FR_IT_SPECIFIC_2 = u"([^{alpha}])[']([{alpha}])".format(alpha=IsAlpha), r"\1 ' \2"
-    FR_IT_SPECIFIC_3 = u"([{alpha}])[']([^{alpha}])".format(alpha=IsAlpha), r"\1 ' \2"
-    FR_IT_SPECIFIC_4 = u"([{alpha}])[']([{alpha}])".format(alpha=IsAlpha), r"\1' \2"
+    FR_IT_SPECIFIC_1 = u"([^{alpha}])[']([^{alpha}])".format(alpha=_IsAlpha), r"\1 ' \2"
+    FR_IT_SPECIFIC_2 = u"([^{alpha}])[']([{alpha}])".format(alpha=_IsAlpha), r"\1 ' \2"
+    FR_IT_SPECIFIC_3 = u"([{alpha}])[']([^{alpha}])".format(alpha=_IsAlpha), r"\1 ' \2"
+    FR_IT_SPECIFIC_4 = u"([{alpha}])[']([{alpha}])".format(alpha=_IsAlpha), r"\1' \2"
 
     FR_IT_SPECIFIC_APOSTROPHE = [FR_IT_SPECIFIC_1, FR_IT_SPECIFIC_2,
                                  FR_IT_SPECIFIC_3, FR_IT_SPECIFIC_4]
 
     NON_SPECIFIC_APOSTROPHE = r"\'", " ' "
 
+    # PAD_NOT_ISALNUM and NON_SPECIFIC_APOSTROPHE fused into a single pass, used
+    # for the languages without specific apostrophe rules.
+    PAD_NOT_ISALNUM_OR_APOSTROPHE = u'([^{}\s\.\`\,\-])'.format(_IsAlnum), r' \1 '
+
     TRAILING_DOT_APOSTROPHE = "\.\' ?$", " . ' "
 
     BASIC_PROTECTED_PATTERN_1 = r"<\/?\S+\/?>"
@@ -222,76 +525,208 @@ class MosesTokenizer(object):
                                 BASIC_PROTECTED_PATTERN_4,
                                 BASIC_PROTECTED_PATTERN_5]
 
-    def __init__(self, lang='en'):
+    # Compiled rule plans and pad scanners shared across instances, see
+    # `rule_plan()` and `pad_scanner()`.
+    _RULE_PLANS = {}
+    _PAD_SCANNERS = {}
+    # The nonbreaking prefix indexes shared across instances, see
+    # `nonbreaking_prefix_index()`.
+    _NONBREAKING_PREFIX_INDEXES = {}
+
+    ENGINES = ['regex', 'scanner']
+
+    def __init__(self, lang='en', engine='regex', cache_size=0, chunk_cache_size=0):
+        """
+        :param lang: The language of the nonbreaking prefixes and the apostrophe rules.
+        :type lang: str
+        :param engine: Pads the special characters with the regexes of the
+            `RulePlan` ('regex') or with the `PadScanner` ('scanner'), both
+            give the same tokens.
+        :type engine: str
+        :param cache_size: The no. of tokenized lines kept in a `LRUCache`
+            (`self.cache`) to skip the rules on repeated lines, or 0 to
+            disable the cache.
+        :type cache_size: int
+        :param chunk_cache_size: The no. of space separated chunks whose
+            padded tokens are kept in a `LRUCache` (`self.chunk_cache`), so the
+            pad stage of the frequent words is a lookup, the rules that look
+            across the tokens still run on every line. Needs the 'scanner'
+            engine, 0 disables the cache.
+        :type chunk_cache_size: int
+        """
         # Initialize the object.
         super(MosesTokenizer, self).__init__()
+        if engine not in self.ENGINES:
+            raise ValueError('Unknown tokenizer engine {!r}, use one of {}'.format(engine, self.ENGINES))
+        if chunk_cache_size and engine != 'scanner':
+            raise ValueError("The chunk cache needs the 'scanner' engine, got {!r}".format(engine))
         self.lang = lang
+        self.engine = engine
         # Initialize the language specific nonbreaking prefixes.
-        self.NONBREAKING_PREFIXES = [_nbp.strip() for _nbp in nonbreaking_prefixes.words(lang)]
-        self.NUMERIC_ONLY_PREFIXES = [w.rpartition(' ')[0] for w in
-                                      self.NONBREAKING_PREFIXES if
-                                      self.has_numeric_only(w)]
+        prefixes, numeric_only_prefixes, self.prefix_kinds = self.nonbreaking_prefix_index()
+        self.NONBREAKING_PREFIXES = list(prefixes)
+        self.NUMERIC_ONLY_PREFIXES = list(numeric_only_prefixes)
+        # The rule plans are built on first use, see `rule_plan()`.
+        self.cache = LRUCache(cache_size) if cache_size else None
+        self.chunk_cache = LRUCache(chunk_cache_size) if chunk_cache_size else None
+
+    @staticmethod
+    def _compile(regexp, flags=0):
+        return _compile_regex(regexp, flags)
+
+    def _regex_step(self, rule, trigger=None):
+        regexp, substitution = rule
+        return trigger, partial(self._compile(regexp).sub, substitution)
+
+    def _pad_step(self, rule, trigger=None):
+        """
+        Compiles a rule of the pad stage such that it can be applied to many
+        lines joined with newlines at once, see `tokenize_batch()`. The text
+        has no newlines at this stage, so it doesn't change the per-line output.
+        """
+        regexp, substitution = rule
+        # The Perl Unicode Properties character sets end with a newline, which
+        # shouldn't match as a context character across the joined lines.
+        for chars in (self._IsAlnum, self._IsAlpha, self._IsN):
+            regexp = regexp.replace(u'[' + chars + u']', u'[' + chars.replace(u'\n', u'') + u']')
+        return trigger, partial(self._compile(regexp, re.MULTILINE).sub, substitution)
+
+    def rule_plan(self, aggressive_dash_splits=False, escape=True):
+        """
+        Returns the compiled `RulePlan` used by `tokenize()` for the given
+        options. Plans are built once per (lang, aggressive_dash_splits, escape)
+        combination and cached at class level.
+        """
+        key = (type(self), self.lang, aggressive_dash_splits, escape)
+        plan = self._RULE_PLANS.get(key)
+        if plan is None:
+            plan = self._RULE_PLANS[key] = self._build_rule_plan(aggressive_dash_splits, escape)
+        return plan
+
+    def nonbreaking_prefix_index(self):
+        """
+        Returns the (nonbreaking prefixes, numeric only prefixes, prefix kinds)
+        of the language, read once per language and cached at class level.
+        The prefix kinds map a prefix to NUMERIC_ONLY_PREFIX if it's only
+        nonbreaking before numbers or to NONBREAKING_PREFIX otherwise.
+        """
+        index = self._NONBREAKING_PREFIX_INDEXES.get(self.lang)
+        if index is None:
+            prefixes = tuple(_nbp.strip() for _nbp in nonbreaking_prefixes.words(self.lang))
+            numeric_only_prefixes = tuple(w.rpartition(' ')[0] for w in prefixes
+                                          if self.has_numeric_only(w))
+            prefix_kinds = dict.fromkeys(prefixes, self.NONBREAKING_PREFIX)
+            prefix_kinds.update(dict.fromkeys(numeric_only_prefixes, self.NUMERIC_ONLY_PREFIX))
+            index = self._NONBREAKING_PREFIX_INDEXES[self.lang] = (prefixes, numeric_only_prefixes,
+                                                                   prefix_kinds)
+        return index
+
+    def pad_scanner(self, aggressive_dash_splits=False):
+        """
+        Returns the `PadScanner` used by `tokenize()` with the 'scanner'
+        engine, they are built once per (lang, aggressive_dash_splits).
+        """
+        key = (type(self), self.lang, aggressive_dash_splits)
+        scanner = self._PAD_SCANNERS.get(key)
+        if scanner is None:
+            scanner = self._PAD_SCANNERS[key] = PadScanner(self.IsAlnum, self.IsAlpha, self.IsN,
+                                                           self.lang, aggressive_dash_splits)
+        return scanner
+
+    def _build_rule_plan(self, aggressive_dash_splits, escape):
+        # De-duplicate spaces and clean ASCII junk, once the whitespaces are
+        # deduplicated, the remaining junk can be deleted with a single translate.
+        dedup_space = self._compile(self.DEDUPLICATE_SPACE[0])
+        ascii_junk = {i: None for i in range(0o40)}
+        normalize = ((None, partial(dedup_space.sub, self.DEDUPLICATE_SPACE[1])),
+                     (None, methodcaller('translate', ascii_junk)))
+
+        # Separate special characters outside of IsAlnum character set,
+        # (the generic apostrophe rule is folded into this pass).
+        if self.lang in ['en', 'fr', 'it']:
+            pad = [self._pad_step(self.PAD_NOT_ISALNUM)]
+        else:
+            pad = [self._pad_step(self.PAD_NOT_ISALNUM_OR_APOSTROPHE)]
+        # Aggressively splits dashes
+        if aggressive_dash_splits:
+            pad.append(self._pad_step(self.AGGRESSIVE_HYPHEN_SPLIT, '-'))
+        # Replaces multidots with "DOTDOTMULTI" literal strings.
+        pad.append(('.', _replace_multidots))
+        # Separate out "," except if within numbers e.g. 5,300
+        pad.append(self._pad_step(self.COMMA_SEPARATE_1_3, ','))
+        pad.append(self._pad_step(self.COMMA_SEPARATE_2, ','))
+        # (Language-specific) apostrophe tokenization.
+        if self.lang == 'en':
+            pad.extend(self._pad_step(rule, "'") for rule in self.ENGLISH_SPECIFIC_APOSTROPHE)
+        elif self.lang in ['fr', 'it']:
+            pad.extend(self._pad_step(rule, "'") for rule in self.FR_IT_SPECIFIC_APOSTROPHE)
+
+        # Cleans up extraneous spaces and split trailing ".'".
+        space = self.DEDUPLICATE_SPACE[1]
+        clean = ((None, lambda text: dedup_space.sub(space, text).strip()),
+                 self._regex_step(self.TRAILING_DOT_APOSTROPHE, ".'"))
+
+        # Escape XML symbols, all of them are single characters, so a single
+        # translate is enough as long as the ampersands are escaped first.
+        if escape:
+            # (unicode.translate() only maps to unicode on Python 2.)
+            xml_entities = {ord(regexp[-1]): text_type(substitution) for regexp, substitution
+                            in self.MOSES_ESCAPE_XML_REGEXES}
+            escape = ((None, methodcaller('translate', xml_entities)),)
+        else:
+            escape = ()
+        return RulePlan(normalize, tuple(pad), clean, escape)
 
     def replace_multidots(self, text):
-        text = re.sub(r'\.([\.]+)', r' DOTMULTI\1', text)
-        while re.search(r'DOTMULTI\.', text):
-            text = re.sub(r'DOTMULTI\.([^\.])', r'DOTDOTMULTI \1', text)
-            text = re.sub(r'DOTMULTI\.', 'DOTDOTMULTI', text)
-        return text
+        return _replace_multidots(text)
 
     def restore_multidots(self, text):
-        while re.search(r'DOTDOTMULTI', text):
-            text = re.sub(r'DOTDOTMULTI', r'DOTMULTI.', text)
-        return re.sub(r'DOTMULTI', r'.', text)
+        return _restore_multidots(text)
 
     def is_first_lower(self, text):
-        return re.match(r"^[{islower}]".format(islower=self.IsLower), text)
+        return text[:1] in self._LOWER_SET
 
     def isanyalpha(self, text):
-        return any(set(text).intersection(set(self.IsAlpha)))
+        return not self._ALPHA_SET.isdisjoint(text)
 
     def has_numeric_only(self, text):
-        return bool(re.search(r'(.*)[\s]+(\#NUMERIC_ONLY\#)', text))
+        return bool(self._compile(r'(.*)[\s]+(\#NUMERIC_ONLY\#)').search(text))
 
     def handles_nonbreaking_prefixes(self, text):
         # Splits the text into tokens to check for nonbreaking prefixes.
         tokens = text.split()
         num_tokens = len(tokens)
+        prefix_kinds = self.prefix_kinds
         for i, token in enumerate(tokens):
             # Checks if token ends with a fullstop.
-            token_ends_with_period = re.search(r'^(\S+)\.$', token)
-            if token_ends_with_period:
-                prefix = token_ends_with_period.group(1)
-                # split last words independently as they are unlikely to be non-breaking prefixes
-                # changed in https://github.com/moses-smt/mosesdecoder/pull/204/files
-                if (i + 1) == num_tokens:
-                    tokens[i] = prefix + ' .'
-                # Checks for 3 conditions if
-                # i.   the prefix contains a fullstop and
-                #      any char in the prefix is within the IsAlpha charset
-                # ii.  the prefix is in the list of nonbreaking prefixes and
-                #      does not contain #NUMERIC_ONLY#
-                # iii. the token is not the last token and that the
-                #      next token contains all lowercase.
-                elif (('.' in prefix and self.isanyalpha(prefix)) or
-                        (prefix in self.NONBREAKING_PREFIXES and
-                         prefix not in self.NUMERIC_ONLY_PREFIXES) or
-                        (i != num_tokens - 1 and self.is_first_lower(tokens[i + 1]))):
-                    pass  # No change to the token.
-                # Checks if the prefix is in NUMERIC_ONLY_PREFIXES
-                # and ensures that the next word is a digit.
-                elif (prefix in self.NUMERIC_ONLY_PREFIXES and
-                      (i + 1) < num_tokens and
-                      re.search(r'^[0-9]+', tokens[i + 1])):
-                    pass  # No change to the token.
-                else:  # Otherwise, adds a space after the tokens before a dot.
-                    tokens[i] = prefix + ' .'
+            if token[-1] != '.' or len(token) == 1:
+                continue
+            prefix = token[:-1]
+            # split last words independently as they are unlikely to be non-breaking prefixes
+            # changed in https://github.com/moses-smt/mosesdecoder/pull/204/files
+            if (i + 1) == num_tokens:
+                tokens[i] = prefix + ' .'
+                continue
+            kind = prefix_kinds.get(prefix)
+            # Checks for 3 conditions if
+            # i.   the prefix contains a fullstop and
+            #      any char in the prefix is within the IsAlpha charset
+            # ii.  the prefix is a nonbreaking prefix that is not #NUMERIC_ONLY#
+            # iii. the next token starts with a lowercase character.
+            if (('.' in prefix and self.isanyalpha(prefix)) or
+                    kind == self.NONBREAKING_PREFIX or
+                    self.is_first_lower(tokens[i + 1])):
+                pass  # No change to the token.
+            # Checks if the prefix is in NUMERIC_ONLY_PREFIXES
+            # and ensures that the next word is a digit.
+            elif kind == self.NUMERIC_ONLY_PREFIX and tokens[i + 1][0] in '0123456789':
+                pass  # No change to the token.
+            else:  # Otherwise, adds a space after the tokens before a dot.
+                tokens[i] = prefix + ' .'
         return " ".join(tokens)  # Stitch the tokens back.
 
     def escape_xml(self, text):
-        for regexp, substitution in self.MOSES_ESCAPE_XML_REGEXES:
-            text = re.sub(regexp, substitution, text)
-        return text
+        return apply_rule_steps(self.rule_plan(escape=True).escape, text)
 
     def penn_tokenize(self, text, return_str=False):
         """
@@ -302,92 +737,164 @@ class MosesTokenizer(object):
         text = text_type(text)
         # Perform a chain of regex substituitions using MOSES_PENN_REGEXES_1
         for regexp, substitution in self.MOSES_PENN_REGEXES_1:
-            text = re.sub(regexp, substitution, text)
+            text = self._compile(regexp).sub(substitution, text)
         # Handles nonbreaking prefixes.
         text = self.handles_nonbreaking_prefixes(text)
         # Restore ellipsis, clean extra spaces, escape XML symbols.
         for regexp, substitution in self.MOSES_PENN_REGEXES_2:
-            text = re.sub(regexp, substitution, text)
+            text = self._compile(regexp).sub(substitution, text)
         return text if return_str else text.split()
 
-    def tokenize(self, text,
-                 aggressive_dash_splits=False,
-                 return_str=False,
-                 escape=True,
-                 protected_patterns=None):
+    def _protect(self, text, plan, protected_patterns=None):
         """
-        Python port of the Moses tokenizer.
+        Normalizes the spaces of the text and replaces the tokens that match
+        the protected patterns with placeholders.
 
-            :param tokens: A single string, i.e. sentence text.
-            :type tokens: str
-            :param aggressive_dash_splits: Option to trigger dash split rules .
-            :type aggressive_dash_splits: bool
+        :returns: A tuple of the stripped text and the protected tokens.
         """
         # Converts input string into unicode.
         text = text_type(text)
         # De-duplicate spaces and clean ASCII junk
-        for regexp, substitution in [self.DEDUPLICATE_SPACE, self.ASCII_JUNK]:
-            text = re.sub(regexp, substitution, text)
+        text = apply_rule_steps(plan.normalize, text)
 
+        protected_tokens = None
         if protected_patterns:
             # Find the tokens that needs to be protected.
             protected_tokens = [match.group()
                                 for protected_pattern in protected_patterns
-                                for match in re.finditer(protected_pattern, text, re.IGNORECASE)]
+                                for match in self._compile(protected_pattern, re.IGNORECASE).finditer(text)]
             # Apply the protected_patterns.
             for i, token in enumerate(protected_tokens):
                 substitution = 'THISISPROTECTED' + str(i).zfill(3)
                 text = text.replace(token, substitution)
 
         # Strips heading and trailing spaces.
-        text = text.strip()
-        # Separate special characters outside of IsAlnum character set.
-        regexp, substitution = self.PAD_NOT_ISALNUM
-        text = re.sub(regexp, substitution, text)
-        # Aggressively splits dashes
-        if aggressive_dash_splits:
-            regexp, substitution = self.AGGRESSIVE_HYPHEN_SPLIT
-            text = re.sub(regexp, substitution, text)
-        # Replaces multidots with "DOTDOTMULTI" literal strings.
-        text = self.replace_multidots(text)
-        # Separate out "," except if within numbers e.g. 5,300
-        for regexp, substitution in [self.COMMA_SEPARATE_1, self.COMMA_SEPARATE_2, self.COMMA_SEPARATE_3]:
-            text = re.sub(regexp, substitution, text)
+        return text.strip(), protected_tokens
 
-        # (Language-specific) apostrophe tokenization.
-        if self.lang == 'en':
-            for regexp, substitution in self.ENGLISH_SPECIFIC_APOSTROPHE:
-                text = re.sub(regexp, substitution, text)
-        elif self.lang in ['fr', 'it']:
-            for regexp, substitution in self.FR_IT_SPECIFIC_APOSTROPHE:
-                text = re.sub(regexp, substitution, text)
-        else:
-            regexp, substitution = self.NON_SPECIFIC_APOSTROPHE
-            text = re.sub(regexp, substitution, text)
+    def _pad(self, text, plan, aggressive_dash_splits=False):
+        """
+        Pads special characters, dashes, multidots, commas and apostrophes.
+        """
+        # The multidots loop of the regexes also rewrites "DOTMULTI" in the
+        # input, the scanner leaves such (rare) lines to the regexes.
+        if self.engine == 'scanner' and 'DOTMULTI' not in text:
+            return self.pad_scanner(aggressive_dash_splits)(text, self.chunk_cache)
+        return apply_rule_steps(plan.pad, text)
 
+    def _restore(self, text, plan, protected_tokens=None):
+        """
+        Applies the line-local rules that follow the pad stage and restores
+        the placeholders.
+        """
         # Handles nonbreaking prefixes.
         text = self.handles_nonbreaking_prefixes(text)
-        # Cleans up extraneous spaces.
-        regexp, substitution = self.DEDUPLICATE_SPACE
-        text = re.sub(regexp, substitution, text).strip()
-        # Split trailing ".'".
-        regexp, substitution = self.TRAILING_DOT_APOSTROPHE
-        text = re.sub(regexp, substitution, text)
+        # Cleans up extraneous spaces and split trailing ".'".
+        text = apply_rule_steps(plan.clean, text)
 
         # Restore the protected tokens.
-        if protected_patterns:
+        if protected_tokens:
             for i, token in enumerate(protected_tokens):
                 substitution = 'THISISPROTECTED' + str(i).zfill(3)
                 text = text.replace(substitution, token)
 
         # Restore multidots.
         text = self.restore_multidots(text)
-        if escape:
-            # Escape XML symbols.
-            text = self.escape_xml(text)
+        # Escape XML symbols.
+        return apply_rule_steps(plan.escape, text)
+
+    def _cache_key(self, text, aggressive_dash_splits, escape, protected_patterns):
+        # All the options that change the tokens of a line.
+        return (text, aggressive_dash_splits, escape,
+                tuple(protected_patterns) if protected_patterns else None, self.lang)
+
+    def tokenize(self, text,
+                 aggressive_dash_splits=False,
+                 return_str=False,
+                 escape=True,
+                 protected_patterns=None):
+        """
+        Python port of the Moses tokenizer.
 
+            :param tokens: A single string, i.e. sentence text.
+            :type tokens: str
+            :param aggressive_dash_splits: Option to trigger dash split rules .
+            :type aggressive_dash_splits: bool
+        """
+        if self.cache is None:
+            text = self._tokenize(text, aggressive_dash_splits, escape, protected_patterns)
+        else:
+            key = self._cache_key(text, aggressive_dash_splits, escape, protected_patterns)
+            tokenized = self.cache.get(key)
+            if tokenized is None:
+                tokenized = self._tokenize(text, aggressive_dash_splits, escape, protected_patterns)
+                self.cache.put(key, tokenized)
+            text = tokenized
         return text if return_str else text.split()
 
+    def _tokenize(self, text, aggressive_dash_splits, escape, protected_patterns):
+        plan = self.rule_plan(aggressive_dash_splits, escape)
+        text, protected_tokens = self._protect(text, plan, protected_patterns)
+        text = self._pad(text, plan, aggressive_dash_splits)
+        return self._restore(text, plan, protected_tokens)
+
+    def tokenize_batch(self, lines,
+                       aggressive_dash_splits=False,
+                       return_str=False,
+                       escape=True,
+                       protected_patterns=None):
+        """
+        Tokenizes many lines at once, the output is the same as calling
+        `tokenize()` on every line. The rules of the pad stage are applied
+        only once to all lines joined with newlines, the other rules are
+        applied to every line separately. With a cache, only the lines that
+        aren't cached are tokenized.
+
+            :param lines: A list of strings, i.e. sentence texts.
+            :type lines: list(str)
+            :return: list(str) if return_str else list(list(str))
+        """
+        if self.cache is None:
+            texts = self._tokenize_batch(lines, aggressive_dash_splits, escape, protected_patterns)
+        else:
+            keys = [self._cache_key(line, aggressive_dash_splits, escape, protected_patterns)
+                    for line in lines]
+            texts = [self.cache.get(key) for key in keys]
+            missing = [i for i, text in enumerate(texts) if text is None]
+            tokenized = self._tokenize_batch([keys[i][0] for i in missing], aggressive_dash_splits,
+                                             escape, protected_patterns)
+            for i, text in zip(missing, tokenized):
+                texts[i] = text
+                self.cache.put(keys[i], text)
+        return texts if return_str else [text.split() for text in texts]
+
+    def _tokenize_batch(self, lines, aggressive_dash_splits, escape, protected_patterns):
+        plan = self.rule_plan(aggressive_dash_splits, escape)
+        texts, protected_tokens = [], []
+        for line in lines:
+            text, protected = self._protect(line, plan, protected_patterns)
+            texts.append(text)
+            protected_tokens.append(protected)
+        if not texts:
+            return []
+        if self.engine == 'scanner':
+            texts = [self._pad(text, plan, aggressive_dash_splits) for text in texts]
+        else:
+            # There are no newlines in the protected texts, so they can be
+            # used to split the lines again.
+            texts = apply_rule_steps(plan.pad, u'\n'.join(texts)).split(u'\n')
+        return [self._restore(text, plan, protected)
+                for text, protected in zip(texts, protected_tokens)]
+
+    def tokenize_iter(self, lines, batch_size=1000, **kwargs):
+        """
+        Lazily tokenizes an iterable of lines with `tokenize_batch()`,
+        `batch_size` lines at a time, and yields the tokenized lines in order.
+        The keyword arguments are passed to `tokenize_batch()`.
+        """
+        for batch in chunks(lines, batch_size):
+            for tokenized in self.tokenize_batch(batch, **kwargs):
+                yield tokenized
+
 
 class MosesDetokenizer(object):
     """
@@ -396,9 +903,9 @@ class MosesDetokenizer(object):
 
     """
     # Currency Symbols.
-    IsAlnum = text_type(''.join(perluniprops.chars('IsAlnum')))
-    IsAlpha = text_type(''.join(perluniprops.chars('IsAlpha')))
-    IsSc = text_type(''.join(perluniprops.chars('IsSc')))
+    IsAlnum = LazyCategory('IsAlnum')
+    IsAlpha = LazyCategory('IsAlpha')
+    IsSc = LazyCategory('IsSc')
 
     AGGRESSIVE_HYPHEN_SPLIT = r' \@\-\@ ', r'-'
 
@@ -447,15 +954,82 @@ class MosesDetokenizer(object):
                                               text_type('|'.join(FINNISH_MORPHSET_2)),
                                               text_type('|'.join(FINNISH_MORPHSET_3)))
 
-    def __init__(self, lang='en'):
+    FINNISH_CASE_SUFFIX = re.compile(FINNISH_REGEX)
+    CZECH_DASHED_WORD = re.compile(u'^li$|^mail.*', re.IGNORECASE)
+
+    # Hashed Perl Unicode Properties for the token types.
+    _ALPHA_SET = LazyCategory('IsAlpha', form='charset')
+    _SC_SET = LazyCategory('IsSc', form='charset')
+    _DIGITS = frozenset(u'0123456789')
+    _PUNCTUATION = frozenset(u',.?!:;\\%}])')
+    _QUOTES = frozenset(u'\'"\u201e\u201c`')
+    _DOUBLE_QUOTES = frozenset(u'\u201e\u201c')
+
+    # The token types shared by all detokenizers, the cache is emptied when it
+    # holds *TOKEN_TYPE_CACHE_SIZE* tokens.
+    TOKEN_TYPE_CACHE_SIZE = 2 ** 17
+    _TOKEN_TYPES = {}
+
+    def __init__(self, lang='en', cache_size=0):
+        """
+        :param cache_size: The no. of detokenized lines kept in a `LRUCache`
+            (`self.cache`) to skip the rules on repeated lines, or 0 to
+            disable the cache.
+        :type cache_size: int
+        """
         super(MosesDetokenizer, self).__init__()
         self.lang = lang
+        self.cache = LRUCache(cache_size) if cache_size else None
 
     def unescape_xml(self, text):
+        # All the escaped symbols start with an ampersand.
+        if u'&' not in text:
+            return text
         for regexp, substitution in self.MOSES_UNESCAPE_XML_REGEXES:
-            text = re.sub(regexp, substitution, text)
+            text = _compile_regex(regexp).sub(substitution, text)
         return text
 
+    def token_type(self, token):
+        """
+        Returns the `TokenType` of a (non-empty) token, which is memoized, so
+        each distinct token is classified once instead of running the regexes
+        of the rules on every occurrence.
+
+            >>> MosesDetokenizer().token_type(u'$').kind
+            'currency'
+            >>> MosesDetokenizer().token_type(u"l'").alpha_apostrophe
+            True
+        """
+        token_type = self._TOKEN_TYPES.get(token)
+        if token_type is None:
+            if len(self._TOKEN_TYPES) >= self.TOKEN_TYPE_CACHE_SIZE:
+                self._TOKEN_TYPES.clear()
+            token_type = self._TOKEN_TYPES[token] = self._classify(token)
+        return token_type
+
+    def _classify(self, token):
+        alpha = self._ALPHA_SET
+        if is_cjk(token[0]):
+            kind = 'cjk'
+        elif not set(token).difference(self._SC_SET, u'([{\xbf\xa1'):
+            kind = 'currency'
+        elif self._PUNCTUATION.issuperset(token):
+            kind = 'punctuation'
+        else:
+            kind = None
+        quote = None
+        if self._QUOTES.issuperset(token):
+            quote = u'"' if self._DOUBLE_QUOTES.issuperset(token) else token
+        return TokenType(kind=kind,
+                         cjk_last=is_cjk(token[-1]),
+                         french_space=token in (u'?', u'!', u':', u';', u'\\', u'%'),
+                         digits=self._DIGITS.issuperset(token),
+                         apostrophe_alpha=token[0] == u"'" and token[1:2] in alpha,
+                         alpha_apostrophe=token[-1] == u"'" and token[-2:-1] in alpha,
+                         alpha_first=token[0] in alpha,
+                         quote=quote,
+                         finnish=bool(self.FINNISH_CASE_SUFFIX.search(token)))
+
     def tokenize(self, tokens, return_str=True, unescape=True):
         """
         Python port of the Moses detokenizer.
@@ -463,13 +1037,26 @@ class MosesDetokenizer(object):
         :type tokens: list(str)
         :return: str
         """
-        # Convert the list of tokens into a string and pad it with spaces.
-        text = u" {} ".format(" ".join(tokens))
+        # The rules only see the tokens joined with spaces.
+        text = " ".join(tokens)
+        if self.cache is None:
+            detokenized_text = self._detokenize(text, unescape)
+        else:
+            key = (text, unescape, self.lang)
+            detokenized_text = self.cache.get(key)
+            if detokenized_text is None:
+                detokenized_text = self._detokenize(text, unescape)
+                self.cache.put(key, detokenized_text)
+        return detokenized_text if return_str else detokenized_text.split()
+
+    def _detokenize(self, text, unescape):
+        # Pad the text with spaces.
+        text = u" {} ".format(text)
         # Converts input string into unicode.
         text = text_type(text)
         # Detokenize the agressive hyphen split.
         regexp, substitution = self.AGGRESSIVE_HYPHEN_SPLIT
-        text = re.sub(regexp, substitution, text)
+        text = _compile_regex(regexp).sub(substitution, text)
         if unescape:
             # Unescape the XML symbols.
             text = self.unescape_xml(text)
@@ -481,113 +1068,125 @@ class MosesDetokenizer(object):
         # changes the *prepend_space* accordingly as it sequentially checks
         # through the language specific and language independent conditions.
         prepend_space = " "
-        detokenized_text = ""
+        # The detokenized text is built as a list of strings joined at the end.
+        detokenized_text = []
+        append = detokenized_text.append
         tokens = text.split()
+        cached_type = self._TOKEN_TYPES.get
+        token_types = [cached_type(token) or self.token_type(token) for token in tokens]
+        lang = self.lang
+        skip_dash = False
         # Iterate through every token and apply language specific detokenization rule(s).
-        for i, token in enumerate(iter(tokens)):
+        for i, token in enumerate(tokens):
+            if skip_dash:
+                # The dash was already appended with the previous Czech word.
+                skip_dash = False
+                continue
+            token_type = token_types[i]
+            kind = token_type.kind
             # Check if the first char is CJK.
-            if is_cjk(token[0]):
+            if kind == 'cjk':
                 # Perform left shift if this is a second consecutive CJK word.
-                if i > 0 and is_cjk(token[-1]):
-                    detokenized_text += token
+                if i > 0 and token_type.cjk_last:
+                    append(token)
                 # But do nothing special if this is a CJK word that doesn't follow a CJK word
                 else:
-                    detokenized_text += prepend_space + token
+                    append(prepend_space)
+                    append(token)
                 prepend_space = " "
             # If it's a currency symbol.
-            elif re.search(u"^[" + self.IsSc + u"\(\[\{\¿\¡]+$", token):
+            elif kind == 'currency':
                 # Perform right shift on currency and other random punctuation items
-                detokenized_text += prepend_space + token
+                append(prepend_space)
+                append(token)
                 prepend_space = ""
 
-            elif re.search(r'^[\,\.\?\!\:\;\\\%\}\]\)]+$', token):
+            elif kind == 'punctuation':
                 # In French, these punctuations are prefixed with a non-breakable space.
-                if self.lang == 'fr' and re.search(r'^[\?\!\:\;\\\%]$', token):
-                    detokenized_text += " "
+                if lang == 'fr' and token_type.french_space:
+                    append(" ")
                 # Perform left shift on punctuation items.
-                detokenized_text += token
+                append(token)
                 prepend_space = " "
 
-            elif (self.lang == 'en' and i > 0
-                  and re.search(u"^[\'][{}]".format(self.IsAlpha), token)):
-                # and re.search(u'[{}]$'.format(self.IsAlnum), tokens[i-1])):
+            elif lang == 'en' and i > 0 and token_type.apostrophe_alpha:
                 # For English, left-shift the contraction.
-                detokenized_text += token
+                append(token)
                 prepend_space = " "
 
-            elif (self.lang == 'cs' and i > 1
-                  and re.search(r'^[0-9]+$', tokens[-2])  # If the previous previous token is a number.
-                  and re.search(r'^[.,]$', tokens[-1])  # If previous token is a dot.
-                  and re.search(r'^[0-9]+$', token)):  # If the current token is a number.
+            elif (lang == 'cs' and i > 1
+                  and token_types[-2].digits  # If the previous previous token is a number.
+                  and tokens[-1] in (u'.', u',')  # If previous token is a dot.
+                  and token_type.digits):  # If the current token is a number.
                 # In Czech, left-shift floats that are decimal numbers.
-                detokenized_text += token
+                append(token)
                 prepend_space = " "
 
-            elif (self.lang in ['fr', 'it', 'ga'] and i <= len(tokens) - 2
-                  and re.search(u'[{}][\']$'.format(self.IsAlpha), token)
-                  and re.search(u'^[{}]'.format(self.IsAlpha), tokens[i + 1])):  # If the next token is alpha.
+            elif (lang in ['fr', 'it', 'ga'] and i <= len(tokens) - 2
+                  and token_type.alpha_apostrophe
+                  and token_types[i + 1].alpha_first):  # If the next token is alpha.
                 # For French and Italian, right-shift the contraction.
-                detokenized_text += prepend_space + token
+                append(prepend_space)
+                append(token)
                 prepend_space = ""
 
-            elif (self.lang == 'cs' and i <= len(tokens) - 3
-                  and re.search(u'[{}][\']$'.format(self.IsAlpha), token)
-                  and re.search(u'^[-–]$', tokens[i + 1])
-                  and re.search(u'^li$|^mail.*', tokens[i + 2],
-                                re.IGNORECASE)):  # In Perl, ($words[$i+2] =~ /^li$|^mail.*/i)
+            elif (lang == 'cs' and i <= len(tokens) - 3
+                  and token_type.alpha_apostrophe
+                  and tokens[i + 1] in (u'-', u'\u2013')
+                  and self.CZECH_DASHED_WORD.search(tokens[i + 2])):  # In Perl, ($words[$i+2] =~ /^li$|^mail.*/i)
                 # In Czech, right-shift "-li" and a few Czech dashed words (e.g. e-mail)
-                detokenized_text += prepend_space + token + tokens[i + 1]
-                next(tokens, None)  # Advance over the dash
+                append(prepend_space)
+                append(token + tokens[i + 1])
+                skip_dash = True  # Advance over the dash
                 prepend_space = ""
 
             # Combine punctuation smartly.
-            elif re.search(r'''^[\'\"„“`]+$''', token):
-                normalized_quo = token
-                if re.search(r'^[„“”]+$', token):
-                    normalized_quo = '"'
+            elif token_type.quote is not None:
+                normalized_quo = token_type.quote
                 quote_counts[normalized_quo] = quote_counts.get(normalized_quo, 0)
 
-                if self.lang == 'cs' and token == u"„":
+                if lang == 'cs' and token == u"\u201e":
                     quote_counts[normalized_quo] = 0
-                if self.lang == 'cs' and token == u"“":
+                if lang == 'cs' and token == u"\u201c":
                     quote_counts[normalized_quo] = 1
 
                 if quote_counts[normalized_quo] % 2 == 0:
-                    if (self.lang == 'en' and token == u"'" and i > 0
-                            and re.search(r'[s]$', tokens[i - 1])):
+                    if (lang == 'en' and token == u"'" and i > 0
+                            and tokens[i - 1][-1] == u's'):
                         # Left shift on single quote for possessives ending
                         # in "s", e.g. "The Jones' house"
-                        detokenized_text += token
+                        append(token)
                         prepend_space = " "
                     else:
                         # Right shift.
-                        detokenized_text += prepend_space + token
+                        append(prepend_space)
+                        append(token)
                         prepend_space = ""
                         quote_counts[normalized_quo] += 1
                 else:
                     # Left shift.
-                    detokenized_text += token
+                    append(token)
                     prepend_space = " "
                     quote_counts[normalized_quo] += 1
 
-            elif (self.lang == 'fi' and re.search(r':$', tokens[i - 1])
-                  and re.search(self.FINNISH_REGEX, token)):
+            elif (lang == 'fi' and tokens[i - 1][-1] == u':'
+                  and token_type.finnish):
                 # Finnish : without intervening space if followed by case suffix
                 # EU:N EU:n EU:ssa EU:sta EU:hun EU:iin ...
-                detokenized_text += prepend_space + token
+                append(prepend_space)
+                append(token)
                 prepend_space = " "
 
             else:
-                detokenized_text += prepend_space + token
+                append(prepend_space)
+                append(token)
                 prepend_space = " "
 
         # Merge multiple spaces.
         regexp, substitution = self.ONE_SPACE
-        detokenized_text = re.sub(regexp, substitution, detokenized_text)
+        detokenized_text = regexp.sub(substitution, u''.join(detokenized_text))
         # Removes heading and trailing spaces.
-        detokenized_text = detokenized_text.strip()
-
-        return detokenized_text if return_str else detokenized_text.split()
+        return detokenized_text.strip()
 
     def detokenize(self, tokens, return_str=True, unescape=True):
         """ Duck-typing the abstract *tokenize()*."""
@@ -3,16 +3,21 @@
 from __future__ import print_function
 
 import codecs
+import mmap
+import os
 import re
-from collections import defaultdict, Counter
+import struct
+from array import array
+from bisect import bisect_right
+from collections import defaultdict, namedtuple, Counter
 from functools import partial
-from itertools import chain
+from heapq import nlargest
 
-from six import text_type
+from six import string_types
 
-from sacremoses.corpus import Perluniprops
+from sacremoses.corpus import Perluniprops, LazyCategory
 from sacremoses.corpus import NonbreakingPrefixes
-from sacremoses.util import parallelize_preprocess, grouper
+from sacremoses.util import parallelize_preprocess, parallel_reduce, grouper, LRUCache
 
 # Hack to enable Python2.7 to use encoding.
 import sys
@@ -26,6 +31,240 @@ if sys.version_info[0] < 3:
 
 perluniprops = Perluniprops()
 
+
+# The no. of lowercased types and cased surface forms kept and pruned by
+# `MosesTruecaser.prune_casing()`.
+PruningInfo = namedtuple('PruningInfo', ['types', 'surfaces', 'pruned_types', 'pruned_surfaces'])
+
+_MISSING = object()
+
+
+class MappedTruecaseModel(object):
+    """
+    A truecaser model in the binary format of `MosesTruecaser.save_model()`,
+    the file is memory mapped and the cases are looked up in place, so the
+    model loads instantly and the processes using the same model file share
+    one physical copy of it.
+
+    The file starts with a (little-endian) header of the magic bytes, the
+    byte order of the arrays, the no. of (lowercased) types, surface tokens
+    and string bytes, followed by these arrays, each aligned to 8 bytes:
+
+    - `type_offsets`, uint32 [types + 1]: the start and end of the UTF-8
+      types in the string table, sorted by their bytes.
+    - `group_starts`, uint32 [types + 1]: the range of the surface tokens of
+      each type, most frequent first, i.e. the first one is the best case.
+    - `surface_offsets`, uint32 [surfaces + 1]: the surface tokens in the
+      string table.
+    - `counts`, float64 [surfaces]: the counts of the surface tokens.
+    - The string table of the UTF-8 types and surface tokens.
+    """
+    MAGIC = b'SMTCASE\x01'
+    HEADER = struct.Struct('<8s8sQQQ')
+    FENCE_STRIDE = 64
+
+    def __init__(self, filename, is_asr=False):
+        self.filename = filename
+        self.is_asr = is_asr
+        self._open()
+
+    def _open(self):
+        with open(self.filename, 'rb') as fin:
+            self._mmap = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, byteorder, self.num_types, self.num_surfaces, num_bytes = \
+                self.HEADER.unpack_from(self._mmap, 0)
+        if magic != self.MAGIC:
+            raise ValueError('{} is not a binary truecaser model'.format(self.filename))
+        swap = byteorder.rstrip(b'\x00').decode('ascii') != sys.byteorder
+        # The arrays are read in place through typed views (Python 3.3+).
+        self._view = None if swap or not hasattr(memoryview, 'cast') else memoryview(self._mmap)
+        position = [self.HEADER.size]
+
+        def section(typecode, length):
+            start = position[0]
+            itemsize = array(typecode).itemsize
+            end = start + itemsize * length
+            position[0] = end + (-end % 8)
+            if self._view is not None:
+                return self._view[start:end].cast(typecode)
+            # Saved on a machine with the other byte order, or no typed
+            # views, so it is copied.
+            values = array(typecode, self._mmap[start:end])
+            if swap:
+                values.byteswap()
+            return values
+
+        self._type_offsets = section('I', self.num_types + 1)
+        self._group_starts = section('I', self.num_types + 1)
+        self._surface_offsets = section('I', self.num_surfaces + 1)
+        self._counts = section('d', self.num_surfaces)
+        self._strings = position[0]
+        self._fences = [self._string(self._type_offsets, index)
+                        for index in range(0, self.num_types, self.FENCE_STRIDE)]
+
+    def close(self):
+        """
+        Releases the mapping of the file, the model can't be used after.
+        """
+        if self._view is not None:
+            for values in [self._type_offsets, self._group_starts,
+                           self._surface_offsets, self._counts, self._view]:
+                values.release()
+            self._view = None
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __getstate__(self):
+        # The other processes map the file themselves.
+        return {'filename': self.filename, 'is_asr': self.is_asr}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open()
+
+    def __len__(self):
+        return self.num_types
+
+    def _string(self, offsets, index):
+        start = self._strings
+        return self._mmap[start + offsets[index]:start + offsets[index + 1]]
+
+    def _find(self, token_lower):
+        """
+        Binary searches the index of a type, or returns -1. The search starts
+        in the (in memory) fences, every *FENCE_STRIDE* th type, and ends in
+        the mapped types between two fences.
+        """
+        target = token_lower.encode('utf8')
+        low = max(bisect_right(self._fences, target) - 1, 0) * self.FENCE_STRIDE
+        high = min(low + self.FENCE_STRIDE, self.num_types)
+        strings, start, type_offsets = self._mmap, self._strings, self._type_offsets
+        while low < high:
+            middle = (low + high) // 2
+            if strings[start + type_offsets[middle]:start + type_offsets[middle + 1]] < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.num_types and self._string(type_offsets, low) == target:
+            return low
+        return -1
+
+    def best(self, token_lower):
+        """
+        Returns the most frequent case of the lowercased token, or None.
+        """
+        index = self._find(token_lower)
+        if index < 0:
+            return None
+        return self._string(self._surface_offsets, self._group_starts[index]).decode('utf8')
+
+    def known(self, token):
+        """
+        Returns 1 if the token is one of the other known cases of its type
+        (which are not the best case), or None.
+        """
+        index = -1 if self.is_asr else self._find(token.lower())
+        if index >= 0:
+            target = token.encode('utf8')
+            for surface in range(self._group_starts[index] + 1, self._group_starts[index + 1]):
+                if self._string(self._surface_offsets, surface) == target:
+                    return 1
+        return None
+
+    def casing(self):
+        """
+        Reads the whole model into the casing counts of `MosesTruecaser._train()`.
+        """
+        casing = defaultdict(Counter)
+        for index in range(self.num_types):
+            token_lower = self._string(self._type_offsets, index).decode('utf8')
+            for surface in range(self._group_starts[index], self._group_starts[index + 1]):
+                count = self._counts[surface]
+                casing[token_lower][self._string(self._surface_offsets, surface).decode('utf8')] = \
+                        int(count) if count.is_integer() else count
+        return casing
+
+    @classmethod
+    def save(cls, casing, filename):
+        """
+        Saves the casing counts of `MosesTruecaser._train()` in the binary format.
+        """
+        types = sorted((token_lower.encode('utf8'), token_lower) for token_lower in casing)
+        type_offsets, group_starts = array('I', [0]), array('I', [0])
+        surface_offsets, counts = array('I'), array('d')
+        strings = []
+        num_bytes = 0
+        for encoded, token_lower in types:
+            strings.append(encoded)
+            num_bytes += len(encoded)
+            type_offsets.append(num_bytes)
+        surface_offsets.append(num_bytes)
+        for encoded, token_lower in types:
+            for surface, count in casing[token_lower].most_common():
+                encoded = surface.encode('utf8')
+                strings.append(encoded)
+                num_bytes += len(encoded)
+                surface_offsets.append(num_bytes)
+                counts.append(count)
+            group_starts.append(len(counts))
+
+        byteorder = sys.byteorder.encode('ascii')
+        # The model is written next to the file and then renamed, so that the
+        # processes which have mapped the previous model keep reading it.
+        temporary = filename + '.tmp'
+        with open(temporary, 'wb') as fout:
+            fout.write(cls.HEADER.pack(cls.MAGIC, byteorder, len(types), len(counts), num_bytes))
+            for values in [type_offsets, group_starts, surface_offsets, counts]:
+                data = values.tobytes() if hasattr(values, 'tobytes') else values.tostring()
+                fout.write(data + b'\x00' * (-len(data) % 8))
+            for encoded in strings:
+                fout.write(encoded)
+        getattr(os, 'replace', os.rename)(temporary, filename)
+
+    @classmethod
+    def is_binary_model(cls, filename):
+        with open(filename, 'rb') as fin:
+            return fin.read(len(cls.MAGIC)) == cls.MAGIC
+
+
+class _MappedCases(object):
+    """
+    The `dict.get()` interface of the 'best' and 'known' cases of a model
+    loaded from the binary format, the cases of the last *CACHE_SIZE* looked
+    up tokens are kept in a `LRUCache`.
+    """
+    CACHE_SIZE = 2 ** 17
+
+    def __init__(self, lookup):
+        self.lookup = lookup
+        self.cache = LRUCache(self.CACHE_SIZE)
+
+    def _case(self, token):
+        case = self.cache.get(token, _MISSING)
+        if case is _MISSING:
+            case = self.lookup(token)
+            self.cache.put(token, case)
+        return case
+
+    def get(self, token, default=None):
+        case = self._case(token)
+        return default if case is None else case
+
+    def __getitem__(self, token):
+        case = self._case(token)
+        if case is None:
+            raise KeyError(token)
+        return case
+
+    def __contains__(self, token):
+        return self._case(token) is not None
+
+
 class MosesTruecaser(object):
     """
     This is a Python port of the Moses Truecaser from
@@ -33,11 +272,24 @@ class MosesTruecaser(object):
     https://github.com/moses-smt/mosesdecoder/blob/master/scripts/recaser/truecase.perl
     """
     # Perl Unicode Properties character sets.
-    Lowercase_Letter = text_type(''.join(perluniprops.chars('Lowercase_Letter')))
-    Uppercase_Letter = text_type(''.join(perluniprops.chars('Uppercase_Letter')))
-    Titlecase_Letter = text_type(''.join(perluniprops.chars('Uppercase_Letter')))
-
-    def __init__(self, load_from=None, is_asr=None, encoding='utf8'):
+    Lowercase_Letter = LazyCategory('Lowercase_Letter')
+    Uppercase_Letter = LazyCategory('Uppercase_Letter')
+    Titlecase_Letter = LazyCategory('Uppercase_Letter')
+
+    # The formats of `save_model()`, `_load_model()` detects them.
+    MODEL_FORMATS = ['text', 'binary']
+
+    # The patterns of split_xml(), matched at a position of the line.
+    SPACES = re.compile(r"\s*")
+    XML_TAG = re.compile(r"<\S[^>]*>")
+    NON_XML = re.compile(r"[^\s<>]+")
+    XML_COGNATE = re.compile(r"\S+")
+    FACTOR_PIPES = re.compile(r"\|*")
+    # The word and the other factors of a token.
+    FACTORS = re.compile(r"^([^\|]+)(.*)")
+
+    def __init__(self, load_from=None, is_asr=None, encoding='utf8',
+                 min_count=None, max_types=None, drop_lowercase=False, keep_casing=True):
         """
         :param load_from:
         :type load_from:
@@ -46,14 +298,33 @@ class MosesTruecaser(object):
             no case, make sure it is lowercase, and make sure known are cased
             eg. 'i' to be uppercased even if i is known.
         :type is_asr: bool
+
+        The models that are trained, loaded or merged are pruned with
+        `prune_casing()`, the decisions for the kept types don't change.
+
+        :param min_count: Prune the types seen less than `min_count` times.
+        :type min_count: float
+
+        :param max_types: Keep only the `max_types` most frequent types.
+        :type max_types: int
+
+        :param drop_lowercase: Prune the types whose best case is lowercase,
+            when lowercasing is what the truecaser does with unknown types,
+            i.e. for ASR models.
+        :type drop_lowercase: bool
+
+        :param keep_casing: Keep the casing counts in the model, without them
+            the model uses less memory but it can't be saved or updated.
+        :type keep_casing: bool
         """
         # Initialize the object.
         super(MosesTruecaser, self).__init__()
         # Initialize the language specific nonbreaking prefixes.
+        # (The same characters as codepoint ranges, which compile faster.)
         self.SKIP_LETTERS_REGEX = re.compile(u"[{}{}{}]".format(
-                                                self.Lowercase_Letter,
-                                                self.Uppercase_Letter,
-                                                self.Titlecase_Letter)
+                                                perluniprops.regex_ranges('Lowercase_Letter'),
+                                                perluniprops.regex_ranges('Uppercase_Letter'),
+                                                perluniprops.regex_ranges('Uppercase_Letter'))
                                             )
 
         self.XML_SPLIT_REGX = re.compile("(<.*(?<=>))(.*)((?=</)[^>]*>)")
@@ -64,6 +335,10 @@ class MosesTruecaser(object):
         self.encoding = encoding
 
         self.is_asr = is_asr
+        self.min_count = min_count
+        self.max_types = max_types
+        self.drop_lowercase = drop_lowercase
+        self.keep_casing = keep_casing
         if load_from:
             self.model = self._load_model(load_from)
 
@@ -77,7 +352,7 @@ class MosesTruecaser(object):
         truecase_weights = []
         for i, token in enumerate(tokens):
             # Skip XML tags.
-            if re.search(r"(<\S[^>]*>)", token):
+            if self.XML_TAG.search(token):
                 continue
             # Skip if sentence start symbols.
             elif token in self.DELAYED_SENT_START:
@@ -113,9 +388,86 @@ class MosesTruecaser(object):
                 truecase_weights.append((token.lower(), token, current_word_weight))
         return truecase_weights
 
+    def count_casing(self, documents, possibly_use_first_token=False):
+        """
+        Counts the weights of the surface forms of every lowercased token in
+        the documents, see `learn_truecase_weights()`.
+
+        :rtype: defaultdict(Counter)
+        """
+        casing = defaultdict(Counter)
+        for tokens in documents:
+            for lowercase_token, surface_token, weight in self.learn_truecase_weights(
+                    tokens, possibly_use_first_token):
+                casing[lowercase_token][surface_token] += weight
+        return casing
+
+    @staticmethod
+    def merge_casing(casing, other_casing):
+        """
+        Adds the counts of `other_casing` to `casing`, the casing counts of
+        the later documents are expected in `other_casing` so that the tied
+        cases are ordered as if the documents were counted together.
+        """
+        for lowercase_token, counts in other_casing.items():
+            casing[lowercase_token].update(counts)
+        return casing
+
+    def count_numbered_casing(self, numbered_documents, possibly_use_first_token=False):
+        """
+        Counts the weights of the surface tokens of the (number, document)
+        pairs, like `count_casing()`, and the first (document number, order)
+        of every surface token, so that the counts of the documents counted
+        apart can be merged in the order of the documents, see
+        `ordered_casing()`. The documents are lists of tokens, or lines of
+        space separated tokens.
+
+        :rtype: (Counter, dict)
+        """
+        counts, first_seen = Counter(), {}
+        for number, tokens in numbered_documents:
+            if isinstance(tokens, string_types):
+                tokens = tokens.split()
+            for _, surface_token, weight in self.learn_truecase_weights(
+                    tokens, possibly_use_first_token):
+                if surface_token not in first_seen:
+                    first_seen[surface_token] = (number, len(first_seen))
+                counts[surface_token] += weight
+        return counts, first_seen
+
+    @staticmethod
+    def merge_numbered_casing(numbered_casing, other_numbered_casing):
+        """
+        Adds the counts and keeps the first occurrences of `other_numbered_casing`
+        in `numbered_casing`, see `count_numbered_casing()`, in any order.
+        """
+        counts, first_seen = numbered_casing
+        other_counts, other_first_seen = other_numbered_casing
+        counts.update(other_counts)
+        for surface_token, first in other_first_seen.items():
+            if first < first_seen.get(surface_token, first):
+                first_seen[surface_token] = first
+            else:
+                first_seen.setdefault(surface_token, first)
+        return counts, first_seen
+
+    @staticmethod
+    def ordered_casing(counts, first_seen):
+        """
+        Returns the casing counts, as counted by `count_casing()`, of the
+        counts of `count_numbered_casing()`, with the tokens and their cases in
+        the order they were first seen in the documents.
+
+        :rtype: defaultdict(Counter)
+        """
+        casing = defaultdict(Counter)
+        for surface_token in sorted(first_seen, key=first_seen.get):
+            casing[surface_token.lower()][surface_token] = counts[surface_token]
+        return casing
+
     def _train(self, document_iterator, save_to=None,
                possibly_use_first_token=False, processes=1,
-               progress_bar=False):
+               progress_bar=False, casing=None):
         """
         :param document_iterator: The input document, each outer list is a sentence,
                           the inner list is the list of tokens for each sentence.
@@ -128,57 +480,119 @@ class MosesTruecaser(object):
                then it is counted, but with only 10% of the weight of a normal token.
         :type possibly_use_first_token: bool
 
+        :param casing: The casing counts to add the counts of the documents to.
+        :type casing: defaultdict(Counter)
+
         :returns: A dictionary of the best, known objects as values from `_casing_to_model()`
         :rtype: {'best': dict, 'known': Counter}
         """
-        casing = defaultdict(Counter)
-        train_truecaser = partial(self.learn_truecase_weights,
-                            possibly_use_first_token=possibly_use_first_token)
-        token_weights = chain(*parallelize_preprocess(train_truecaser, document_iterator, processes, progress_bar=progress_bar))
-        # Collect the token_weights from every sentence.
-        for lowercase_token, surface_token, weight in token_weights:
-            casing[lowercase_token][surface_token] += weight
-
+        if processes <= 1:
+            count_casing = partial(self.count_casing,
+                                   possibly_use_first_token=possibly_use_first_token)
+            document_casing = parallel_reduce(count_casing, self.merge_casing, document_iterator,
+                                              processes, progress_bar=progress_bar)
+        else:
+            # Every worker counts the casing of its chunks of the numbered
+            # documents, and the cases are ordered by their first document.
+            count_casing = partial(self.count_numbered_casing,
+                                   possibly_use_first_token=possibly_use_first_token)
+            numbered_casing = parallel_reduce(count_casing, self.merge_numbered_casing,
+                                              enumerate(document_iterator), processes,
+                                              progress_bar=progress_bar)
+            document_casing = self.ordered_casing(*numbered_casing) if numbered_casing else None
+        if casing is None:
+            casing = document_casing
+        elif document_casing is not None:
+            casing = self.merge_casing(casing, document_casing)
+        if casing is None:
+            casing = defaultdict(Counter)
+
+        # The casing counts are pruned when building the model.
+        model = self._casing_to_model(casing)
         # Save to file if specified.
         if save_to:
             self._save_model_from_casing(casing, save_to)
-        return self._casing_to_model(casing)
+        return model
 
     def train(self, documents, save_to=None,
               possibly_use_first_token=False, processes=1,
-              progress_bar=False):
+              progress_bar=False, update=False):
         """
         Default duck-type of _train(), accepts list(list(str)) as input documents.
+
+        :param update: Add the counts of the documents to the current model
+            (e.g. loaded from a file) instead of training a new one.
+        :type update: bool
         """
-        self.model = None # Clear the model first.
-        self.model = self._train(documents, save_to, possibly_use_first_token, processes, progress_bar=progress_bar)
+        casing = self._updated_casing(update)
+        self._close_model() # Clear the model first.
+        self.model = self._train(documents, save_to, possibly_use_first_token, processes,
+                                 progress_bar=progress_bar, casing=casing)
         return self.model
 
     def train_from_file(self, filename, save_to=None,
                         possibly_use_first_token=False, processes=1,
-                        progress_bar=False):
+                        progress_bar=False, update=False):
         """
         Duck-type of _train(), accepts a filename to read as a `iter(list(str))`
         object.
         """
         with open(filename, encoding=self.encoding) as fin:
-            #document_iterator = map(str.split, fin.readlines())
-            document_iterator = (line.split() for line in fin.readlines()) # Lets try a generator comprehension for Python2...
-        self.model = None # Clear the model first.
-        self.model = self._train(document_iterator, save_to, possibly_use_first_token, processes, progress_bar=progress_bar)
-        return self.model
+            return self.train_from_file_object(fin, save_to, possibly_use_first_token,
+                                               processes, progress_bar=progress_bar,
+                                               update=update)
 
     def train_from_file_object(self, file_object, save_to=None,
                         possibly_use_first_token=False, processes=1,
-                        progress_bar=False):
+                        progress_bar=False, update=False):
         """
         Duck-type of _train(), accepts a file object to read as a `iter(list(str))`
         object.
         """
-        #document_iterator = map(str.split, file_object.readlines())
-        document_iterator = (line.split() for line in file_object.readlines()) # Lets try a generator comprehension for Python2...
-        self.model = None # Clear the model first.
-        self.model = self._train(document_iterator, save_to, possibly_use_first_token, processes, progress_bar=progress_bar)
+        # Lazily read the lines, so that the file isn't loaded into memory.
+        document_iterator = (line.split() for line in file_object) # Lets try a generator comprehension for Python2...
+        if processes > 1:
+            # The workers split the lines, which are faster to send than lists.
+            document_iterator = file_object
+        casing = self._updated_casing(update)
+        self._close_model() # Clear the model first.
+        self.model = self._train(document_iterator, save_to, possibly_use_first_token, processes,
+                                 progress_bar=progress_bar, casing=casing)
+        return self.model
+
+    def _updated_casing(self, update):
+        """
+        Returns a copy of the casing counts of the current model to update, or
+        None to train a new model.
+        """
+        if not update or not getattr(self, 'model', None):
+            return None
+        casing = defaultdict(Counter)
+        return self.merge_casing(casing, self._model_casing())
+
+    def merge_models(self, filenames, save_to=None, update=False):
+        """
+        Merges the casing counts of the models, in the text or the binary
+        format, into the model of the truecaser, e.g. the models trained on
+        the shards of a corpus, in the order of the shards. The merged counts
+        are the counts of training on the whole corpus. (The text models only
+        keep the order of the tied cases of a token within a shard, so the
+        cases that tie only when merged are ordered by the shards.)
+
+        :param filenames: The model files.
+        :type filenames: list(str)
+
+        :param update: Merge the models into the current model.
+        :type update: bool
+        """
+        casing = self._updated_casing(update) or defaultdict(Counter)
+        for filename in filenames:
+            casing = self.merge_casing(casing, self.load_casing(filename))
+        self._close_model()
+        self.model = self._casing_to_model(casing)
+        # Save to file if specified.
+        if save_to:
+            self._save_model_from_casing(casing, save_to)
         return self.model
 
     def truecase(self, text, return_str=False, use_known=False):
@@ -204,7 +618,7 @@ class MosesTruecaser(object):
         for i, token in enumerate(tokens):
 
             # Append XML tags and continue
-            if re.search(r"(<\S[^>]*>)", token):
+            if self.XML_TAG.search(token):
                 truecased_tokens.append(token)
                 continue
 
@@ -216,7 +630,7 @@ class MosesTruecaser(object):
                 continue
 
             # Reads the word token and factors separatedly
-            word, other_factors = re.search(r"^([^\|]+)(.*)", token).groups()
+            word, other_factors = self.FACTORS.search(token).groups()
 
             # Lowercase the ASR tokens.
             if self.is_asr:
@@ -253,54 +667,63 @@ class MosesTruecaser(object):
         #return ' '.join(tokens)
         return ' '.join(truecased_tokens) if return_str else truecased_tokens
 
-    def truecase_file(self, filename, return_str=True):
+    def truecase_file(self, filename, return_str=True, processes=1, use_known=False):
+        """
+        Lazily truecases the lines of a file, in order.
+
+        :param processes: No. of processes, the lines are truecased in chunks
+            by worker processes which are sent the truecaser once. Forked
+            workers share the loaded model with this process, and binary models
+            are memory mapped, so they are shared with any start method.
+        :type processes: int
+        """
+        truecase = partial(self.truecase, return_str=return_str, use_known=use_known)
         with open(filename, encoding=self.encoding) as fin:
-            for line in fin:
-                truecased_tokens = self.truecase(line.strip())
-                # Yield the truecased line.
-                yield " ".join(truecased_tokens) if return_str else truecased_tokens
+            # Yield the truecased lines.
+            for truecased in parallelize_preprocess(truecase, fin, processes):
+                yield truecased
 
-    @staticmethod
-    def split_xml(line):
+    @classmethod
+    def split_xml(cls, line):
         """
         Python port of split_xml function in Moses' truecaser:
         https://github.com/moses-smt/mosesdecoder/blob/master/scripts/recaser/truecaser.perl
 
+        The XML tags are kept as separate tokens, unless they are a factor of
+        the previous token, e.g. "word|<tag>", which are joined to it.
+
         :param line: Input string, should be tokenized, separated by space.
         :type line: str
         """
         line = line.strip()
         tokens = []
-        while line:
-            # Assumes that xml tag is always separated by space.
-            has_xml = re.search(r"^\s*(<\S[^>]*>)(.*)$", line)
-            # non-XML test.
-            is_non_xml = re.search(r"^\s*([^\s<>]+)(.*)$", line)
-            # '<' or '>' occurs in word, but it's not an XML tag
-            xml_cognates = re.search(r"^\s*(\S+)(.*)$", line)
-            if has_xml:
-                potential_xml, line_next = has_xml.groups()
-                # exception for factor that is an XML tag
-                if re.search(r"^\S", line) and len(words) > 0 and re.search(r"\|$", words[-1]):
-                    word[-1] += potential_xml
-                    # If it's a token with factors, join with the previous token.
-                    is_factor = re.search(r"^(\|+)(.*)$", line_next)
-                    if is_factor:
-                        words[-1] += is_factor.group(1)
-                        line_next = is_factor.group(2)
+        # The regexes of the Moses function match the rest of the line with
+        # `(.*)$`, so they fail when there's a newline after the token.
+        last_newline = line.rfind(u'\n')
+        position, length = 0, len(line)
+        while position < length:
+            start = cls.SPACES.match(line, position).end()
+            xml_tag = cls.XML_TAG.match(line, start)
+            if xml_tag and xml_tag.end() > last_newline:
+                potential_xml = xml_tag.group()
+                # exception for factor that is an XML tag, i.e. a tag right
+                # after a "word|" token is joined to it with the pipes after it.
+                if start == position and tokens and tokens[-1].endswith(u'|'):
+                    pipes = cls.FACTOR_PIPES.match(line, xml_tag.end())
+                    tokens[-1] += potential_xml + pipes.group()
+                    position = pipes.end()
                 else:
-                    tokens.append(potential_xml+" ") # Token hack, unique to sacremoses.
-                line = line_next
-
-            elif is_non_xml:
-                tokens.append(is_non_xml.group(1)) # Token hack, unique to sacremoses.
-                line = is_non_xml.group(2)
-            elif xml_cognates:
-                tokens.append(xml_cognates.group(1)) # Token hack, unique to sacremoses.
-                line = xml_cognates.group(2)
-            else:
-                raise Exception("ERROR: huh? {}".format(line))
-            tokens[-1] = tokens[-1].strip() # Token hack, unique to sacremoses.
+                    tokens.append(potential_xml)
+                    position = xml_tag.end()
+                continue
+            # non-XML text, or '<' or '>' occurs in word, but it's not an XML tag.
+            word = cls.NON_XML.match(line, start)
+            if not word or word.end() <= last_newline:
+                word = cls.XML_COGNATE.match(line, start)
+                if not word or word.end() <= last_newline:
+                    raise Exception("ERROR: huh? {}".format(line[position:]))
+            tokens.append(word.group())
+            position = word.end()
         return tokens
 
     def _casing_to_model(self, casing):
@@ -309,6 +732,7 @@ class MosesTruecaser(object):
         :returns: A tuple of the (best, known) objects.
         :rtype: tuple(dict, Counter)
         """
+        pruning = self.prune_casing(casing)
         best = {}
         known = Counter()
 
@@ -322,11 +746,73 @@ class MosesTruecaser(object):
                     # Note: This is rather odd that the counts are thrown away...
                     # from https://github.com/moses-smt/mosesdecoder/blob/master/scripts/recaser/truecase.perl#L34
                     known[token] += 1
-        model = {'best':best, 'known':known, 'casing':casing}
+        model = {'best':best, 'known':known, 'casing':casing if self.keep_casing else None,
+                 'pruning':pruning}
         return model
 
-    def save_model(self, filename):
-        self._save_model_from_casing(self.model['casing'], filename)
+    def _prunes(self):
+        return bool(self.min_count or self.max_types is not None or
+                    (self.drop_lowercase and self.is_asr))
+
+    def prune_casing(self, casing):
+        """
+        Removes the pruned types from the casing counts (in place), see the
+        pruning options of `__init__()`.
+
+        :returns: How many types and surface forms are kept and pruned.
+        :rtype: PruningInfo
+        """
+        surfaces = sum(len(counts) for counts in casing.values())
+        if not self._prunes():
+            return PruningInfo(len(casing), surfaces, 0, 0)
+        kept = casing
+        if self.min_count:
+            kept = [token_lower for token_lower in kept
+                    if sum(casing[token_lower].values()) >= self.min_count]
+        if self.max_types is not None and len(kept) > self.max_types:
+            kept = nlargest(self.max_types, kept, key=lambda token_lower: sum(casing[token_lower].values()))
+        # The ASR input is lowercased, so the unknown types stay lowercased.
+        if self.drop_lowercase and self.is_asr:
+            kept = [token_lower for token_lower in kept
+                    if casing[token_lower].most_common(1)[0][0] != token_lower]
+        kept = set(kept)
+        pruned_types = pruned_surfaces = 0
+        for token_lower in [token_lower for token_lower in casing if token_lower not in kept]:
+            pruned_types += 1
+            pruned_surfaces += len(casing.pop(token_lower))
+        return PruningInfo(len(casing), surfaces - pruned_surfaces, pruned_types, pruned_surfaces)
+
+    def save_model(self, filename, format='text'):
+        """
+        Saves the model in the text format of the Moses truecaser or in the
+        binary format of `MappedTruecaseModel`, which loads a lot faster.
+        Loading and saving a model in the other format converts it.
+        """
+        if format not in self.MODEL_FORMATS:
+            raise ValueError('Unknown model format {!r}, use one of {}'.format(format, self.MODEL_FORMATS))
+        casing = self._model_casing()
+        if format == 'binary':
+            MappedTruecaseModel.save(casing, filename)
+        else:
+            self._save_model_from_casing(casing, filename)
+
+    def _close_model(self):
+        """
+        Clears the model, and unmaps the file of a binary model.
+        """
+        mapped = (getattr(self, 'model', None) or {}).get('mapped')
+        if mapped is not None:
+            mapped.close()
+        self.model = None
+
+    def _model_casing(self):
+        mapped = self.model.get('mapped')
+        if mapped is not None:
+            return mapped.casing()
+        if self.model['casing'] is None:
+            raise ValueError('The casing counts of the model were not kept (keep_casing=False), '
+                             'so it cannot be saved or updated.')
+        return self.model['casing']
 
     def _save_model_from_casing(self, casing, filename):
         """
@@ -351,21 +837,39 @@ class MosesTruecaser(object):
 
     def _load_model(self, filename):
         """
-        Loads pre-trained truecasing file.
+        Loads pre-trained truecasing file, in the text or the binary format.
+        The binary models are memory mapped, see `MappedTruecaseModel`.
 
         :returns: A dictionary of the best, known objects as values from `_casing_to_model()`
         :rtype: {'best': dict, 'known': Counter}
         """
-        casing = defaultdict(Counter)
+        # The binary models to prune are read into memory.
+        if MappedTruecaseModel.is_binary_model(filename) and not self._prunes():
+            mapped = MappedTruecaseModel(filename, is_asr=self.is_asr)
+            return {'best': _MappedCases(mapped.best),
+                    'known': _MappedCases(mapped.known),
+                    'mapped': mapped}
+        # Returns the best and known object from `_casing_to_model()`
+        return self._casing_to_model(self.load_casing(filename))
+
+    def load_casing(self, filename):
+        """
+        Reads the casing counts of a model file, in the text or the binary
+        format, as counted by `count_casing()`.
 
+        :rtype: defaultdict(Counter)
+        """
+        if MappedTruecaseModel.is_binary_model(filename):
+            with MappedTruecaseModel(filename, is_asr=self.is_asr) as mapped:
+                return mapped.casing()
+        casing = defaultdict(Counter)
         with open(filename, encoding=self.encoding) as fin:
             for line in fin:
                 line = line.strip().split()
                 for token, count in grouper(line, 2):
-                    count = count.split('/')[0].strip('()')
-                    casing[token.lower()][token] = float(count)
-        # Returns the best and known object from `_casing_to_model()`
-        return self._casing_to_model(casing)
+                    count = float(count.split('/')[0].strip('()'))
+                    casing[token.lower()][token] = int(count) if count.is_integer() else count
+        return casing
 
 
 class MosesDetruecaser(object):
@@ -421,4 +925,4 @@ class MosesDetruecaser(object):
                 # Yield the detruecased line.
                 yield ' '.join(truecased_tokens) if return_str else truecased_tokens
 
-__all__ = ['MosesTruecaser', 'MosesDetruecaser']
+__all__ = ['MosesTruecaser', 'MosesDetruecaser', 'MappedTruecaseModel', 'PruningInfo']
@@ -5,9 +5,14 @@ try: # Python3
     from itertools import zip_longest
 except ImportError: # Python2
     from itertools import izip_longest as zip_longest
+import gc
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+from contextlib import contextmanager
+from itertools import islice, tee
 
-from joblib import Parallel, delayed
-from tqdm import tqdm
+from six.moves import queue
 
 
 class CJKChars(object):
@@ -166,9 +171,404 @@ def grouper(iterable, n, fillvalue=None):
     return zip_longest(*args, fillvalue=fillvalue)
 
 
-def parallelize_preprocess(func, iterator, processes, progress_bar=False):
-    iterator = tqdm(iterator) if progress_bar else iterator
+def chunks(iterable, n):
+    """
+    Lazily collects the items of the iterable into lists of (at most) n items.
+
+        >>> list(chunks('ABCDEFG', 3))
+        [['A', 'B', 'C'], ['D', 'E', 'F'], ['G']]
+    """
+    iterator = iter(iterable)
+    chunk = list(islice(iterator, n))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, n))
+
+
+def read_blocks(stream, block_size):
+    """
+    Lazily reads a text file object in blocks of complete lines, every block
+    is about `block_size` characters long (unless a line is longer).
+
+        >>> import io
+        >>> list(read_blocks(io.StringIO(u'ab\\ncd\\nef'), 4))
+        ['ab\\n', 'cd\\n', 'ef']
+    """
+    rest = ''
+    while True:
+        data = stream.read(block_size)
+        if not data:
+            break
+        end = data.rfind('\n') + 1
+        if not end:
+            rest += data
+            continue
+        yield rest + data[:end]
+        rest = data[end:]
+    if rest:
+        yield rest
+
+
+_MISSING = object()
+_MOVE_TO_END = hasattr(OrderedDict, 'move_to_end')
+
+# The counters of a `LRUCache`, like `functools.lru_cache().cache_info()`.
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'evictions', 'maxsize', 'currsize'])
+
+
+class LRUCache(object):
+    """
+    A mapping of at most `maxsize` entries which evicts the least recently
+    used entry when it is full, and counts its hits, misses and evictions.
+
+        >>> cache = LRUCache(2)
+        >>> cache.put('a', 1); cache.put('b', 2)
+        >>> cache.get('a'), cache.get('c')
+        (1, None)
+        >>> cache.put('c', 3)  # Evicts 'b', the least recently used.
+        >>> cache.get('b')
+        >>> cache.cache_info()
+        CacheInfo(hits=1, misses=2, evictions=1, maxsize=2, currsize=2)
+
+    A cache bound to a tokenizer that is sent to worker processes is copied,
+    so each worker has its own cache (and counters).
+    """
+    def __init__(self, maxsize):
+        if maxsize < 1:
+            raise ValueError('The size of the cache must be positive, got {}'.format(maxsize))
+        self.maxsize = maxsize
+        self.hits = self.misses = self.evictions = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """
+        Returns the value of the key and marks it as the most recently used,
+        or `default` (a miss) if the key isn't cached.
+        """
+        entries = self._entries
+        value = entries.get(key, _MISSING)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        if _MOVE_TO_END:
+            entries.move_to_end(key)
+        else:
+            # Re-inserting moves the entry to the end on Python 2.
+            entries[key] = entries.pop(key)
+        return value
+
+    def put(self, key, value):
+        """
+        Caches the value of the key, evicting the least recently used entry
+        if the cache is full.
+        """
+        self._entries.pop(key, None)
+        if len(self._entries) >= self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        self._entries[key] = value
+
+    def clear(self):
+        """
+        Removes all the entries and resets the counters.
+        """
+        self._entries.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def cache_info(self):
+        return CacheInfo(self.hits, self.misses, self.evictions, self.maxsize, len(self._entries))
+
+
+# The function (and the object it is bound to) of the worker processes, it is
+# sent to every worker only once when the pool starts, see `parallel_imap()`.
+_worker_func = None
+
+
+def _init_worker(func, batched):
+    global _worker_func
+    _worker_func = func if batched else lambda chunk: [func(item) for item in chunk]
+
+
+def _process_chunk(chunk):
+    start = time.time()
+    results = _worker_func(chunk)
+    return results, time.time() - start
+
+
+@contextmanager
+def _frozen_gc():
+    """
+    When the workers are forked, they share the memory pages of the parent
+    (e.g. a loaded truecaser model) until they write to them, so the objects
+    of the parent are frozen while forking, otherwise the garbage collection
+    of the workers would copy their pages.
+    """
+    if not hasattr(gc, 'freeze'): # Python < 3.7
+        yield
+        return
+    gc.freeze()
+    try:
+        yield
+    finally:
+        gc.unfreeze()
+
+
+def _fork_pool(multiprocessing, processes, **kwargs):
+    """
+    Starts a pool of worker processes, see `_frozen_gc()`.
+    """
+    with _frozen_gc():
+        return multiprocessing.Pool(processes, **kwargs)
+
+
+def parallel_imap(func, iterable, processes, batched=False, chunk_size=None,
+                  max_in_flight=None, target_chunk_time=0.1,
+                  min_chunk_size=16, max_chunk_size=16384):
+    """
+    Lazily applies `func` to the items of the iterable with a pool of worker
+    processes and yields the results in the input order.
+
+    The function is sent to every worker once, so a function bound to a
+    MosesTokenizer, MosesTruecaser or MosesPunctNormalizer gives every worker
+    its own instance (which forked workers share with the parent, see
+    `_fork_pool()`). The items are sent to the workers in chunks, which grow
+    or shrink such that processing a chunk takes about `target_chunk_time`
+    seconds (unless `chunk_size` is fixed), and no more than `max_in_flight`
+    chunks (by default 2 per process) are read ahead of the output.
+
+    :param batched: Whether `func` takes a list of items and returns the list
+        of their results (e.g. `MosesTokenizer.tokenize_batch`) instead of
+        taking a single item.
+    :type batched: bool
+    """
+    # Imported here, it is only needed when there are worker processes.
+    import multiprocessing
+    max_in_flight = max_in_flight or 2 * processes
+    size = chunk_size or min_chunk_size
+    iterator = iter(iterable)
+    pool = _fork_pool(multiprocessing, processes, initializer=_init_worker,
+                      initargs=(func, batched))
+    try:
+        pending = deque()
+        exhausted = False
+        while True:
+            # Keep the workers busy, but bound the no. of chunks in flight.
+            while not exhausted and len(pending) < max_in_flight:
+                chunk = list(islice(iterator, size))
+                if chunk:
+                    pending.append((len(chunk), pool.apply_async(_process_chunk, (chunk,))))
+                else:
+                    exhausted = True
+            if not pending:
+                break
+            # Wait for the oldest chunk to keep the output in order.
+            num_items, result = pending.popleft()
+            results, elapsed = result.get()
+            if not chunk_size:
+                time_per_item = max(elapsed, 1e-6) / num_items
+                size = int(min(max(target_chunk_time / time_per_item, min_chunk_size), max_chunk_size))
+            for item in results:
+                yield item
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _reduce_worker(func, tasks, results):
+    """
+    Applies `func` to the items of the chunks of the task queue, until the
+    end of the queue, and sends back the result (or the error) once.
+    """
+    queued_chunks = iter(tasks.get, None)
+    try:
+        results.put((func(item for chunk in queued_chunks for item in chunk), None))
+    except Exception as e:
+        results.put((None, e))
+        for _ in queued_chunks:
+            pass  # Drain the queue, so that the parent isn't blocked.
+
+
+def parallel_reduce(func, merge, iterable, processes, progress_bar=False,
+                    chunk_size=1000, max_in_flight=None):
+    """
+    Aggregates the items of the iterable with `processes` processes: the
+    chunks of `chunk_size` items are sent to the workers through a shared
+    queue (with no more than `max_in_flight` chunks, by default 2 per
+    process, read ahead), every worker applies `func` to the stream of the
+    items of its chunks and sends back its partial result, e.g. counts, once.
+    The parent merges the partial results pairwise with
+    `merge(result, partial_result)`, which returns the merged result.
+
+    A worker gets its items in the input order, but the chunks of the
+    workers are interleaved, so `merge` should not depend on the order of
+    the partial results (the order of the input can be kept in the partial
+    results, see `MosesTruecaser._train()`).
+
+    :param func: Takes an iterable of items and returns their partial result,
+        with one process it is applied to the whole iterable at once.
+    :returns: The merged result, or None if the iterable is empty.
+    """
+    if progress_bar:
+        # Imported here, tqdm is slow to import and only needed for the bar.
+        from tqdm import tqdm
+        iterable = tqdm(iterable)
     if processes <= 1:
+        return func(iterable)
+    # Imported here, it is only needed when there are worker processes.
+    import multiprocessing
+    tasks = multiprocessing.Queue(max_in_flight or 2 * processes)
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=_reduce_worker, args=(func, tasks, results))
+               for _ in range(processes)]
+    with _frozen_gc():
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+    try:
+        for chunk in chunks(iterable, chunk_size):
+            tasks.put(chunk)
+        for _ in workers:
+            tasks.put(None)
+        worker_results = []
+        for _ in workers:
+            result, error = results.get()
+            if error is not None:
+                raise error
+            if result is not None:
+                worker_results.append(result)
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
+    # The results are merged pairwise, so that the merged results grow evenly.
+    while len(worker_results) > 1:
+        worker_results = [merge(*pair) if len(pair) == 2 else pair[0]
+                          for pair in chunks(worker_results, 2)]
+    return worker_results[0] if worker_results else None
+
+
+def parallelize_preprocess(func, iterator, processes, progress_bar=False, batched=False):
+    """
+    Lazily applies `func` to the items of the iterator with `processes`
+    processes, see `parallel_imap()`, and returns an iterator of the results
+    in the input order.
+    """
+    if progress_bar:
+        # Imported here, tqdm is slow to import and only needed for the bar.
+        from tqdm import tqdm
+        iterator = tqdm(iterator)
+    if processes <= 1:
+        if batched:
+            return (result for chunk in chunks(iterator, 1000)
+                    for result in func(chunk))
         return map(func, iterator)
     else:
-        return Parallel(n_jobs=processes)(delayed(func)(line) for line in iterator)
+        return parallel_imap(func, iterator, processes, batched=batched)
+
+
+# Marks the end of the items in the queues of the reader and writer threads.
+_END_OF_QUEUE = object()
+
+
+def threaded_reader(iterable, max_queued=10000):
+    """
+    Lazily yields the items of the iterable, which are read ahead by a
+    background thread into a bounded queue of at most `max_queued` items,
+    so that reading the input overlaps with processing it.
+    """
+    items = queue.Queue(max_queued)
+    errors = []
+
+    def read():
+        try:
+            for item in iterable:
+                items.put(item)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            items.put(_END_OF_QUEUE)
+
+    reader = threading.Thread(target=read)
+    reader.daemon = True
+    reader.start()
+    while True:
+        item = items.get()
+        if item is _END_OF_QUEUE:
+            break
+        yield item
+    if errors:
+        raise errors[0]
+
+
+class ThreadedWriter(object):
+    """
+    Writes lines to a file object from a background thread. The lines are
+    queued in a bounded queue of at most `max_queued` lines and the queued
+    lines are written with a single write of at most `buffer_lines` lines.
+
+        >>> import sys
+        >>> with ThreadedWriter(sys.stdout) as writer:
+        ...     writer.writelines(['a', 'b'])
+        a
+        b
+    """
+    def __init__(self, fout, end='\n', max_queued=10000, buffer_lines=1000):
+        self.fout = fout
+        self.end = end
+        self.buffer_lines = buffer_lines
+        self._lines = queue.Queue(max_queued)
+        self._errors = []
+        self._writer = threading.Thread(target=self._write)
+        self._writer.daemon = True
+        self._writer.start()
+
+    def _write(self):
+        done = False
+        while not done:
+            # Block for the next line, then take the lines that are already queued.
+            buffer = [self._lines.get()]
+            try:
+                while len(buffer) < self.buffer_lines:
+                    buffer.append(self._lines.get_nowait())
+            except queue.Empty:
+                pass
+            if buffer[-1] is _END_OF_QUEUE:
+                buffer.pop()
+                done = True
+            if buffer and not self._errors:
+                try:
+                    self.fout.write(''.join(line + self.end for line in buffer))
+                    # Flush when the lines are written as soon as they come.
+                    if self._lines.empty():
+                        self.fout.flush()
+                except Exception as e:
+                    # Keep consuming the queue, the error is raised in the main thread.
+                    self._errors.append(e)
+
+    def write(self, line):
+        if self._errors:
+            raise self._errors[0]
+        self._lines.put(line)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def close(self):
+        self._lines.put(_END_OF_QUEUE)
+        self._writer.join()
+        if self._errors:
+            raise self._errors[0]
+        self.fout.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -14,10 +14,10 @@ setup(
   long_description = 'LGPL MosesTokenizer in Python',
   author = '',
   license = '',
-  package_data={'sacremoses': ['share/perluniprops/*.txt', 'share/nonbreaking_prefixes/nonbreaking_prefix.*']},
+  package_data={'sacremoses': ['share/perluniprops/*.txt', 'share/perluniprops/ranges.marshal', 'share/nonbreaking_prefixes/nonbreaking_prefix.*']},
   url = 'https://github.com/alvations/sacremoses',
   keywords = [],
   classifiers = [],
-  install_requires = ['six', 'click', 'joblib', 'tqdm'],
+  install_requires = ['six', 'click', 'tqdm'],
   entry_points=console_scripts,
 )